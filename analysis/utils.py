@@ -1,4 +1,5 @@
 import os
+import hashlib
 # import yaml
 import numpy as np
 import pandas as pd
@@ -475,16 +476,172 @@ def format_trajectory_figure(
     return ax
 
 
+def _gate_frames(
+        track: pd.DataFrame,
+        gate_inner_dimensions: tuple=(2.5, 2.5),
+        gate_outer_dimensions: tuple=(3.5, 3.5)
+        ) -> tuple:
+    """Returns the track with the gate dimensions centered between the inner
+    and outer gate dimensions, and the width of the gate frames."""
+    frame_width = 0.5 * (gate_outer_dimensions[0] - gate_inner_dimensions[0])
+    track = track.copy()
+    track['dy'] = 0.5 * (gate_inner_dimensions[0] + gate_outer_dimensions[0])
+    track['dz'] = 0.5 * (gate_inner_dimensions[1] + gate_outer_dimensions[1])
+    return track, frame_width
+
+
+def _gate_colliders(
+        track: pd.DataFrame,
+        gate_inner_dimensions: tuple=(2.5, 2.5),
+        gate_outer_dimensions: tuple=(3.5, 3.5)
+        ):
+    """Returns GateColliders for the gate frames, centered between the
+    inner and outer gate dimensions."""
+    # only imported here, so that the other analysis code does not depend on the flightil package
+    from flightil.dda.collisions import GateColliders
+    return GateColliders.from_track(*_gate_frames(track, gate_inner_dimensions, gate_outer_dimensions))
+
+
+def _wall_hits(
+        position: np.ndarray([]),
+        wall_collider_dimensions: tuple=(66, 36, 9),
+        wall_collider_center: tuple=(0, 0, 4.85)
+        ) -> np.ndarray([]):
+    """Returns for each position whether it is beyond each of the walls, in
+    the same order as returned by get_wall_colliders."""
+    center = np.array(wall_collider_center)
+    half_dims = 0.5 * np.array(wall_collider_dimensions)
+    return np.stack([position[:, 2] < center[2] - half_dims[2],
+                     position[:, 2] > center[2] + half_dims[2],
+                     position[:, 0] > center[0] + half_dims[0],
+                     position[:, 0] < center[0] - half_dims[0],
+                     position[:, 1] > center[1] + half_dims[1],
+                     position[:, 1] < center[1] - half_dims[1]], axis=1)
+
+
+def _hit_onsets(
+        t: np.ndarray([]),
+        hits: np.ndarray([])
+        ) -> dict:
+    """Returns {object id: [timestamps]} of the first sample of each contact."""
+    onsets = hits & ~np.vstack((np.zeros((1, hits.shape[1]), dtype=bool), hits[:-1]))
+    return {i: list(t[onsets[:, i]]) for i in range(hits.shape[1])}
+
+
+def detect_collisions_analytic(
+        t: np.ndarray([]),
+        px: np.ndarray([]),
+        py: np.ndarray([]),
+        pz: np.ndarray([]),
+        track: pd.DataFrame,
+        gate_inner_dimensions: tuple=(2.5, 2.5),
+        gate_outer_dimensions: tuple=(3.5, 3.5),
+        wall_collider_dimensions: tuple=(66, 36, 9),
+        wall_collider_center: tuple=(0, 0, 4.85)
+        ) -> tuple:
+    """
+    Return timestamps of gate and wall collision events as dictionaries
+    {object id: [timestamps]}, using analytic colliders (gate frames as
+    oriented boxes between inner and outer gate dimensions, walls as the
+    faces of a box) and swept checks between consecutive samples.
+
+    Wall ids are in the same order as returned by get_wall_colliders.
+    """
+    position = np.hstack((px.reshape(-1, 1), py.reshape(-1, 1), pz.reshape(-1, 1)))
+    colliders = _gate_colliders(track, gate_inner_dimensions, gate_outer_dimensions)
+    # collisions on the segments between consecutive samples, events at
+    # the end of the first colliding segment of each contact
+    gate_hits = colliders.gate_hits(position[:-1], position[1:])
+    gate_hits = np.stack([np.any(gate_hits[:, colliders.gate_ids == i], axis=1)
+                          for i in range(track.shape[0])], axis=1)
+    wall_hits = _wall_hits(position[1:], wall_collider_dimensions, wall_collider_center)
+    return _hit_onsets(t[1:], gate_hits), _hit_onsets(t[1:], wall_hits)
+
+
+# signed distance fields (memory-mapped) by hash of the track and parameters
+_gate_distance_fields = {}
+
+
+def get_gate_distance_field(
+        track: pd.DataFrame,
+        gate_inner_dimensions: tuple=(2.5, 2.5),
+        gate_outer_dimensions: tuple=(3.5, 3.5),
+        wall_collider_dimensions: tuple=(66, 36, 9),
+        wall_collider_center: tuple=(0, 0, 4.85),
+        reso: float=0.2,
+        cache_dir: str=None
+        ):
+    """
+    Returns a SignedDistanceField (see flightil.dda.collisions) of the gate
+    frames (as used by detect_collisions_analytic) over the volume enclosed
+    by the walls, at the given resolution. The distance field is computed
+    once per track and parameters and cached on disk (in cache_dir, see
+    load_gate_distance_field), from where it is memory-mapped afterwards.
+    """
+    from flightil.dda.collisions import load_gate_distance_field
+    track, frame_width = _gate_frames(track, gate_inner_dimensions, gate_outer_dimensions)
+    center = np.array(wall_collider_center)
+    half_dims = 0.5 * np.array(wall_collider_dimensions)
+    xl, yl, zl = [(c - h, c + h) for c, h in zip(center, half_dims)]
+    key = (hashlib.sha1(track.to_csv(index=False).encode()).hexdigest(), frame_width, xl, yl, zl, reso,
+           cache_dir)
+    if key not in _gate_distance_fields:
+        _gate_distance_fields[key] = load_gate_distance_field(track, frame_width, reso, xl, yl, zl,
+                                                              cache_dir=cache_dir)
+    return _gate_distance_fields[key]
+
+
+def detect_collisions_sdf(
+        t: np.ndarray([]),
+        px: np.ndarray([]),
+        py: np.ndarray([]),
+        pz: np.ndarray([]),
+        track: pd.DataFrame,
+        gate_inner_dimensions: tuple=(2.5, 2.5),
+        gate_outer_dimensions: tuple=(3.5, 3.5),
+        wall_collider_dimensions: tuple=(66, 36, 9),
+        wall_collider_center: tuple=(0, 0, 4.85),
+        reso: float=0.2,
+        clearance: float=0.0,
+        cache_dir: str=None
+        ) -> tuple:
+    """
+    Return timestamps of gate and wall collision events as dictionaries
+    {object id: [timestamps]} like detect_collisions_analytic, but with one
+    lookup in the (cached) signed distance field of the gate frames for all
+    samples instead of testing each gate. Samples closer to a frame than
+    clearance count as collisions (with the closest gate).
+
+    See get_gate_distance_field for the cache directory of the distance field.
+    """
+    position = np.hstack((px.reshape(-1, 1), py.reshape(-1, 1), pz.reshape(-1, 1)))
+    sdf = get_gate_distance_field(track, gate_inner_dimensions, gate_outer_dimensions,
+                                  wall_collider_dimensions, wall_collider_center, reso, cache_dir)
+    colliding = sdf.distance(position) < clearance
+    gate_centers = track[['px', 'py', 'pz']].values
+    closest_gate = np.argmin(np.linalg.norm(position[:, np.newaxis] - gate_centers, axis=-1), axis=1)
+    gate_hits = colliding[:, np.newaxis] & (closest_gate[:, np.newaxis] == np.arange(len(gate_centers)))
+    wall_hits = _wall_hits(position, wall_collider_dimensions, wall_collider_center)
+    return _hit_onsets(t, gate_hits), _hit_onsets(t, wall_hits)
+
+
 def get_pass_collision_events(
         filepath_trajectory: str,
         filepath_track: str,
         gate_inner_dimensions: tuple=(2.5, 2.5),
         gate_outer_dimensions: tuple=(3.5, 3.5),
         wall_collider_dimensions: tuple=(66, 36, 9),
-        wall_collider_center: tuple=(0, 0, 4.85)
+        wall_collider_center: tuple=(0, 0, 4.85),
+        collision_detection: str='checkpoint'
         ) -> pd.DataFrame():
     """Returns an events dataframe of pass and collision events from given
-    trajectory and track filepaths."""
+    trajectory and track filepaths.
+
+    collision_detection: 'checkpoint' (collisions as crossings of the
+        gate/wall surfaces), 'analytic' (swept checks against the gate
+        frames and walls, see detect_collisions_analytic) or 'sdf' (lookups
+        in the signed distance field of the gate frames, see
+        detect_collisions_sdf)"""
     # Load race track information.
     T = pd.read_csv(filepath_track)
     # Define checkpoints and colliders.
@@ -500,6 +657,27 @@ def get_pass_collision_events(
     px = D['px'].values
     py = D['py'].values
     pz= D['pz'].values
+    # Detect collision events analytically if requested.
+    analytic_events = {}
+    if collision_detection == 'analytic':
+        gate_events, wall_events = detect_collisions_analytic(
+            t, px, py, pz, T,
+            gate_inner_dimensions=gate_inner_dimensions,
+            gate_outer_dimensions=gate_outer_dimensions,
+            wall_collider_dimensions=wall_collider_dimensions,
+            wall_collider_center=wall_collider_center)
+    elif collision_detection == 'sdf':
+        # cache the distance field next to the track, like the collision maps of the simulation
+        gate_events, wall_events = detect_collisions_sdf(
+            t, px, py, pz, T,
+            gate_inner_dimensions=gate_inner_dimensions,
+            gate_outer_dimensions=gate_outer_dimensions,
+            wall_collider_dimensions=wall_collider_dimensions,
+            wall_collider_center=wall_collider_center,
+            cache_dir=os.path.join(os.path.dirname(os.path.abspath(filepath_track)), 'collision_maps'))
+    if collision_detection in ['analytic', 'sdf']:
+        analytic_events = {'gate_collision': gate_events,
+                           'wall_collision': wall_events}
     # Detect checkpoint passing and collision events.
     events = {}
     """
@@ -514,7 +692,11 @@ def get_pass_collision_events(
                          ]:
         for id in range(len(objects)):
             object = objects[id]
-            for timestamp in detect_checkpoint_pass(t, px, py, pz, object):
+            if key in analytic_events:
+                timestamps = analytic_events[key][id]
+            else:
+                timestamps = detect_checkpoint_pass(t, px, py, pz, object)
+            for timestamp in timestamps:
                 if not ((key == 'gate_collision') and (
                         timestamp in events.keys())):
                     test_x = px[t == timestamp][0]
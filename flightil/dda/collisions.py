@@ -1,9 +1,17 @@
+import os
+import io
+import hashlib
+import tempfile
 import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
 
+from scipy.ndimage import distance_transform_edt
 from scipy.spatial.transform import Rotation
 
+# has to be changed whenever the way the occupancy maps are computed changes (invalidates cached maps)
+_CACHE_VERSION = 2
+
 
 def _bresenhamline_nslope(slope):
     """
@@ -128,6 +136,287 @@ def p2vox(p, reso, xl, yl, zl):
                      / reso).astype(int))
 
 
+def grid_shape(reso, xl, yl, zl):
+    """Return the shape of the occupancy grid for the given resolution and limits."""
+    return tuple(int(np.diff(l)[0] / reso) for l in (xl, yl, zl))
+
+
+class CollisionMap:
+    """
+    Compact occupancy map with O(1) lookups, either backed by a uint8 grid or bit-packed along the
+    z-axis (8 voxels per byte), together with the resolution and limits needed to look up positions.
+    """
+
+    def __init__(self, grid, reso, xl, yl, zl, packed=False):
+        self.reso = reso
+        self.xl = xl
+        self.yl = yl
+        self.zl = zl
+        self.shape = grid_shape(reso, xl, yl, zl)
+        self.packed = packed
+        if packed and grid.shape == self.shape:
+            grid = np.packbits(np.asarray(grid, dtype=bool), axis=2)
+        elif not packed:
+            grid = np.asarray(grid, dtype=np.uint8) if grid.dtype != np.uint8 else grid
+        self.data = grid
+
+    @classmethod
+    def from_track(cls, track, reso, xl, yl, zl, pad, zfloor, packed=True):
+        return cls(track2colliders(track, reso, xl, yl, zl, pad, zfloor), reso, xl, yl, zl, packed=packed)
+
+    @property
+    def nbytes(self):
+        return self.data.nbytes
+
+    def lookup(self, coords):
+        """Return the occupancy (as bool) of the given grid coordinates (n x 3)."""
+        x, y, z = coords[:, 0], coords[:, 1], coords[:, 2]
+        if self.packed:
+            # np.packbits uses big-endian bit order, i.e. the first voxel is the most significant bit
+            return ((self.data[x, y, z >> 3] >> (7 - (z & 7))) & 1).astype(bool)
+        return self.data[x, y, z].astype(bool)
+
+    def check(self, p, out_of_bounds="flag"):
+        """Return collision checks (True=collision) for the given positions (..., 3), see check_collision."""
+        coords, outside = _grid_coords(p, self.reso, self.xl, self.yl, self.zl, self.shape, out_of_bounds)
+        return _apply_out_of_bounds(self.lookup(coords), outside, out_of_bounds).reshape(p.shape[:-1])
+
+    def to_grid(self):
+        if self.packed:
+            return np.unpackbits(self.data, axis=2, count=self.shape[2])
+        return np.asarray(self.data)
+
+
+class SignedDistanceField:
+    """
+    Signed distance (in meters) to the closest occupied voxel of an occupancy map, computed once with
+    a Euclidean distance transform. Distances are positive in free space and negative inside of obstacles,
+    and are defined at the voxel centers, between which they are interpolated trilinearly.
+    """
+
+    def __init__(self, data, reso, xl, yl, zl):
+        self.reso = reso
+        self.xl = xl
+        self.yl = yl
+        self.zl = zl
+        self.shape = data.shape
+        self.lower = np.array([xl[0], yl[0], zl[0]], dtype=np.float64)
+        self.data = data
+
+    @classmethod
+    def from_colliders(cls, colliders, reso=None, xl=None, yl=None, zl=None):
+        if isinstance(colliders, CollisionMap):
+            reso, xl, yl, zl = colliders.reso, colliders.xl, colliders.yl, colliders.zl
+            colliders = colliders.to_grid()
+        occupied = np.asarray(colliders).astype(bool)
+        distance = distance_transform_edt(~occupied) - distance_transform_edt(occupied)
+        return cls((distance * reso).astype(np.float32), reso, xl, yl, zl)
+
+    def _cell(self, p):
+        # continuous index relative to the voxel centers, clipped to the grid (i.e. constant extrapolation)
+        u = (np.reshape(p, (-1, 3)) - self.lower) / self.reso - 0.5
+        upper = np.array(self.shape) - 1
+        u = np.clip(u, 0, upper)
+        i = np.minimum(np.floor(u).astype(int), np.maximum(upper - 1, 0))
+        return i, u - i
+
+    def _corners(self, i):
+        d = self.data
+        x, y, z = i[:, 0], i[:, 1], i[:, 2]
+        x1, y1, z1 = [np.minimum(c + 1, s - 1) for c, s in zip((x, y, z), self.shape)]
+        return (d[x, y, z], d[x1, y, z], d[x, y1, z], d[x1, y1, z],
+                d[x, y, z1], d[x1, y, z1], d[x, y1, z1], d[x1, y1, z1])
+
+    def distance(self, p):
+        """Return the (trilinearly interpolated) signed distance for the given positions (..., 3)."""
+        p = np.asarray(p)
+        i, f = self._cell(p)
+        fx, fy, fz = f[:, 0], f[:, 1], f[:, 2]
+        c000, c100, c010, c110, c001, c101, c011, c111 = self._corners(i)
+        c00 = c000 + fx * (c100 - c000)
+        c10 = c010 + fx * (c110 - c010)
+        c01 = c001 + fx * (c101 - c001)
+        c11 = c011 + fx * (c111 - c011)
+        c0 = c00 + fy * (c10 - c00)
+        c1 = c01 + fy * (c11 - c01)
+        return (c0 + fz * (c1 - c0)).reshape(p.shape[:-1])
+
+    def gradient(self, p):
+        """Return the gradient (..., 3) of the interpolated signed distance for the given positions (..., 3),
+        i.e. the direction away from the closest obstacle (scaled by how much the distance changes)."""
+        p = np.asarray(p)
+        i, f = self._cell(p)
+        fx, fy, fz = f[:, 0], f[:, 1], f[:, 2]
+        c000, c100, c010, c110, c001, c101, c011, c111 = self._corners(i)
+        gx = ((1 - fy) * (1 - fz) * (c100 - c000) + fy * (1 - fz) * (c110 - c010)
+              + (1 - fy) * fz * (c101 - c001) + fy * fz * (c111 - c011))
+        gy = ((1 - fx) * (1 - fz) * (c010 - c000) + fx * (1 - fz) * (c110 - c100)
+              + (1 - fx) * fz * (c011 - c001) + fx * fz * (c111 - c101))
+        gz = ((1 - fx) * (1 - fy) * (c001 - c000) + fx * (1 - fy) * (c101 - c100)
+              + (1 - fx) * fy * (c011 - c010) + fx * fy * (c111 - c110))
+        return (np.stack((gx, gy, gz), axis=-1) / self.reso).reshape(p.shape)
+
+    def query(self, p):
+        return self.distance(p), self.gradient(p)
+
+
+class GateColliders:
+    """
+    Analytic colliders for a track: the frame of each gate as four oriented boxes (one per bar), the
+    floor as a plane and the walls of the arena as an axis-aligned box that has to contain the drone.
+    All checks are vectorized over positions (..., 3) and all boxes, and since the gates are thin, the
+    swept checks between consecutive positions should be used so that fast drones cannot pass through
+    a bar between two steps.
+    """
+
+    def __init__(self, centers, rotations, half_sizes, gate_ids=None, zfloor=None, xl=None, yl=None, zl=None):
+        self.centers = np.asarray(centers, dtype=np.float64).reshape((-1, 3))
+        self.rotations = np.asarray(rotations, dtype=np.float64).reshape((-1, 3, 3))
+        self.half_sizes = np.asarray(half_sizes, dtype=np.float64).reshape((-1, 3))
+        self.gate_ids = np.arange(len(self.centers)) if gate_ids is None else np.asarray(gate_ids)
+        self.zfloor = zfloor
+        self.bounds = None
+        if xl is not None and yl is not None and zl is not None:
+            self.bounds = np.array([[xl[0], yl[0], zl[0]], [xl[1], yl[1], zl[1]]], dtype=np.float64)
+
+    @classmethod
+    def from_track(cls, track, frame_width, frame_depth=None, dims_offset=0.0, zfloor=None,
+                   xl=None, yl=None, zl=None):
+        """
+        Builds the colliders from gate poses (track dataframe). The bars are centered on the rectangle
+        with the gate dimensions (dy + dims_offset, dz + dims_offset) and have a (square) cross section
+        of frame_width x frame_depth, e.g. the voxel map of track2colliders corresponds to a dims_offset
+        of 0.25 and a frame width/depth of 2 * pad.
+        """
+        frame_depth = frame_width if frame_depth is None else frame_depth
+        p = track.loc[:, ('px', 'py', 'pz')].values
+        r = Rotation.from_quat(track.loc[:, ('qx', 'qy', 'qz', 'qw')].values).as_matrix()
+        hy = 0.5 * (track['dy'].values + dims_offset)
+        hz = 0.5 * (track['dz'].values + dims_offset)
+        hw, hd = 0.5 * frame_width, 0.5 * frame_depth
+
+        # top, bottom, left and right bar in the gate frame (x pointing through the gate)
+        zeros = np.zeros_like(hy)
+        offsets = [np.stack(o, axis=-1) for o in [(zeros, zeros, hz), (zeros, zeros, -hz),
+                                                  (zeros, hy, zeros), (zeros, -hy, zeros)]]
+        sizes = [np.stack(s, axis=-1) for s in [(zeros + hd, hy + hw, zeros + hw), (zeros + hd, hy + hw, zeros + hw),
+                                                (zeros + hd, zeros + hw, hz + hw), (zeros + hd, zeros + hw, hz + hw)]]
+        centers = np.concatenate([p + np.einsum("nij,nj->ni", r, o) for o in offsets])
+        return cls(centers, np.concatenate([r] * 4), np.concatenate(sizes),
+                   gate_ids=np.tile(np.arange(len(p)), 4), zfloor=zfloor, xl=xl, yl=yl, zl=zl)
+
+    @property
+    def nbytes(self):
+        return self.centers.nbytes + self.rotations.nbytes + self.half_sizes.nbytes
+
+    def _to_local(self, p):
+        # positions (n, 3) in the frame of each box (n, boxes, 3)
+        return np.einsum("nmj,mji->nmi", p[:, np.newaxis, :] - self.centers[np.newaxis], self.rotations)
+
+    def gate_hits(self, p, p_next=None):
+        """
+        Return for each position (..., 3) whether it is inside each of the boxes (..., boxes), or if
+        p_next is given, whether the segments between p and p_next intersect each of the boxes.
+        """
+        p = np.asarray(p, dtype=np.float64)
+        shape = p.shape[:-1]
+        o = self._to_local(p.reshape((-1, 3)))
+        if p_next is None:
+            hits = np.all(np.abs(o) <= self.half_sizes, axis=-1)
+            return hits.reshape(shape + (len(self.centers),))
+
+        # slab test in the frame of each box, with the segments parameterized by t in [0, 1]
+        d = self._to_local(np.asarray(p_next, dtype=np.float64).reshape((-1, 3))) - o
+        with np.errstate(divide="ignore", invalid="ignore"):
+            t0 = (-self.half_sizes - o) / d
+            t1 = (self.half_sizes - o) / d
+        parallel = d == 0
+        inside = np.abs(o) <= self.half_sizes
+        t_near = np.where(parallel, np.where(inside, -np.inf, np.inf), np.minimum(t0, t1))
+        t_far = np.where(parallel, np.where(inside, np.inf, -np.inf), np.maximum(t0, t1))
+        t_enter = np.max(t_near, axis=-1)
+        t_exit = np.min(t_far, axis=-1)
+        hits = (t_enter <= t_exit) & (t_exit >= 0) & (t_enter <= 1)
+        return hits.reshape(shape + (len(self.centers),))
+
+    def to_grid(self, reso, xl, yl, zl):
+        """
+        Return the occupancy grid (uint8) of the boxes for the given resolution and limits, i.e. whether the
+        center of each voxel is inside of any of the boxes (the floor and the walls are not included).
+        """
+        shape = np.array(grid_shape(reso, xl, yl, zl))
+        lower = np.array([xl[0], yl[0], zl[0]], dtype=np.float64)
+        grid = np.zeros(shape, dtype=np.uint8)
+        # only the voxels within the axis-aligned extent of each box have to be tested
+        extents = np.einsum("mij,mj->mi", np.abs(self.rotations), self.half_sizes)
+        start = np.clip(np.floor((self.centers - extents - lower) / reso - 0.5).astype(int), 0, shape)
+        stop = np.clip(np.ceil((self.centers + extents - lower) / reso - 0.5).astype(int) + 1, 0, shape)
+        for m in range(len(self.centers)):
+            axes = [lower[k] + reso * (np.arange(start[m, k], stop[m, k]) + 0.5) for k in range(3)]
+            o = (np.stack(np.meshgrid(*axes, indexing="ij"), axis=-1) - self.centers[m]) @ self.rotations[m]
+            grid[start[m, 0]:stop[m, 0], start[m, 1]:stop[m, 1], start[m, 2]:stop[m, 2]] |= \
+                np.all(np.abs(o) <= self.half_sizes[m], axis=-1)
+        return grid
+
+    def _environment_hits(self, p, p_next=None):
+        p = np.asarray(p, dtype=np.float64)
+        collision = np.zeros(p.shape[:-1], dtype=bool)
+        points = [p] if p_next is None else [p, np.asarray(p_next, dtype=np.float64)]
+        # both the half-space above the floor and the arena are convex, so a segment
+        # leaves them if and only if one of its end points does
+        for q in points:
+            if self.zfloor is not None:
+                collision |= q[..., 2] < self.zfloor
+            if self.bounds is not None:
+                collision |= np.any((q < self.bounds[0]) | (q > self.bounds[1]), axis=-1)
+        return collision
+
+    def check(self, p, p_next=None):
+        """
+        Return collision checks (True=collision) for the given positions (..., 3), or if p_next is
+        given, for the segments between p and p_next (e.g. the previous and current positions).
+        """
+        return np.any(self.gate_hits(p, p_next), axis=-1) | self._environment_hits(p, p_next)
+
+
+def _grid_coords(p, reso, xl, yl, zl, shape, out_of_bounds):
+    """Return the grid coordinates (clipped to the grid) of the positions p (..., 3) and which of them
+    were outside of the grid."""
+    if out_of_bounds not in ("flag", "clip", "free"):
+        raise ValueError("Unknown out-of-bounds handling '{}'.".format(out_of_bounds))
+    coords = p2vox(p, reso, xl, yl, zl)
+    upper = np.array(shape) - 1
+    outside = np.any((coords < 0) | (coords > upper), axis=1)
+    if np.any(outside):
+        coords = np.clip(coords, 0, upper)
+    return coords, outside
+
+
+def _apply_out_of_bounds(collision, outside, out_of_bounds):
+    if out_of_bounds == "flag":
+        collision[outside] = True
+    elif out_of_bounds == "free":
+        collision[outside] = False
+    return collision
+
+
+def _rasterize_lines(start, end):
+    """
+    Vectorized version of calling bresenhamline for each (start, end) pair of grid coordinates (n x 3)
+    separately, returns all traversed (unique) grid coordinates, including the start and end points.
+    """
+    slope = end - start
+    num_steps = np.amax(np.abs(slope), axis=1)
+    nslope = _bresenhamline_nslope(slope)
+
+    # steps up to the longest line, masked for the shorter ones
+    steps = np.arange(1, np.amax(num_steps, initial=0) + 1)
+    lines = np.rint(start[:, np.newaxis, :] + nslope[:, np.newaxis, :] * steps[np.newaxis, :, np.newaxis])
+    lines = lines[steps[np.newaxis, :] <= num_steps[:, np.newaxis]].astype(start.dtype)
+
+    return np.unique(np.vstack((start, lines, end)), axis=0)
+
+
 def track2colliders(track, reso, xl, yl, zl, pad, zfloor, debug=False):
     """
     Return a 3d occupancy map "colliders" from gate poses (track dataframe).
@@ -141,9 +430,7 @@ def track2colliders(track, reso, xl, yl, zl, pad, zfloor, debug=False):
     """
 
     # Make an empty occupancy grid
-    colliders = np.zeros((int(np.diff(xl) / reso),
-                          int(np.diff(yl) / reso),
-                          int(np.diff(zl) / reso),))
+    colliders = np.zeros(grid_shape(reso, xl, yl, zl), dtype=np.uint8)
 
     # Enlarge gate dimensions a bit to fall between inner and outer dimensions
     track['dy'] += 0.25
@@ -161,20 +448,16 @@ def track2colliders(track, reso, xl, yl, zl, pad, zfloor, debug=False):
     }
 
     # Find occupied coordinates between corner pairs
-    c = np.empty((0, 3))
-    for c1, c2 in [('ul', 'ur'), ('ur', 'lr'), ('lr', 'll'), ('ll', 'ul')]:
-        for i in range(cdict[c1].shape[0]):
-            c = np.vstack((c, bresenhamline(
-                p2vox(cdict[c1][i:i + 1, :], reso, xl, yl, zl),
-                p2vox(cdict[c2][i:i + 1, :], reso, xl, yl, zl))))
-
-    # Fill the occupancy grid
+    edges = [('ul', 'ur'), ('ur', 'lr'), ('lr', 'll'), ('ll', 'ul')]
+    c = _rasterize_lines(
+        p2vox(np.vstack([cdict[c1] for c1, _ in edges]), reso, xl, yl, zl),
+        p2vox(np.vstack([cdict[c2] for _, c2 in edges]), reso, xl, yl, zl))
+
+    # Fill the occupancy grid (one slice assignment per unique voxel is faster than
+    # any vectorized dilation for the few hundred voxels of a track)
     w = int(pad / reso)
-    for i in range(c.shape[0]):
-        # print('{}/{}'.format(i,c.shape[0]))
-        colliders[int(np.floor(c[i, 0] - w)):int(np.floor(c[i, 0] + w)),
-        int(np.floor(c[i, 1] - w)):int(np.floor(c[i, 1] + w)),
-        int(np.floor(c[i, 2] - w)):int(np.floor(c[i, 2] + w))] = 1
+    for (x0, y0, z0), (x1, y1, z1) in zip(np.maximum(c - w, 0), c + w):
+        colliders[x0:x1, y0:y1, z0:z1] = 1
 
     # Set voxels below ground floor to occupied
     colliders[:, :, :int((zfloor - zl[0]) / reso)] = 1
@@ -199,12 +482,139 @@ def track2colliders(track, reso, xl, yl, zl, pad, zfloor, debug=False):
     return colliders
 
 
-def check_collision(p, colliders, reso, xl, yl, zl):
+def _cache_path(track_bytes, params, cache_dir, track_path, prefix):
+    key = hashlib.sha1(track_bytes)
+    key.update(repr((_CACHE_VERSION,) + tuple(params)).encode())
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(os.path.abspath(track_path)), "collision_maps")
+    return os.path.join(cache_dir, "{}_{}.npy".format(prefix, key.hexdigest()[:20]))
+
+
+def _save_atomic(cache_path, data):
+    # write to a temporary file first so that other processes never see a partially written file
+    cache_dir = os.path.dirname(cache_path)
+    os.makedirs(cache_dir, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(suffix=".npy", dir=cache_dir)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            np.save(f, data)
+        os.replace(temp_path, cache_path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+
+def _grid_params(reso, xl, yl, zl, pad, zfloor, z_offset):
+    return (float(reso), tuple(map(float, xl)), tuple(map(float, yl)), tuple(map(float, zl)),
+            float(pad), float(zfloor), float(z_offset))
+
+
+def load_colliders(track_path, reso, xl, yl, zl, pad, zfloor, z_offset=0.0, packed=True, cache_dir=None,
+                   mmap=True):
+    """
+    Returns the CollisionMap for the track stored at track_path (with z_offset added to the gate heights),
+    using an on-disk cache keyed by the contents of the track file and all of the grid parameters.
+
+    The cached maps are stored as uncompressed .npy files (in cache_dir, by default in a "collision_maps"
+    directory next to the track file) of the (bit-packed) data, so that they can be memory-mapped
+    (read-only) and shared between processes instead of each of them holding its own copy.
+    """
+    with open(track_path, "rb") as f:
+        track_bytes = f.read()
+    cache_path = _cache_path(track_bytes, _grid_params(reso, xl, yl, zl, pad, zfloor, z_offset) + (packed,),
+                             cache_dir, track_path, "colliders")
+
+    if not os.path.exists(cache_path):
+        track = pd.read_csv(io.BytesIO(track_bytes))
+        track["pz"] += z_offset
+        collision_map = CollisionMap.from_track(track, reso, xl, yl, zl, pad, zfloor, packed=packed)
+        _save_atomic(cache_path, collision_map.data)
+        if not mmap:
+            return collision_map
+
+    data = np.load(cache_path, mmap_mode="r" if mmap else None)
+    return CollisionMap(data, reso, xl, yl, zl, packed=packed)
+
+
+def load_signed_distance_field(track_path, reso, xl, yl, zl, pad, zfloor, z_offset=0.0, cache_dir=None,
+                               mmap=True):
+    """
+    Returns the SignedDistanceField for the track stored at track_path, cached the same way as the
+    collision maps by load_colliders (the distance transform takes a few seconds for the full arena).
+    """
+    with open(track_path, "rb") as f:
+        track_bytes = f.read()
+    cache_path = _cache_path(track_bytes, _grid_params(reso, xl, yl, zl, pad, zfloor, z_offset),
+                             cache_dir, track_path, "sdf")
+
+    if not os.path.exists(cache_path):
+        collision_map = load_colliders(track_path, reso, xl, yl, zl, pad, zfloor, z_offset=z_offset,
+                                       cache_dir=cache_dir, mmap=False)
+        sdf = SignedDistanceField.from_colliders(collision_map)
+        _save_atomic(cache_path, sdf.data)
+        if not mmap:
+            return sdf
+
+    data = np.load(cache_path, mmap_mode="r" if mmap else None)
+    return SignedDistanceField(data, reso, xl, yl, zl)
+
+
+def load_gate_distance_field(track, frame_width, reso, xl, yl, zl, frame_depth=None, dims_offset=0.0,
+                             cache_dir=None, mmap=True):
+    """
+    Returns the SignedDistanceField of the gate frames of GateColliders.from_track (without the floor and
+    the walls) for the given track dataframe, cached the same way as by load_signed_distance_field, but keyed
+    by the CSV contents of the dataframe (e.g. for gate dimensions that differ from the track file) and stored
+    in cache_dir (by default in ~/.cache/flightil/collision_maps).
+    """
+    if cache_dir is None:
+        cache_dir = os.path.join(os.getenv("HOME", "/tmp"), ".cache", "flightil", "collision_maps")
+    frame_depth = frame_width if frame_depth is None else frame_depth
+    params = (float(reso), tuple(map(float, xl)), tuple(map(float, yl)), tuple(map(float, zl)),
+              float(frame_width), float(frame_depth), float(dims_offset))
+    cache_path = _cache_path(track.to_csv(index=False).encode(), params, cache_dir, None, "gate_sdf")
+
+    if not os.path.exists(cache_path):
+        colliders = GateColliders.from_track(track, frame_width, frame_depth, dims_offset=dims_offset)
+        sdf = SignedDistanceField.from_colliders(colliders.to_grid(reso, xl, yl, zl), reso, xl, yl, zl)
+        _save_atomic(cache_path, sdf.data)
+        if not mmap:
+            return sdf
+
+    data = np.load(cache_path, mmap_mode="r" if mmap else None)
+    return SignedDistanceField(data, reso, xl, yl, zl)
+
+
+def load_gate_colliders(track_path, pad, zfloor, xl=None, yl=None, zl=None, z_offset=0.0):
+    """
+    Returns the GateColliders for the track stored at track_path (with z_offset added to the gate heights),
+    matching the geometry of the voxel map computed by load_colliders with the same parameters.
+    """
+    track = pd.read_csv(track_path)
+    track["pz"] += z_offset
+    return GateColliders.from_track(track, 2 * pad, dims_offset=0.25, zfloor=zfloor, xl=xl, yl=yl, zl=zl)
+
+
+def check_collision(p, colliders, reso=None, xl=None, yl=None, zl=None, out_of_bounds="flag"):
     """Returns collision checks (True=collision, False=No collision) for given
-    positions (p), collider map (colliders), map resolution and limits."""
-    coords = p2vox(p.reshape((-1, 3)), reso, xl, yl, zl)
-    return np.array([colliders[coords[i, 0], coords[i, 1], coords[i, 2]] for i in
-                     range(p.shape[0])]).astype(bool)
+    positions (p), collider map (colliders), map resolution and limits (only
+    needed if colliders is an occupancy grid instead of a CollisionMap or
+    GateColliders).
+
+    p = np.array (..., 3), e.g. (n, 3) or (batch, time, 3), the returned
+        boolean array has shape p.shape[:-1]
+    out_of_bounds = str,  # How to handle positions outside of the grid:
+        "flag" (count as collision), "clip" (use the closest voxel in the grid)
+        or "free" (count as no collision)
+    """
+    p = np.asarray(p)
+    if isinstance(colliders, GateColliders):
+        return colliders.check(p)
+    if isinstance(colliders, CollisionMap):
+        return colliders.check(p, out_of_bounds)
+    coords, outside = _grid_coords(p, reso, xl, yl, zl, colliders.shape, out_of_bounds)
+    collision = colliders[coords[:, 0], coords[:, 1], coords[:, 2]].astype(bool)
+    return _apply_out_of_bounds(collision, outside, out_of_bounds).reshape(p.shape[:-1])
 
 
 if __name__ == "__main__":
@@ -221,7 +221,23 @@ class DaggerSetting(Settings):
                     trajectory_list.append(os.path.join(self.trajectory_path, file))
                 self.trajectory_path = trajectory_list
             self.return_extra_info = sim_conf.get("return_extra_info", False)
+            self.headless = sim_conf.get("headless", False)
+            self.reference_interpolation = sim_conf.get("reference_interpolation", "nearest_below")
+            self.compile_expert = sim_conf.get("compile_expert", False)
+            self.expert_solver_type = sim_conf.get("expert_solver_type", "ipopt")
+            assert self.expert_solver_type in ["ipopt", "rti"], \
+                "Unknown expert solver type '{}'!".format(self.expert_solver_type)
+            self.expert_stats_format = sim_conf.get("expert_stats_format", "none")
+            assert self.expert_stats_format in ["none", "csv", "parquet"], \
+                "Unknown expert stats format '{}'!".format(self.expert_stats_format)
+            self.collision_detection = sim_conf.get("collision_detection", "voxel")
+            assert self.collision_detection in ["voxel", "analytic"], \
+                "Unknown collision detection '{}'!".format(self.collision_detection)
 
             assert not (self.use_fts_tracks and self.use_images), "Can only use one of feature tracks and images!"
             assert not (self.attention_branching and self.gate_direction_branching), \
                 "Can only use one of attention branching and gate direction branching!"
+            assert not (self.headless and (self.use_fts_tracks or self.use_images or self.attention_masking
+                                           or self.attention_fts_type != "none" or self.attention_branching
+                                           or self.attention_record_all_features)), \
+                "Headless simulation (without rendering) can only be used with state-only inputs!"
@@ -84,8 +84,10 @@ class ControllerLearning:
         # objects
         self.feature_tracker = FeatureTracker(int(self.config.min_number_fts * 1.5))
         self.learner = BodyrateLearner(settings=self.config, expect_partial=(mode == "testing"))
-        self.planner = TrajectoryPlanner(trajectory_path, 4.0, 0.2, max_time=max_time)
-        self.expert = MPCSolver(4.0, 0.2)
+        self.planner = TrajectoryPlanner(trajectory_path, 4.0, 0.2, max_time=max_time,
+                                         interpolation=self.config.reference_interpolation)
+        self.expert = MPCSolver(4.0, 0.2, compile_solver=self.config.compile_expert,
+                                solver_type=self.config.expert_solver_type)
 
         # TODO: should probably only have one of these at a time and gather some sort of attention features
         #  => also need to set the feature size according to that
@@ -229,7 +231,8 @@ class ControllerLearning:
         elif max_time is None:
             max_time = self.planner.get_final_time_stamp()
 
-        self.planner = TrajectoryPlanner(trajectory_path, 4.0, 0.2, max_time=max_time)
+        self.planner = TrajectoryPlanner(trajectory_path, 4.0, 0.2, max_time=max_time,
+                                         interpolation=self.config.reference_interpolation)
 
     def update_simulation_time(self, simulation_time):
         self.simulation_time = simulation_time
@@ -326,19 +329,23 @@ class ControllerLearning:
             self.image_queue.append(processed_image)
 
     def update_info(self, info_dict):
+        # info_dict can be the StepResult returned by the simulation or a plain dict with the same keys
         if info_dict["collision"]:
             self.collision = 1
         self.update_simulation_time(info_dict["time"])
         self.update_state(info_dict["state"])
         self.update_state_estimate(info_dict["state_estimate"])
-        if info_dict["update"]["image"]:
-            self.update_image(info_dict["image"])
-        if info_dict["update"]["reference"]:
+        update = info_dict["update"]
+        if update["reference"]:
             self.update_reference(info_dict["reference"])
-        if info_dict["update"]["command"]:
-            self.prepare_network_command()
-        if info_dict["update"]["expert"]:
+        # the expert does not depend on the image, so it is computed first, while the image might still be rendering
+        # (reading it from a StepResult waits for the render to finish)
+        if update["expert"]:
             self.prepare_expert_command()
+        if update["image"]:
+            self.update_image(info_dict["image"])
+        if update["command"]:
+            self.prepare_network_command()
 
     def prepare_network_command(self):
         # format the inputs
@@ -368,7 +375,7 @@ class ControllerLearning:
         planned_traj = np.array(planned_traj)
 
         # run non-linear model predictive control
-        optimal_action, predicted_traj, cost = self.expert.solve(planned_traj)
+        optimal_action, predicted_traj, cost, _ = self.expert.solve(planned_traj)
         self.control_command = optimal_action
 
     def get_control_command(self):
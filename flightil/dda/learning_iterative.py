@@ -74,7 +74,28 @@ class Trainer:
             self.settings, self.trajectory_path[0] if self.multiple_trajectories else self.trajectory_path,
             mode="iterative", max_time=self.settings.max_time,
         )
-        self.connect_to_sim = True
+        # when running headless there is no Unity instance to connect (and wait for)
+        self.connect_to_sim = not self.simulation.headless
+
+    def _save_expert_stats(self):
+        # per-solve stats of the expert for the last rollout, next to metrics.csv
+        summary = self.learner.expert.summarise_solve_stats()
+        if summary["num_solves"] > 0:
+            print("Expert solve time p50|p95|max {:.2f}|{:.2f}|{:.2f}ms, {:.2f} iterations, {:.2f}% failed".format(
+                1000.0 * summary["latency_p50"], 1000.0 * summary["latency_p95"], 1000.0 * summary["latency_max"],
+                summary["iterations_mean"], 100.0 * summary["failure_rate"]))
+
+        if self.settings.expert_stats_format == "none":
+            return
+        stats = self.learner.expert.get_solve_stats()
+        file_name = os.path.join(self.settings.log_dir, "expert_stats_rollout-{:04d}".format(self.learner.rollout_idx))
+        if self.settings.expert_stats_format == "parquet":
+            try:
+                stats.to_parquet(file_name + ".parquet", index=False)
+                return
+            except ImportError:
+                print("[Trainer] WARNING: Parquet is not available (requires pyarrow or fastparquet), saving as CSV.")
+        stats.to_csv(file_name + ".csv", index=False)
 
     def perform_testing(self):
         if self.multiple_trajectories:
@@ -223,6 +244,7 @@ class Trainer:
             if info_dict["time"] > self.settings.start_buffer:
                 self.learner.start_data_recording()
             self.learner.reset()
+            self.learner.expert.clear_solve_stats()
             self.learner.update_info(info_dict)
             self.learner.prepare_network_command()
             self.learner.prepare_expert_command()
@@ -289,7 +311,9 @@ class Trainer:
             print("Expert|network|randomised used {:06.3f}|{:06.3f}|{:06.3f}% of the time"
                   .format(100.0 * usage["expert"], 100.0 * usage["network"], 100.0 * usage["randomised"]))
             print("Mean tracking error is {:.3f}".format(tracking_error))
-            print("Median tracking error is {:.3f}\n".format(median_traj_error))
+            print("Median tracking error is {:.3f}".format(median_traj_error))
+            self._save_expert_stats()
+            print()
 
             with open(os.path.join(self.settings.log_dir, "metrics.csv"), "a") as f:
                 writer = csv.writer(f)
@@ -300,7 +324,7 @@ class Trainer:
                 # here the simulation basically seems to be stopped while the network is being trained
                 if self.settings.disconnect_when_training:
                     self.simulation.disconnect_unity()
-                    self.connect_to_sim = True
+                    self.connect_to_sim = not self.simulation.headless
                 self.learner.train()
 
             if self.learner.rollout_idx % self.settings.test_every_n_rollouts == 0:
@@ -446,6 +470,7 @@ class Trainer:
             if self.multiple_trajectories:
                 self.learner.update_trajectory(self.trajectory_path[trajectory_index], max_time_from_new=True)
             self.learner.reset()
+            self.learner.expert.clear_solve_stats()
             self.learner.update_info(info_dict)
             self.learner.prepare_network_command()
             self.learner.prepare_expert_command()
@@ -519,7 +544,9 @@ class Trainer:
                   .format(100.0 * usage["expert"], 100.0 * usage["network"], 100.0 * usage["randomised"]))
             print("Mean tracking error is {:.3f}".format(tracking_error))
             print("Median tracking error is {:.3f}".format(median_traj_error))
-            print("Number of collisions: {}\n".format(rollout_collisions))
+            print("Number of collisions: {}".format(rollout_collisions))
+            self._save_expert_stats()
+            print()
 
             with open(os.path.join(self.settings.log_dir, "metrics.csv"), "a") as f:
                 writer = csv.writer(f)
@@ -532,7 +559,7 @@ class Trainer:
                 # here the simulation basically seems to be stopped while the network is being trained
                 if self.settings.disconnect_when_training:
                     self.simulation.disconnect_unity()
-                    self.connect_to_sim = True
+                    self.connect_to_sim = not self.simulation.headless
                 self.learner.train()
 
             """
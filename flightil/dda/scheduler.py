@@ -0,0 +1,110 @@
+import math
+
+import numpy as np
+
+from fractions import Fraction
+
+
+def _to_fraction(frequency):
+    # frequencies come from the YAML configs as ints or floats, limiting the denominator
+    # keeps e.g. 30.000000001 from blowing up the common tick rate
+    return Fraction(frequency).limit_denominator(1000)
+
+
+def _lcm(a, b):
+    return a * b // math.gcd(a, b)
+
+
+class MultiRateScheduler:
+    """
+    Integer-tick scheduler for the different update rates of a simulation.
+
+    All frequencies are expressed as integer multiples of one common tick (the LCM of all of them), so
+    that the "does X need to be updated at this step" decisions do not depend on accumulating floating
+    point timers. The update masks for a whole rollout are computed once, after which looking up the
+    updates for a base step is just an index into an array.
+
+    An update for a rate happens at base step n if one of its events (at multiples of its period) falls
+    into the interval (t_{n-1}, t_n]. All rates have an event at t = 0, which is handled at step 0 (i.e.
+    on reset), unless the rate is listed in defer_initial, in which case it is handled at step 1.
+    """
+
+    def __init__(self, base_frequency, frequencies, defer_initial=()):
+        self.base_frequency = base_frequency
+        self.names = list(frequencies.keys())
+        self.frequencies = [frequencies[n] for n in self.names]
+        self.defer_initial = [n for n in defer_initial if n in self.names]
+
+        base_frequency = _to_fraction(base_frequency)
+        all_frequencies = [_to_fraction(f) for f in self.frequencies]
+        for name, frequency in zip(self.names, all_frequencies):
+            if frequency <= 0:
+                raise ValueError("Frequency for '{}' has to be positive, got {}.".format(name, frequency))
+
+        # LCM of the frequencies (as fractions) is the LCM of the numerators over the GCD of the denominators
+        numerator, denominator = base_frequency.numerator, base_frequency.denominator
+        for frequency in all_frequencies:
+            numerator = _lcm(numerator, frequency.numerator)
+            denominator = math.gcd(denominator, frequency.denominator)
+        self.tick_frequency = Fraction(numerator, denominator)
+
+        # periods in number of ticks
+        self.base_ticks = int(self.tick_frequency / base_frequency)
+        self.period_ticks = np.array([int(self.tick_frequency / f) for f in all_frequencies], dtype=np.int64)
+
+        self.num_steps = 0
+        self.update_masks = np.zeros((0, len(self.names)), dtype=bool)
+        self.done_mask = np.zeros((0,), dtype=bool)
+        self.time_stamps = np.zeros((0,))
+        self._total_time = None
+
+    def build(self, total_time):
+        # steps 0, ..., N where N is the first step with time > total_time (after which the rollout is done)
+        self._total_time = total_time
+        last_step = int(np.floor(total_time * self.base_frequency)) + 1
+        self._compute(last_step + 1)
+
+    def _compute(self, num_steps):
+        steps = np.arange(num_steps, dtype=np.int64)
+
+        # number of events that have happened up to (and including) each step; an update is due
+        # whenever this increases from one step to the next
+        events = (steps[:, np.newaxis] * self.base_ticks) // self.period_ticks[np.newaxis, :]
+        update_masks = np.empty((num_steps, len(self.names)), dtype=bool)
+        update_masks[0] = True
+        update_masks[1:] = events[1:] > events[:-1]
+        for name in self.defer_initial:
+            index = self.names.index(name)
+            update_masks[0, index] = False
+            if num_steps > 1:
+                update_masks[1, index] = True
+
+        self.num_steps = num_steps
+        self.update_masks = update_masks
+        self.time_stamps = steps / self.base_frequency
+        if self._total_time is None:
+            self.done_mask = np.zeros((num_steps,), dtype=bool)
+        else:
+            self.done_mask = self.time_stamps > self._total_time
+
+        # plain Python rows for the per-step lookup, indexing into the NumPy array
+        # and converting the result would be (comparatively) slow
+        self._rows = [tuple(r) for r in update_masks.tolist()]
+        self._done = self.done_mask.tolist()
+
+    def updates(self, step):
+        if step >= self.num_steps:
+            # should only happen if the simulation is stepped past the end of the rollout
+            self._compute(max(2 * self.num_steps, step + 1))
+        return self._rows[step]
+
+    def done(self, step):
+        if step >= self.num_steps:
+            self._compute(max(2 * self.num_steps, step + 1))
+        return self._done[step]
+
+    def time(self, step):
+        return step / self.base_frequency
+
+    def mask(self, name):
+        return self.update_masks[:, self.names.index(name)]
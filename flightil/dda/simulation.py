@@ -4,13 +4,13 @@ import numpy as np
 
 from collections import deque
 
-import pandas as pd
-
 from planning.planner import TrajectorySampler
 # from old.mpc.simulation.mpc_test_wrapper import MPCTestWrapper
 from envs.racing_env_wrapper import RacingEnvWrapper
+from envs.vec_racing_env_wrapper import VecRacingEnvWrapper
 from features.imu import IMURawMeasurements
-from dda.collisions import track2colliders, check_collision
+from dda.collisions import load_colliders, load_gate_colliders, check_collision
+from dda.scheduler import MultiRateScheduler
 
 # TODO: remove this stuff or put it somewhere else
 # state index
@@ -32,12 +32,107 @@ kWy = 2
 kWz = 3
 
 
+class UpdateFlags:
+    """Which of the (multi-rate) quantities were updated in the current step."""
+
+    __slots__ = ("image", "reference", "command", "expert")
+
+    def __init__(self):
+        self.image = False
+        self.reference = False
+        self.command = False
+        self.expert = False
+
+    # dict-like access for code that still uses info_dict["update"]["image"] etc.
+    def __getitem__(self, key):
+        return getattr(self, key)
+
+    def __setitem__(self, key, value):
+        setattr(self, key, value)
+
+    def keys(self):
+        return self.__slots__
+
+    def items(self):
+        return [(k, getattr(self, k)) for k in self.__slots__]
+
+    def to_dict(self):
+        return dict(self.items())
+
+    def __repr__(self):
+        return repr(self.to_dict())
+
+
+class StepResult:
+    """
+    Result of Simulation.reset/step. One instance is kept per simulation and updated in place on
+    every step (instead of building new nested dicts), so it should not be stored across steps;
+    use to_dict() for a snapshot. Supports the same item access as the dicts that were returned before.
+    The image of a pending (asynchronous) render request is only collected when it is first read.
+    """
+
+    _fields = ("done", "time", "collision", "state", "state_estimate", "image", "reference", "update")
+    __slots__ = ("done", "time", "collision", "state", "state_estimate", "_image", "_image_loader", "reference",
+                 "update")
+
+    def __init__(self):
+        self.done = False
+        self.time = 0.0
+        self.collision = False
+        self.state = None
+        self.state_estimate = None
+        self._image = None
+        self._image_loader = None
+        self.reference = None
+        self.update = UpdateFlags()
+
+    @property
+    def image(self):
+        if self._image_loader is not None:
+            loader, self._image_loader = self._image_loader, None
+            self._image = loader()
+        return self._image
+
+    @image.setter
+    def image(self, value):
+        self._image = value
+        self._image_loader = None
+
+    def defer_image(self, loader):
+        self._image = None
+        self._image_loader = loader
+
+    def __getitem__(self, key):
+        return getattr(self, key)
+
+    def __setitem__(self, key, value):
+        setattr(self, key, value)
+
+    def __contains__(self, key):
+        return key in self._fields
+
+    def keys(self):
+        return self._fields
+
+    def items(self):
+        return [(k, getattr(self, k)) for k in self._fields]
+
+    def to_dict(self):
+        result = dict(self.items())
+        result["update"] = self.update.to_dict()
+        return result
+
+    def __repr__(self):
+        return repr(self.to_dict())
+
+
 class Simulation:
 
     def __init__(self, config):
         self.config = config
 
         self.current_image = None
+        self.image_pending = False
         self.current_state = None
         self.current_state_estimate = None
         self.current_reference = None
@@ -50,32 +145,16 @@ class Simulation:
 
         assert self.base_frequency >= self.command_frequency
 
-        self.base_time_step = 1.0 / self.base_frequency
-        self.image_time_step = 1.0 / self.image_frequency
-        self.ref_time_step = 1.0 / self.ref_frequency
-        self.command_time_step = 1.0 / self.command_frequency
-        self.expert_command_time_step = 1.0 / self.expert_command_frequency
-
-        base_time_step_int = self.base_time_step / self.base_time_step
-        image_time_step_int = self.image_time_step / self.base_time_step
-        ref_time_step_int = self.ref_time_step / self.base_time_step
-        command_time_step_int = self.command_time_step / self.base_time_step
-        expert_command_time_step_int = self.expert_command_time_step / self.base_time_step
-
-        """
-        print(base_time_step_int, image_time_step_int, ref_time_step_int,
-              command_time_step_int, expert_command_time_step_int, sep="\n")
-        print()
-        print(np.lcm.reduce([self.base_frequency, self.image_frequency, self.ref_frequency, self.command_frequency, self.expert_command_frequency]))
-        print(np.lcm.reduce([100, 20, 50, 100, 20]))
-        print()
-        """
+        self.base_time_step = None
+        self.image_time_step = None
+        self.ref_time_step = None
+        self.command_time_step = None
+        self.expert_command_time_step = None
+        self.scheduler = None
+        self._init_scheduler()
 
+        self.step_index = 0
         self.base_time = 0.0
-        self.image_time = 0.0
-        self.ref_time = 0.0
-        self.command_time = 0.0
-        self.expert_command_time = 0.0
 
         self.total_time = 10.0  # TODO: make this dependent on the trajectory
         self.trajectory_done = False
@@ -86,100 +165,132 @@ class Simulation:
         self.expert_to_be_updated = False
         self.collision = False
 
+        # reused for every step, see StepResult
+        self.result = StepResult()
+
+    def _init_scheduler(self):
+        self.base_time_step = 1.0 / self.base_frequency
+        self.image_time_step = 1.0 / self.image_frequency
+        self.ref_time_step = 1.0 / self.ref_frequency
+        self.command_time_step = 1.0 / self.command_frequency
+        self.expert_command_time_step = 1.0 / self.expert_command_frequency
+
+        # the network command is not computed on reset (but explicitly by the "user"), so the
+        # first update for it only happens on the first step (same as for the old float timers)
+        self.scheduler = MultiRateScheduler(self.base_frequency, {
+            "image": self.image_frequency,
+            "reference": self.ref_frequency,
+            "command": self.command_frequency,
+            "expert": self.expert_command_frequency,
+        }, defer_initial=("command",))
+
     def reset(self):
+        # an image from the last rollout that was never read is not needed anymore
+        self.image_pending = False
+
+        self.step_index = 0
         self.base_time = 0.0
-        self.image_time = 0.0
-        self.ref_time = 0.0
-        self.command_time = 0.0
-        self.expert_command_time = 0.0
 
         self.total_time = 10.0
         self.trajectory_done = False
-
-        self.image_updated = False
-        self.reference_updated = False
-        self.command_to_be_updated = False
-        self.expert_to_be_updated = False
         self.collision = False
 
         self._reset()
 
+        # total time might have been changed by the subclass
+        self.scheduler.build(self.total_time)
+        (self.image_updated, self.reference_updated,
+         self.command_to_be_updated, self.expert_to_be_updated) = self.scheduler.updates(self.step_index)
+
         self.current_state, success = self._get_state()
+        self._request_image()
         self.current_state_estimate = self._get_state_estimate()
-        self.current_image = self._get_image()
         self.current_reference = self._get_reference()
         self.expert_to_be_updated = self._determine_expert_update()
         self.collision = self._determine_collision()
+        self._update_image()
 
-        result = {
-            "done": self.trajectory_done,
-            "time": self.base_time,
-            "collision": self.collision,
-            "state": self.current_state,
-            "state_estimate": self.current_state_estimate,
-            "image": self.current_image,
-            "reference": self.current_reference,
-            "update": {
-                "image": self.image_updated,
-                "reference": self.reference_updated,
-                "command": self.command_to_be_updated,
-                "expert": self.expert_to_be_updated,
-            },
-        }
-        return result
+        return self._update_result()
 
     def step(self, action):
-        # self.command_time += self.command_time_step
-
-        self.image_updated = False
-        self.reference_updated = False
-        self.command_to_be_updated = False
-        self.expert_to_be_updated = False
+        # an image that was requested in the last step but never read still has to be collected
+        if self.image_pending:
+            self._collect_image()
 
-        # successes = []
-
-        # TODO: somehow need to change this so that even at faster rates the correct thing is returned...
-        #  => just return after one "base step"?
-        #  => have queues of stuff...
-        #  => also, images should probably have time_stamps attached, since otherwise the velocity calc will be wrong
-
-        # while self.base_time < self.command_time <= self.total_time:
-        # TODO: this apparently leads to numerical problems... would probably be better to use integers for counting... somehow
-        self.base_time += self.base_time_step
-        if self.command_time <= self.base_time:
-            self.command_time += self.command_time_step
-            self.command_to_be_updated = True
+        # all timing is based on the integer step counter, the updates that are due
+        # for each step have already been computed by the scheduler on reset
+        self.step_index += 1
+        self.base_time = self.step_index * self.base_time_step
+        (self.image_updated, self.reference_updated,
+         self.command_to_be_updated, self.expert_to_be_updated) = self.scheduler.updates(self.step_index)
 
         self.current_state, success = self._get_state(action)
+        self._request_image()
         self.current_state_estimate = self._get_state_estimate()
-        self.current_image = self._get_image()
         self.current_reference = self._get_reference()
         self.expert_to_be_updated = self._determine_expert_update()
         self.collision = self._determine_collision()
-        # successes.append(success)
-
-        # TODO: also need to check for collisions here!!
-
-        if self.base_time > self.total_time:  # or self.command_time > self.total_time:
-            # TODO: there should be a more elegant way of doing this than having to check the command_time separately
-            self.trajectory_done = True
-
-        result = {
-            "done": self.trajectory_done,
-            "time": self.base_time,
-            "collision": self.collision,
-            "state": self.current_state,
-            "state_estimate": self.current_state_estimate,
-            "image": self.current_image,
-            "reference": self.current_reference,
-            "update": {
-                "image": self.image_updated,
-                "reference": self.reference_updated,
-                "command": self.command_to_be_updated,
-                "expert": self.expert_to_be_updated,
-            },
-        }
+        self._update_image()
+
+        self.trajectory_done = self.scheduler.done(self.step_index)
+
+        return self._update_result()
+
+    def _init_collision_map(self, wave_track):
+        track_path = os.path.join(
+            os.getenv("HOME", "/home/simon"),
+            "dda-inputs", "tracks",
+            "{}.csv".format("wave" if wave_track else "flat")
+        )
+        self.collision_resolution = 0.1
+        self.collision_limits_x = (-30, 30)
+        self.collision_limits_y = (-20, 20)
+        self.collision_limits_z = (-1, 8 if wave_track else 5)
+        self.collision_detection = self.config.collision_detection
+        self.previous_position = None
+        if not os.path.exists(track_path):
+            self.collision_map = None
+            print("\n[{}] WARNING: Could not find track data at '{}', "
+                  "collision detection will not work.\n".format(type(self).__name__, track_path))
+        elif self.collision_detection == "analytic":
+            # oriented boxes for the gate frames (same geometry as the occupancy map, but without the voxels)
+            self.collision_map = load_gate_colliders(
+                track_path,
+                0.5, 0.0,
+                self.collision_limits_x,
+                self.collision_limits_y,
+                self.collision_limits_z,
+                z_offset=0.35,
+            )
+        else:
+            # bit-packed, cached on disk and memory-mapped, so that multiple simulations share the same map
+            self.collision_map = load_colliders(
+                track_path,
+                self.collision_resolution,
+                self.collision_limits_x,
+                self.collision_limits_y,
+                self.collision_limits_z,
+                0.5, 0.0,
+                z_offset=0.35,
+            )
 
+    def _update_result(self):
+        result = self.result
+        result.done = self.trajectory_done
+        result.time = self.base_time
+        result.collision = self.collision
+        result.state = self.current_state
+        result.state_estimate = self.current_state_estimate
+        if self.image_pending:
+            result.defer_image(self._collect_image)
+        else:
+            result.image = self.current_image
+        result.reference = self.current_reference
+        update = result.update
+        update.image = self.image_updated
+        update.reference = self.reference_updated
+        update.command = self.command_to_be_updated
+        update.expert = self.expert_to_be_updated
         return result
 
     def _reset(self):
@@ -191,16 +302,31 @@ class Simulation:
     def _get_state_estimate(self):
         raise NotImplementedError()
 
+    def _request_image(self):
+        # called right after the state update, so that rendering can overlap with the remaining updates
+        pass
+
     def _get_image(self):
         raise NotImplementedError()
 
+    def _defer_image(self):
+        # whether the image can be collected later (when it is first read), e.g. because it is rendered asynchronously
+        return False
+
+    def _update_image(self):
+        self.image_pending = self._defer_image()
+        if not self.image_pending:
+            self.current_image = self._get_image()
+
+    def _collect_image(self):
+        self.image_pending = False
+        self.current_image = self._get_image()
+        return self.current_image
+
     def _get_reference(self):
         raise NotImplementedError()
 
     def _determine_expert_update(self):
-        if self.expert_command_time <= self.base_time:
-            self.expert_command_time += self.expert_command_time_step
-            self.expert_to_be_updated = True
         return self.expert_to_be_updated
 
     def _determine_collision(self):
@@ -338,11 +464,18 @@ class FlightmareSimulation(Simulation):
 
         # Flightmare wrapper/bridge, in this class mostly to get images
         self.wave_track = "wave" in trajectory_path
-        self.flightmare_wrapper = RacingEnvWrapper(config_path=config.env_config_path)
+        self.headless = config.headless
+        self.flightmare_wrapper = RacingEnvWrapper(config_path=config.env_config_path, headless=self.headless)
         # self.flightmare_wrapper = RacingEnvWrapper(wave_track=False)
-        self.current_image = np.zeros(
-            (self.flightmare_wrapper.image_width, self.flightmare_wrapper.image_height, 3), dtype=np.uint8
-        )
+        if self.headless:
+            self.current_image = self.flightmare_wrapper.placeholder_image
+        else:
+            self.current_image = np.zeros(
+                (self.flightmare_wrapper.image_width, self.flightmare_wrapper.image_height, 3), dtype=np.uint8
+            )
+        # frame ID of the latest (asynchronous) render request
+        self.render_frame_id = 0
+        self.render_requested = False
 
         # sampler to get reference states for the network only (not for the MPC expert)
         self.reference_sampler = TrajectorySampler(trajectory_path, max_time=max_time)
@@ -361,30 +494,7 @@ class FlightmareSimulation(Simulation):
             self.imu_measurements = IMURawMeasurements(self.base_frequency)
 
         # collision detection (needs to happen outside of Flightmare currently)
-        track_path = os.path.join(
-            os.getenv("HOME", "/home/simon"),
-            "dda-inputs", "tracks",
-            "{}.csv".format("wave" if self.wave_track else "flat")
-        )
-        self.collision_resolution = 0.1
-        self.collision_limits_x = (-30, 30)
-        self.collision_limits_y = (-20, 20)
-        self.collision_limits_z = (-1, 8 if self.wave_track else 5)
-        if not os.path.exists(track_path):
-            self.collision_map = None
-            print("\n[FlightmareSimulation] WARNING: Could not find track data at '{}', "
-                  "collision detection will not work.\n".format(track_path))
-        else:
-            track = pd.read_csv(track_path)
-            track["pz"] += 0.35
-            self.collision_map = track2colliders(
-                track,
-                self.collision_resolution,
-                self.collision_limits_x,
-                self.collision_limits_y,
-                self.collision_limits_z,
-                0.5, 0.0
-            )
+        self._init_collision_map(self.wave_track)
 
     ########################
     # RESET(-LIKE) METHODS #
@@ -397,6 +507,7 @@ class FlightmareSimulation(Simulation):
         # self.current_state = self.reference_sampler.get_initial_state()
         self.current_state = self.reference_sampler.get_initial_state(columns=["pos", "rot", "vel", "omega"])
         self.flightmare_wrapper.set_reduced_state(self.current_state)
+        self.previous_position = None
 
     def update_trajectory(self, trajectory_path, max_time=None, max_time_from_new=False):
         if (self.wave_track and "flat" in trajectory_path) or (not self.wave_track and "wave" in trajectory_path):
@@ -422,6 +533,7 @@ class FlightmareSimulation(Simulation):
         self.ref_frequency = config.ref_frequency  # 50.0
         self.command_frequency = config.command_frequency  # 100.0
         self.expert_command_frequency = config.expert_command_frequency  # 20.0
+        self._init_scheduler()
 
         if self.imu_measurements is None and self.config.use_raw_imu_data:
             self.imu_measurements = IMURawMeasurements(self.base_frequency)
@@ -463,33 +575,161 @@ class FlightmareSimulation(Simulation):
             self.current_state_estimate[7:10] = imu_acceleration
         return self.current_state_estimate
 
+    def _request_image(self):
+        if self.headless or not self.image_updated:
+            return
+        # the render request uses the pose at this point, the image is only collected in _get_image
+        self.render_frame_id += 1
+        self.render_requested = self.flightmare_wrapper.request_render(self.render_frame_id)
+
+    def _defer_image(self):
+        # the render request overlaps with everything that happens until the image is first read (e.g. the expert)
+        return self.image_updated and self.render_requested
+
     def _get_image(self):
-        if self.image_time <= self.base_time:
-            self.image_time += self.image_time_step
-            self.flightmare_wrapper.render()
-            self.current_image = self.flightmare_wrapper.get_image()
-            self.image_updated = True
+        if self.headless:
+            # no rendering at all, images are never "updated" (so nothing downstream processes them)
+            self.image_updated = False
+            return self.current_image
+        if self.image_updated:
+            image = None
+            if self.render_requested:
+                image = self.flightmare_wrapper.poll_image(self.render_frame_id, blocking=True)
+                self.render_requested = False
+            if image is None:
+                self.flightmare_wrapper.render()
+                image = self.flightmare_wrapper.get_image()
+            self.current_image = image
         return self.current_image
 
     def _get_reference(self):
-        if self.ref_time <= self.base_time:
-            self.ref_time += self.ref_time_step
+        if self.reference_updated:
             self.current_reference = self.reference_sampler.sample_from_trajectory(
-                self.base_time, columns=["pos", "rot", "vel", "omega"])
-            self.reference_updated = True
+                self.base_time, self.config.reference_interpolation, columns=["pos", "rot", "vel", "omega"])
         return self.current_reference
 
     def _determine_collision(self):
+        position = self.current_state_estimate[:3].reshape((1, 3))
+        previous_position, self.previous_position = self.previous_position, position.copy()
         if self.collision_map is None:
             return False
-        return check_collision(
-            self.current_state_estimate[:3].reshape((1, 3)),
-            self.collision_map,
-            self.collision_resolution,
-            self.collision_limits_x,
-            self.collision_limits_y,
-            self.collision_limits_z,
-        )
+        if self.collision_detection == "analytic" and previous_position is not None:
+            # swept check between the last two positions, so that the thin gate frames cannot be skipped
+            return self.collision_map.check(previous_position, position)
+        return check_collision(position, self.collision_map)
+
+
+class VecFlightmareSimulation(Simulation):
+    """
+    Simulation of N independent quadrotors that are stepped in lockstep (using a batched, headless
+    Flightmare environment). Actions are given as (N, 4) array, and the state, state estimate, reference
+    and collision entries of the returned StepResult are stacked along the first dimension. There is no
+    rendering, so this can only be used with state-only network inputs (images are always None).
+    """
+
+    def __init__(self, config, trajectory_paths, max_time=None, num_envs=None, num_threads=None):
+        super().__init__(config)
+
+        if self.config.use_raw_imu_data:
+            raise ValueError("Raw IMU measurements are not supported by VecFlightmareSimulation.")
+
+        # either one trajectory per quadrotor or the same trajectory for all of them
+        if isinstance(trajectory_paths, str):
+            trajectory_paths = [trajectory_paths] * (num_envs or 1)
+        self.num_envs = len(trajectory_paths)
+
+        self.state_dim = 13
+        self.action_dim = 4
+
+        # all quadrotors fly on the same track (which is hard-coded in the environment config)
+        self.wave_track = "wave" in trajectory_paths[0]
+        if any(("wave" in tp) != self.wave_track for tp in trajectory_paths):
+            raise ValueError("All trajectories for VecFlightmareSimulation have to be for the same track type.")
+        self.headless = True
+        self.flightmare_wrapper = VecRacingEnvWrapper(
+            self.num_envs, config_path=config.env_config_path, num_threads=num_threads)
+
+        # samplers to get reference states for the network only (not for the MPC expert)
+        self.reference_samplers = [TrajectorySampler(tp, max_time=max_time) for tp in trajectory_paths]
+        self.current_reference = np.zeros((self.num_envs, self.state_dim), dtype=np.float64)
+
+        self.total_time = self.get_final_time_stamp()
+
+        # quadrotor/dynamics stuff
+        self.current_state = self._get_initial_states()
+        self.flightmare_wrapper.set_reduced_states(self.current_state)
+        self.flightmare_wrapper.set_sim_time_step(self.base_time_step)
+
+        # collision detection (needs to happen outside of Flightmare currently)
+        self._init_collision_map(self.wave_track)
+
+    def get_final_time_stamp(self):
+        # the rollout is only done once the longest trajectory is done
+        return max(rs.get_final_time_stamp() for rs in self.reference_samplers)
+
+    def _get_initial_states(self):
+        return np.stack([rs.get_initial_state(columns=["pos", "rot", "vel", "omega"])
+                         for rs in self.reference_samplers])
+
+    ########################
+    # RESET(-LIKE) METHODS #
+    ########################
+
+    def _reset(self):
+        self.total_time = self.get_final_time_stamp()
+
+        self.current_state = self._get_initial_states()
+        self.flightmare_wrapper.set_reduced_states(self.current_state)
+        self.previous_position = None
+
+    def update_config(self, config):
+        self.config = config
+
+        self.base_frequency = config.base_frequency  # 100.0
+        self.image_frequency = config.image_frequency  # 30.0
+        self.ref_frequency = config.ref_frequency  # 50.0
+        self.command_frequency = config.command_frequency  # 100.0
+        self.expert_command_frequency = config.expert_command_frequency  # 20.0
+        self._init_scheduler()
+        self.flightmare_wrapper.set_sim_time_step(self.base_time_step)
+
+    ##################
+    # GETTER METHODS #
+    ##################
+
+    def _get_state(self, action=None):
+        success = False
+        if action is not None:
+            # the states are written into the wrapper's buffer in the same call
+            success = self.flightmare_wrapper.step(action)
+            self.current_state = self.flightmare_wrapper.states.copy()
+        else:
+            self.current_state = self.flightmare_wrapper.get_states()
+        return self.current_state, success
+
+    def _get_state_estimate(self):
+        self.current_state_estimate = self.current_state
+        return self.current_state_estimate
+
+    def _get_image(self):
+        self.image_updated = False
+        return None
+
+    def _get_reference(self):
+        if self.reference_updated:
+            self.current_reference = np.stack([rs.sample_from_trajectory(
+                self.base_time, self.config.reference_interpolation, columns=["pos", "rot", "vel", "omega"])
+                for rs in self.reference_samplers])
+        return self.current_reference
+
+    def _determine_collision(self):
+        positions = self.current_state_estimate[:, :3]
+        previous_positions, self.previous_position = self.previous_position, positions.copy()
+        if self.collision_map is None:
+            return np.zeros((self.num_envs,), dtype=bool)
+        if self.collision_detection == "analytic" and previous_positions is not None:
+            return self.collision_map.check(previous_positions, positions)
+        return check_collision(positions, self.collision_map)
 
 
 if __name__ == "__main__":
@@ -502,6 +742,5 @@ if __name__ == "__main__":
     while not trajectory_done:
         res = simulation.step(act)
         trajectory_done = res["done"]
-        print("base: {:.3f} - image: {:.3f} - ref: {:.3f} - command: {:.3f} - expert command: {:.3f} (update = {})".format(
-            simulation.base_time, simulation.image_time, simulation.ref_time,
-            simulation.command_time, simulation.expert_command_time, res["update"]))
+        print("step: {:04d} - base: {:.3f} (update = {})".format(
+            simulation.step_index, simulation.base_time, res["update"]))
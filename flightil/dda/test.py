@@ -170,12 +170,13 @@ def main(args):
             simulation = FlightmareSimulation(settings, trajectory_paths[0], max_time=settings.max_time)
 
             # connect to the simulation either at the start or after training has been run
-            simulation.connect_unity(settings.flightmare_pub_port, settings.flightmare_sub_port)
+            if not simulation.headless:
+                simulation.connect_unity(settings.flightmare_pub_port, settings.flightmare_sub_port)
 
-            # wait until Unity rendering/image queue has calmed down
-            for _ in range(50):
-                simulation.flightmare_wrapper.get_image()
-                time.sleep(0.1)
+                # wait until Unity rendering/image queue has calmed down
+                for _ in range(50):
+                    simulation.flightmare_wrapper.get_image()
+                    time.sleep(0.1)
         else:
             # hopefully this works as intended, in principle nothing should change for all models we are testing for
             # but if this is changed later, that might not be the case (similar to the track type being set)
@@ -6,22 +6,29 @@ from flightgym import RacingEnv
 
 class RacingEnvWrapper:
 
-    def __init__(self, rendering_only=False, config_path=None):
+    def __init__(self, rendering_only=False, config_path=None, headless=False):
+        # in headless mode only the quadrotor dynamics are simulated, there is no connection to Unity
+        self.headless = headless
         self.env = RacingEnv(
             config_path or os.path.join(os.getenv("FLIGHTMARE_PATH"), "flightlib/configs/racing_env.yaml"),
             rendering_only,
+            headless,
         )
 
         self.image_height = self.env.getImageHeight()
         self.image_width = self.env.getImageWidth()
         self.state_dim = self.env.getStateDim()
 
-        self.image = np.zeros((self.image_height * self.image_width * 3,), dtype=np.uint8)
+        # images are written directly into this (HWC) buffer through a flat view of it, get_image returns a view
+        # of the buffer (which is overwritten by the next call), the same way the previous planar buffer was used
+        self.image = np.zeros((self.image_height, self.image_width, 3), dtype=np.uint8)
+        self._image_flat = self.image.reshape(-1)
         self.optical_flow = np.zeros((self.image_height * self.image_width * 2,), dtype=np.float32)
         self.state = np.zeros((self.state_dim,), dtype=np.float32)
 
-    def _reshape_image(self, image):
-        return np.reshape(image, (3, self.image_height, self.image_width)).transpose((1, 2, 0))
+        # read-only (broadcast) view of a single black pixel, returned instead of images when headless
+        self.placeholder_image = np.broadcast_to(
+            np.zeros((1, 1, 3), dtype=np.uint8), (self.image_height, self.image_width, 3))
 
     def _reshape_optical_flow(self, optical_flow):
         return np.reshape(optical_flow, (2, self.image_height, self.image_width)).transpose((1, 2, 0))
@@ -34,12 +41,33 @@ class RacingEnvWrapper:
         return success
 
     def render(self):
+        if self.headless:
+            return False
         success = self.env.render()
         return success
 
     def get_image(self):
-        self.env.getImage(self.image)
-        return self._reshape_image(self.image)
+        if self.headless:
+            return self.placeholder_image
+        self.env.getImageHWC(self._image_flat)
+        return self.image
+
+    def request_render(self, frame_id):
+        # the pose is taken at the time of the request, so the environment can be stepped while Unity renders
+        if self.headless:
+            return False
+        return self.env.requestRender(int(frame_id))
+
+    def poll_image(self, frame_id, blocking=False):
+        # frames have to be polled in the order they were requested, returns None if the frame is not there (yet)
+        if self.headless:
+            return self.placeholder_image
+        if self.env.pollImage(int(frame_id), self._image_flat, blocking):
+            return self.image
+        return None
+
+    def set_max_frames_in_flight(self, max_frames):
+        self.env.setMaxFramesInFlight(int(max_frames))
 
     def get_optical_flow(self):
         self.env.getOpticalFlow(self.optical_flow)
@@ -65,9 +93,13 @@ class RacingEnvWrapper:
     #     self.env.getCollision()
 
     def connect_unity(self, pub_port=10253, sub_port=10254):
+        if self.headless:
+            return
         self.env.connectUnity(pub_port, sub_port)
 
     def disconnect_unity(self):
+        if self.headless:
+            return
         self.env.disconnectUnity()
 
 
@@ -0,0 +1,90 @@
+import shlex
+import subprocess
+import numpy as np
+
+from collections import deque
+from envs.racing_env_wrapper import RacingEnvWrapper
+
+
+class RenderPool:
+    """
+    Spreads render requests over multiple Flightmare (Unity) renderers, each of which is driven by its own
+    environment/bridge on its own pair of ports (renderer k uses pub_port + 2 * k and sub_port + 2 * k).
+
+    States passed to render() are assigned to the renderers round-robin and rendered asynchronously (with up
+    to frames_in_flight frames per renderer), the images are returned in the order of the states. For
+    simulations that have their own environment, ports() can be used to connect them to different renderers.
+
+    If renderer_command is given (with {pub_port} and {sub_port} placeholders), one renderer process is
+    started for each port pair, otherwise the renderers are expected to already be running.
+    """
+
+    def __init__(self, num_renderers=1, pub_port=10253, sub_port=10254, config_path=None, rendering_only=False,
+                 frames_in_flight=2, renderer_command=None):
+        self.num_renderers = num_renderers
+        self.pub_port = pub_port
+        self.sub_port = sub_port
+        self.frames_in_flight = frames_in_flight
+        self.renderer_command = renderer_command
+
+        self.renderers = [RacingEnvWrapper(rendering_only=rendering_only, config_path=config_path)
+                          for _ in range(self.num_renderers)]
+        self.processes = []
+        self.frame_ids = [0] * self.num_renderers
+
+        self.image_height = self.renderers[0].image_height
+        self.image_width = self.renderers[0].image_width
+
+    def ports(self, index):
+        index = index % self.num_renderers
+        return self.pub_port + 2 * index, self.sub_port + 2 * index
+
+    def renderer(self, index):
+        return self.renderers[index % self.num_renderers]
+
+    def connect(self):
+        if self.renderer_command is not None and len(self.processes) == 0:
+            for r_idx in range(self.num_renderers):
+                pub_port, sub_port = self.ports(r_idx)
+                command = self.renderer_command.format(pub_port=pub_port, sub_port=sub_port)
+                self.processes.append(subprocess.Popen(shlex.split(command)))
+
+        for r_idx, renderer in enumerate(self.renderers):
+            pub_port, sub_port = self.ports(r_idx)
+            renderer.connect_unity(pub_port=pub_port, sub_port=sub_port)
+            renderer.set_max_frames_in_flight(self.frames_in_flight)
+
+    def disconnect(self):
+        for renderer in self.renderers:
+            renderer.disconnect_unity()
+        for process in self.processes:
+            process.terminate()
+        for process in self.processes:
+            process.wait()
+        self.processes = []
+
+    def _collect(self, r_idx, frame_id):
+        image = self.renderers[r_idx].poll_image(frame_id, blocking=True)
+        if image is None:
+            print("[RenderPool] WARNING: Frame {} was not received from renderer {}.".format(frame_id, r_idx))
+            return None
+        # the renderers reuse their image buffers
+        return image.copy()
+
+    def render(self, states):
+        # generator over the images for the given (reduced) states, in the same order
+        pending = deque()
+        for s_idx, state in enumerate(states):
+            r_idx = s_idx % self.num_renderers
+            renderer = self.renderers[r_idx]
+            renderer.set_reduced_state(np.asarray(state))
+
+            self.frame_ids[r_idx] += 1
+            while not renderer.request_render(self.frame_ids[r_idx]):
+                if len(pending) == 0:
+                    raise RuntimeError("Could not request a render from renderer {}.".format(r_idx))
+                yield self._collect(*pending.popleft())
+            pending.append((r_idx, self.frame_ids[r_idx]))
+
+        while len(pending) > 0:
+            yield self._collect(*pending.popleft())
@@ -0,0 +1,306 @@
+import os
+import json
+import struct
+import threading
+import time
+import numpy as np
+import zmq
+
+# layout of the binary messages (see unity_message_types.hpp)
+BINARY_POSE_HEADER = struct.Struct("<IIIQ")
+BINARY_SUB_HEADER = struct.Struct("<QI")
+BINARY_POSE_VERSION = 1
+BINARY_POSE_SIZE = 7
+
+
+def _quaternion_to_matrix(q):
+    # Unity quaternion order (x, y, z, w)
+    x, y, z, w = q
+    return np.array([
+        [1 - 2 * (y * y + z * z), 2 * (x * y - z * w), 2 * (x * z + y * w)],
+        [2 * (x * y + z * w), 1 - 2 * (x * x + z * z), 2 * (y * z - x * w)],
+        [2 * (x * z - y * w), 2 * (y * z + x * w), 1 - 2 * (x * x + y * y)],
+    ])
+
+
+class StandInRenderer:
+    """
+    Minimal stand-in for the Flightmare Unity renderer, speaking the same ZMQ protocol as UnityBridge.
+
+    It answers the settings handshake with "ready": true (and accepts the binary pose protocol if requested)
+    and replies to every pose message with synthetic frames carrying the correct frame_id. The frames are
+    either flat colours that change with the frame_id ("flat") or the outlines of the gates projected into
+    the camera of each vehicle ("gates"). Additional layers (depth, segmentation, optical flow) are constant.
+    This is only meant for benchmarking and testing the render loop without the actual renderer (or a GPU).
+    """
+
+    def __init__(self, pub_port=10253, sub_port=10254, host="localhost", mode="gates", binary_pose=True,
+                 render_delay=0.0, settings_retry_interval=0.5):
+        assert mode in ["flat", "gates"], "Unknown mode '{}'.".format(mode)
+        self.pub_port = pub_port
+        self.sub_port = sub_port
+        self.host = host
+        self.mode = mode
+        self.binary_pose = binary_pose
+        self.render_delay = render_delay
+        self.settings_retry_interval = settings_retry_interval
+
+        self.vehicles = []
+        self.objects = []
+        self.use_binary_pose = False
+        self.num_frames = 0
+
+        # the bridge resends the settings until it gets a reply, which should only be answered once per connection
+        self._settings_reply_time = None
+        self._pose_received = False
+
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    ############################
+    # HANDLING OF THE MESSAGES #
+    ############################
+
+    def _answer_settings(self):
+        # settings after a pose has been received mean a new connection, otherwise they are repeats of the same
+        # handshake, which are only answered again if the last reply seems to have been lost (e.g. because it was
+        # sent before the connection was fully established)
+        now = time.time()
+        if (self._pose_received or self._settings_reply_time is None
+                or now - self._settings_reply_time > self.settings_retry_interval):
+            self._settings_reply_time = now
+            self._pose_received = False
+            return True
+        return False
+
+    def _handle_settings(self, settings):
+        self.vehicles = settings.get("vehicles", [])
+        self.objects = settings.get("objects", [])
+        self.use_binary_pose = self.binary_pose and settings.get("binaryPose", False)
+        reply = {"ready": True}
+        if self.use_binary_pose:
+            reply["binaryPose"] = True
+        return [json.dumps(reply).encode()]
+
+    def _update_poses(self, poses, entries):
+        for p, e in zip(poses, entries):
+            e["position"] = list(p[:3])
+            e["rotation"] = list(p[3:])
+
+    def _handle_pose(self, pose):
+        self._update_poses([v["position"] + v["rotation"] for v in pose.get("vehicles", [])], self.vehicles)
+        self._update_poses([o["position"] + o["rotation"] for o in pose.get("objects", [])], self.objects)
+        return pose["frame_id"]
+
+    def _handle_binary_pose(self, data):
+        version, num_vehicles, num_objects, frame_id = BINARY_POSE_HEADER.unpack_from(data, 0)
+        if version != BINARY_POSE_VERSION:
+            print("[StandInRenderer] WARNING: Unknown binary pose version {}.".format(version))
+        poses = np.frombuffer(data, dtype=np.float32, offset=BINARY_POSE_HEADER.size,
+                              count=(num_vehicles + num_objects) * BINARY_POSE_SIZE)
+        poses = poses.reshape((-1, BINARY_POSE_SIZE)).tolist()
+        self._update_poses(poses[:num_vehicles], self.vehicles)
+        self._update_poses(poses[num_vehicles:], self.objects)
+        return frame_id
+
+    def _metadata(self, frame_id):
+        if self.use_binary_pose:
+            collisions = bytes(len(self.vehicles))
+            return BINARY_SUB_HEADER.pack(frame_id, len(self.vehicles)) + collisions
+        metadata = {
+            "frame_id": frame_id,
+            "pub_vehicles": [{"collision": False, "lidar_ranges": []} for _ in self.vehicles],
+        }
+        return json.dumps(metadata).encode()
+
+    ##########################
+    # SYNTHETIC IMAGE FRAMES #
+    ##########################
+
+    def _draw_gates(self, image, vehicle, camera):
+        height, width = image.shape[:2]
+        focal_length = 0.5 * height / np.tan(0.5 * np.deg2rad(camera.get("fov", 70.0)))
+
+        # camera pose in Unity coordinates (x right, y up, z forward)
+        T_BC = np.array(camera.get("T_BC", np.eye(4).flatten()), dtype=np.float64).reshape((4, 4))
+        R_WB = _quaternion_to_matrix(vehicle["rotation"])
+        R_WC = R_WB @ T_BC[:3, :3]
+        p_WC = np.array(vehicle["position"]) + R_WB @ T_BC[:3, 3]
+
+        for obj in self.objects:
+            half_size = 0.5 * np.array(obj.get("size", [1.0, 1.0, 1.0]))
+            corners = np.array([[-1, -1, 0], [1, -1, 0], [1, 1, 0], [-1, 1, 0], [-1, -1, 0]]) * half_size
+            corners = corners @ _quaternion_to_matrix(obj["rotation"]).T + np.array(obj["position"])
+            corners = (corners - p_WC) @ R_WC
+
+            for start, end in zip(corners[:-1], corners[1:]):
+                points = np.linspace(start, end, 100)
+                points = points[points[:, 2] > 0.1]
+                if len(points) == 0:
+                    continue
+                u = np.round(0.5 * width + focal_length * points[:, 0] / points[:, 2]).astype(int)
+                v = np.round(0.5 * height - focal_length * points[:, 1] / points[:, 2]).astype(int)
+                in_image = (u >= 0) & (u < width) & (v >= 0) & (v < height)
+                image[v[in_image], u[in_image]] = (255, 120, 0)
+
+    def _rgb_frame(self, frame_id, vehicle, camera):
+        height, width, channels = camera["height"], camera["width"], camera.get("channels", 3)
+        image = np.empty((height, width, 3), dtype=np.uint8)
+        if self.mode == "flat":
+            image[:] = ((37 * frame_id) % 256, (91 * frame_id) % 256, (151 * frame_id) % 256)
+        else:
+            image[:] = (40, 40, 40)
+            self._draw_gates(image, vehicle, camera)
+        image = image[..., :channels] if channels <= 3 else np.repeat(image[..., :1], channels, axis=2)
+        # Unity images have their origin in the lower left corner (and are flipped back by the bridge)
+        return np.ascontiguousarray(image[::-1]).tobytes()
+
+    def _frames(self, frame_id):
+        frames = [self._metadata(frame_id)]
+        for vehicle in self.vehicles:
+            for camera in vehicle.get("cameras", []):
+                height, width = camera["height"], camera["width"]
+                frames.append(self._rgb_frame(frame_id, vehicle, camera))
+                for layer_idx, enabled in enumerate(camera.get("enabledLayers", []), start=1):
+                    if not enabled:
+                        continue
+                    if layer_idx == 1:
+                        # depth
+                        frames.append(np.full((height, width), 1.0, dtype=np.float32).tobytes())
+                    elif layer_idx == 3:
+                        # optical flow
+                        frames.append(np.zeros((height, width, 2), dtype=np.float32).tobytes())
+                    else:
+                        frames.append(bytes(height * width * camera.get("channels", 3)))
+        return frames
+
+    ##################
+    # SERVER METHODS #
+    ##################
+
+    def _write_point_cloud(self, request):
+        # the bridge waits for the file to exist, so just write an empty point cloud
+        path = os.path.join(request.get("path", ""), request.get("file_name", "default") + ".ply")
+        with open(path, "w") as f:
+            f.write("ply\nformat ascii 1.0\nelement vertex 0\nproperty float x\nproperty float y\n"
+                    "property float z\nend_header\n")
+
+    def serve(self):
+        context = zmq.Context()
+        # the bridge binds both sockets, so the renderer connects to them
+        sub = context.socket(zmq.SUB)
+        sub.connect("tcp://{}:{}".format(self.host, self.pub_port))
+        sub.setsockopt(zmq.SUBSCRIBE, b"")
+        pub = context.socket(zmq.PUB)
+        pub.connect("tcp://{}:{}".format(self.host, self.sub_port))
+
+        poller = zmq.Poller()
+        poller.register(sub, zmq.POLLIN)
+        try:
+            while not self._stop_event.is_set():
+                if not dict(poller.poll(100)).get(sub):
+                    continue
+                message = sub.recv_multipart()
+                topic = message[0].decode()
+
+                if topic == "PoseBinary":
+                    frame_id = self._handle_binary_pose(message[1])
+                elif topic == "Pose":
+                    data = json.loads(message[1])
+                    if "frame_id" not in data:
+                        # settings and pose updates share the same topic
+                        if self._answer_settings():
+                            pub.send_multipart(self._handle_settings(data))
+                        continue
+                    frame_id = self._handle_pose(data)
+                elif topic == "PointCloud":
+                    self._write_point_cloud(json.loads(message[1]))
+                    continue
+                else:
+                    continue
+
+                self._pose_received = True
+                if self.render_delay > 0:
+                    time.sleep(self.render_delay)
+                pub.send_multipart(self._frames(frame_id))
+                self.num_frames += 1
+        finally:
+            sub.close(linger=0)
+            pub.close(linger=0)
+            context.term()
+
+    def start(self):
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self.serve, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+def benchmark(num_frames, pub_port, sub_port, frames_in_flight):
+    from envs.racing_env_wrapper import RacingEnvWrapper
+
+    renderer = StandInRenderer(pub_port=pub_port, sub_port=sub_port).start()
+    env = RacingEnvWrapper(rendering_only=True)
+    env.connect_unity(pub_port=pub_port, sub_port=sub_port)
+    state = np.array([0.0, 0.0, 2.0, 1.0, 0.0, 0.0, 0.0])
+
+    # blocking rendering
+    start = time.time()
+    for _ in range(num_frames):
+        env.set_reduced_state(state)
+        env.render()
+        env.get_image()
+    blocking_time = time.time() - start
+
+    # pipelined rendering
+    env.set_max_frames_in_flight(frames_in_flight)
+    pending = []
+    start = time.time()
+    for frame_id in range(1, num_frames + 1):
+        env.set_reduced_state(state)
+        while not env.request_render(frame_id):
+            env.poll_image(pending.pop(0), blocking=True)
+        pending.append(frame_id)
+    for frame_id in pending:
+        env.poll_image(frame_id, blocking=True)
+    pipelined_time = time.time() - start
+
+    env.disconnect_unity()
+    renderer.stop()
+
+    print("Blocking:  {:.1f} FPS".format(num_frames / blocking_time))
+    print("Pipelined: {:.1f} FPS ({} frames in flight)".format(num_frames / pipelined_time, frames_in_flight))
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-pp", "--pub_port", type=int, default=10253)
+    parser.add_argument("-sp", "--sub_port", type=int, default=10254)
+    parser.add_argument("-m", "--mode", type=str, default="gates", choices=["flat", "gates"])
+    parser.add_argument("-rd", "--render_delay", type=float, default=0.0,
+                        help="Artificial delay (in seconds) before replying to each render request")
+    parser.add_argument("-nb", "--no_binary_pose", action="store_true")
+    parser.add_argument("-b", "--benchmark", type=int, default=0,
+                        help="Run a render loop benchmark with this many frames instead of only serving")
+    parser.add_argument("-fif", "--frames_in_flight", type=int, default=2)
+
+    args = parser.parse_args()
+
+    if args.benchmark > 0:
+        benchmark(args.benchmark, args.pub_port, args.sub_port, args.frames_in_flight)
+    else:
+        server = StandInRenderer(pub_port=args.pub_port, sub_port=args.sub_port, mode=args.mode,
+                                 binary_pose=not args.no_binary_pose, render_delay=args.render_delay)
+        print("[StandInRenderer] Serving on ports {}/{}.".format(args.pub_port, args.sub_port))
+        try:
+            server.serve()
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,63 @@
+import os
+import numpy as np
+
+from flightgym import VecRacingEnv
+
+
+class VecRacingEnvWrapper:
+
+    def __init__(self, num_envs, config_path=None, num_threads=None):
+        # the batched environment is always headless, i.e. it only simulates the quadrotor dynamics
+        self.num_envs = num_envs
+        self.num_threads = num_threads or min(num_envs, os.cpu_count() or 1)
+        self.env = VecRacingEnv(
+            config_path or os.path.join(os.getenv("FLIGHTMARE_PATH"), "flightlib/configs/racing_env.yaml"),
+            self.num_envs,
+            self.num_threads,
+        )
+
+        self.state_dim = self.env.getStateDim()
+        self.action_dim = self.env.getActDim()
+
+        # buffers passed to the C++ side (have to be row-major float32)
+        self.action = np.zeros((self.num_envs, self.action_dim), dtype=np.float32)
+        self.states = np.zeros((self.num_envs, self.state_dim), dtype=np.float32)
+
+    def step(self, actions, state_out=None):
+        # actions/state_out can be passed as (num_envs, 4)/(num_envs, 25) row-major float32 arrays, in which
+        # case they are used directly by the C++ side without any copies; the resulting states are always
+        # written into state_out (or the internal state buffer if none is given)
+        if not (isinstance(actions, np.ndarray) and actions.dtype == np.float32 and actions.flags.c_contiguous
+                and actions.shape == self.action.shape):
+            self.action[:] = np.reshape(actions, (self.num_envs, self.action_dim))
+            actions = self.action
+        if state_out is None:
+            state_out = self.states
+        success = self.env.step(actions, state_out)
+        return success
+
+    def get_states(self):
+        self.env.getStates(self.states)
+        return self.states.copy()
+
+    def get_sim_time_step(self):
+        return self.env.getSimTimeStep()
+
+    def get_sim_time_steps(self):
+        sim_time_steps = np.zeros((self.num_envs,), dtype=np.float32)
+        self.env.getSimTimeSteps(sim_time_steps)
+        return sim_time_steps
+
+    def set_sim_time_step(self, sim_time_step):
+        self.env.setSimTimeStep(float(sim_time_step))
+
+    def set_sim_time_steps(self, sim_time_steps):
+        self.env.setSimTimeSteps(np.asarray(sim_time_steps, dtype=np.float32).reshape((self.num_envs,)))
+
+    def set_reduced_state(self, env_id, reduced_state):
+        reduced_state = np.reshape(reduced_state, (-1, 1)).astype(np.float32)
+        self.env.setReducedState(env_id, reduced_state, reduced_state.shape[0])
+
+    def set_reduced_states(self, reduced_states):
+        reduced_states = np.ascontiguousarray(np.reshape(reduced_states, (self.num_envs, -1)), dtype=np.float32)
+        self.env.setReducedStates(reduced_states)
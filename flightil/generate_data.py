@@ -12,7 +12,8 @@ from gazesim.data.utils import iterate_directories, pair
 from old.mpc.simulation.mpc_test_env import MPCTestEnv
 # from old.mpc.simulation.mpc_test_wrapper import MPCTestWrapper
 from envs.racing_env_wrapper import RacingEnvWrapper
-from planning.planner import TrajectoryPlanner
+from envs.render_pool import RenderPool
+from planning.planner import TrajectoryPlanner, ensure_quaternion_consistency
 from planning.mpc_solver import MPCSolver
 from features.feature_tracker import FeatureTracker
 # from old.run_tests import sample_from_trajectory, ensure_quaternion_consistency
@@ -47,42 +48,6 @@ def sample_from_trajectory(trajectory, time_stamp):
     # return row_to_state(trajectory.iloc[0])
 
 
-def ensure_quaternion_consistency(trajectory, use_norm=True, show_progress=False):
-    trajectory = trajectory.reset_index(drop=True)
-    flipped = 0
-    trajectory["flipped"] = 0
-    trajectory.loc[0, "flipped"] = flipped
-
-    quat_columns = ["rotation_{} [quaternion]".format(c) for c in ["w", "x", "y", "z"]]
-    prev_quaternion = trajectory.loc[0, quat_columns]
-    prev_signs_positive = prev_quaternion >= 0
-
-    norm_diffs = []
-    for i in tqdm(range(1, len(trajectory.index)), disable=(not show_progress)):
-        current_quaternion = trajectory.loc[i, quat_columns]
-        current_signs_positive = current_quaternion >= 0
-        condition_sign = prev_signs_positive == ~current_signs_positive
-
-        # TODO: should probably do something like X standard deviations above the running mean for "good methodology"
-        norm_diff = np.linalg.norm(prev_quaternion.values - current_quaternion.values)
-        norm_diffs.append(norm_diff)
-
-        if use_norm:
-            if norm_diff >= 0.5:  # TODO should this be 1.0?
-                flipped = 1 - flipped
-        else:
-            if np.sum(condition_sign) >= 3:
-                flipped = 1 - flipped
-        trajectory.loc[i, "flipped"] = flipped
-
-        prev_signs_positive = current_signs_positive
-        prev_quaternion = current_quaternion
-
-    trajectory.loc[trajectory["flipped"] == 1, quat_columns] *= -1.0
-
-    return trajectory  # , norm_diffs
-
-
 class DataGenerator:
 
     def __init__(self, config):
@@ -152,13 +117,18 @@ class FlightmareReplicator(DataGenerator):
 
         self.wave_track = config["track_name"] == "wave"
         # self.env = MPCTestWrapper(wave_track=self.wave_track)
-        self.env = RacingEnvWrapper()
+        self.render_pool = RenderPool(
+            num_renderers=config["num_renderers"],
+            pub_port=config["pub_port"],
+            sub_port=config["sub_port"],
+            frames_in_flight=config["frames_in_flight"],
+        )
         if not self.trajectory_only:
-            self.env.connect_unity(pub_port=config["pub_port"], sub_port=config["sub_port"])
+            self.render_pool.connect()
 
     def finish(self):
         if not self.trajectory_only:
-            self.env.disconnect_unity()
+            self.render_pool.disconnect()
 
     def compute_new_data(self, run_dir):
         start = time.time()
@@ -184,7 +154,7 @@ class FlightmareReplicator(DataGenerator):
         df_traj = df_traj.rename(FlightmareReplicator.COLUMN_DICT, axis=1)
 
         # ensure quaternion consistency
-        df_traj = ensure_quaternion_consistency(df_traj, show_progress=True)
+        df_traj = ensure_quaternion_consistency(df_traj)
 
         # adjust height to be suitable for Flightmare
         # df_traj["position_z [m]"] += 0.35  # TODO: THIS IS MAYBE A BUG
@@ -208,14 +178,19 @@ class FlightmareReplicator(DataGenerator):
 
         # if there are screen timestamps < the first drone timestamp, should just "wait" in the first position
         # for i in tqdm(range(0, len(df_ts.index), self.frame_skip), disable=False):
-        for i in tqdm(range(0, 2000, self.frame_skip), disable=False):
-            time_current = df_ts["ts"].iloc[i]
-            sample = sample_from_trajectory(df_traj, time_current)
-            # image = self.env.step(sample)
-            self.env.set_reduced_state(sample)
-            self.env.render()
-            image = self.env.get_image()
+        # renders are pipelined (and spread over the renderers in the pool), i.e. the next poses are sent
+        # while Unity is still rendering the previous ones
+        samples = (sample_from_trajectory(df_traj, df_ts["ts"].iloc[i]) for i in range(0, 2000, self.frame_skip))
+        # frames that are not received are replaced by the previous frame (or a black frame at the start),
+        # so that the video stays in sync with the screen timestamps
+        previous_image = np.zeros((600, 800, 3), dtype=np.uint8)
+        dropped_frames = 0
+        for image in tqdm(self.render_pool.render(samples), total=len(range(0, 2000, self.frame_skip))):
+            if image is None:
+                image = previous_image
+                dropped_frames += 1
             video_writer.write(image)
+            previous_image = image
 
         """
         for _, row in tqdm(df_ts.iterrows(), total=len(df_ts.index)):
@@ -227,6 +202,10 @@ class FlightmareReplicator(DataGenerator):
 
         video_writer.release()
 
+        if dropped_frames > 0:
+            print("WARNING: {} frame(s) could not be rendered for directory '{}' "
+                  "and were replaced by the previous frame.".format(dropped_frames, run_dir))
+
         print("Processed '{}'. in {:.2f}s".format(run_dir, time.time() - start))
 
         time.sleep(0.1)
@@ -263,7 +242,9 @@ class MPCReplicator_v0(DataGenerator):
         self.plan_time_step = 0.1
         self.plan_time_horizon = 3.0
 
-        self.mpc_solver = MPCSolver(self.plan_time_horizon, self.plan_time_step)
+        self.mpc_solver = MPCSolver(self.plan_time_horizon, self.plan_time_step,
+                                    compile_solver=config["compile_expert"],
+                                    solver_type=config["expert_solver_type"])
         self.wave_track = config["track_name"] == "wave"
         self.fm_wrapper = MPCTestWrapper(wave_track=self.wave_track)
         self.pub_port = config["pub_port"]
@@ -493,7 +474,9 @@ class MPCReplicator_v1(DataGenerator):
         self.plan_time_step = 0.1
         self.plan_time_horizon = 3.0
 
-        self.mpc_solver = MPCSolver(self.plan_time_horizon, self.plan_time_step)
+        self.mpc_solver = MPCSolver(self.plan_time_horizon, self.plan_time_step,
+                                    compile_solver=config["compile_expert"],
+                                    solver_type=config["expert_solver_type"])
         self.wave_track = config["track_name"] == "wave"
         self.fm_wrapper = RacingEnvWrapper(wave_track=self.wave_track)
         self.pub_port = config["pub_port"]
@@ -569,7 +552,7 @@ class MPCReplicator_v1(DataGenerator):
 
             if row["frame"] % self.command_skip == 0:
                 planned_trajectory = np.array(planner.plan(reduced_state, row["ts"]))
-                action, predicted_trajectory, cost = self.mpc_solver.solve(planned_trajectory)
+                action, predicted_trajectory, cost, _ = self.mpc_solver.solve(planned_trajectory)
             self.fm_wrapper.step(action)
             state = self.fm_wrapper.get_state().copy()
             reduced_state = state[:10]
@@ -733,7 +716,15 @@ if __name__ == "__main__":
 
     parser.add_argument("-pp", "--pub_port", type=int, default=10253)
     parser.add_argument("-sp", "--sub_port", type=int, default=10254)
+    parser.add_argument("-nr", "--num_renderers", type=int, default=1,
+                        help="Number of Unity renderers to use, renderer k uses ports pub_port/sub_port + 2 * k")
+    parser.add_argument("-fif", "--frames_in_flight", type=int, default=2,
+                        help="Maximum number of frames rendered asynchronously (should stay below the ZMQ HWM of 6)")
     parser.add_argument("-udc", "--unity_disconnect", action="store_true")
+    parser.add_argument("-ce", "--compile_expert", action="store_true",
+                        help="Use (and build once, which can take several minutes) a compiled MPC solver")
+    parser.add_argument("-est", "--expert_solver_type", type=str, default="ipopt", choices=["ipopt", "rti"],
+                        help="Solve the MPC to convergence (ipopt) or with one SQP step per command (rti)")
 
     parser.add_argument("-di", "--directory_index", type=pair, default=None)
     parser.add_argument("-se", "--skip_existing", action="store_true")  # TODO?
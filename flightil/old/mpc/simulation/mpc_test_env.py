@@ -62,7 +62,7 @@ class MPCTestEnv(object):
             #    just optimise to stay at the final state if the planning horizon exceeds reaching the final state
 
             # run non-linear model predictive control
-            optimal_action, predicted_traj, cost = self.mpc_solver.solve(planned_traj)
+            optimal_action, predicted_traj, cost, _ = self.mpc_solver.solve(planned_traj)
 
             """
             previous_state = planned_traj[:3]
@@ -7,7 +7,7 @@ import cv2
 
 from pprint import pprint
 from planning.mpc_solver import MPCSolver
-from planning.planner import TrajectoryPlanner
+from planning.planner import TrajectoryPlanner, ensure_quaternion_consistency as _ensure_quaternion_consistency
 from old.mpc.simulation.mpc_test_env import MPCTestEnv
 from old.mpc.simulation.mpc_test_wrapper import MPCTestWrapper
 from envs.racing_env_wrapper import RacingEnvWrapper
@@ -110,39 +110,7 @@ def sample_from_trajectory(trajectory, time_stamp):
 
 
 def ensure_quaternion_consistency(trajectory, use_norm=True):
-    trajectory = trajectory.reset_index(drop=True)
-    flipped = 0
-    trajectory["flipped"] = 0
-    trajectory.loc[0, "flipped"] = flipped
-
-    quat_columns = ["rotation_{} [quaternion]".format(c) for c in ["w", "x", "y", "z"]]
-    prev_quaternion = trajectory.loc[0, quat_columns]
-    prev_signs_positive = prev_quaternion >= 0
-
-    norm_diffs = []
-    for i in range(1, len(trajectory.index)):
-        current_quaternion = trajectory.loc[i, quat_columns]
-        current_signs_positive = current_quaternion >= 0
-        condition_sign = prev_signs_positive == ~current_signs_positive
-
-        # TODO: should probably do something like X standard deviations above the running mean for "good methodology"
-        norm_diff = np.linalg.norm(prev_quaternion.values - current_quaternion.values)
-        norm_diffs.append(norm_diff)
-
-        if use_norm:
-            if norm_diff >= 0.5:  # TODO should this be 1.0?
-                flipped = 1 - flipped
-        else:
-            if np.sum(condition_sign) >= 3:
-                flipped = 1 - flipped
-        trajectory.loc[i, "flipped"] = flipped
-
-        prev_signs_positive = current_signs_positive
-        prev_quaternion = current_quaternion
-
-    trajectory.loc[trajectory["flipped"] == 1, quat_columns] *= -1.0
-
-    return trajectory, norm_diffs
+    return _ensure_quaternion_consistency(trajectory, use_norm, return_norm_diffs=True)
 
 
 def visualise_states(states, trajectory, simulation_time_horizon, simulation_time_step, exclude_first=False, skip_show=False):
@@ -306,7 +274,7 @@ def test_mpc():
     # construct the MPC solver and solve with these states
     mpc_solver = MPCSolver(plan_time_horizon, plan_time_step, os.path.join(os.path.abspath("/"),
                                                                            "mpc/mpc/saved/mpc_v2.so"))
-    optimal_action, predicted_traj = mpc_solver.solve(planned_traj)
+    optimal_action, predicted_traj, _, _ = mpc_solver.solve(planned_traj)
 
     print(optimal_action.shape, optimal_action.squeeze())
     print(predicted_traj.shape)
@@ -132,7 +132,7 @@ def test():
             command_time += command_time_step
 
             planned_trajectory = np.array(planner.plan(reduced_state, base_time))
-            mpc_action, predicted_trajectory, cost = mpc_solver.solve(planned_trajectory)
+            mpc_action, predicted_trajectory, cost, _ = mpc_solver.solve(planned_trajectory)
             if dda_network and len(network.feature_track_queue) < 8:
                 network_action = np.array([np.nan, np.nan, np.nan, np.nan])
             else:
@@ -150,7 +150,7 @@ def test():
                 # decide whether to use MPC expert or network
                 if base_time < switch_time:
                     planned_trajectory = np.array(planner.plan(reduced_state, base_time))
-                    mpc_action, predicted_trajectory, cost = mpc_solver.solve(planned_trajectory)
+                    mpc_action, predicted_trajectory, cost, _ = mpc_solver.solve(planned_trajectory)
                     network_action = np.array([np.nan, np.nan, np.nan, np.nan])
                     network_used_currently = 0
                 else:
@@ -162,7 +162,7 @@ def test():
                     network_used_currently = 1
             else:
                 planned_trajectory = np.array(planner.plan(reduced_state, base_time))
-                mpc_action, predicted_trajectory, cost = mpc_solver.solve(planned_trajectory)
+                mpc_action, predicted_trajectory, cost, _ = mpc_solver.solve(planned_trajectory)
                 if dda_network and len(network.feature_track_queue) < 8:
                     network_action = np.array([np.nan, np.nan, np.nan, np.nan])
                 else:
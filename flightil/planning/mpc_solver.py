@@ -1,8 +1,21 @@
 """
 Standard MPC for following a pre-defined trajectory
 """
+import os
+import hashlib
+import multiprocessing
+import shutil
+import subprocess
+import tempfile
+import time
+from collections import deque
 import casadi as ca
 import numpy as np
+import pandas as pd
+
+# has to be changed whenever the NLP formulation changes (invalidates compiled solvers)
+_NLP_VERSION = 1
+_COMPILER_FLAGS = ["-fPIC", "-shared", "-O3"]
 
 
 class MPCSolver(object):
@@ -10,11 +23,31 @@ class MPCSolver(object):
     Nonlinear MPC
     """
 
-    def __init__(self, pred_time_horizon, pred_time_step, so_path="./nmpc.so"):
+    def __init__(self, pred_time_horizon, pred_time_step, so_path=None, compile_solver=False, cache_dir=None,
+                 solver_type="ipopt", qp_solver="osqp", stats_buffer_size=10000):
         """
         Nonlinear MPC for quadrotor control
+
+        If compile_solver is True, the NLP (including all derivatives) is generated as C code and compiled to a
+        shared library once, which is cached in cache_dir (by default ~/.cache/flightil/mpc) under a hash of
+        everything that defines the NLP, and only loaded (without building the NLP symbolically) later on. If so_path
+        is given, the library is loaded from (or compiled to) that path instead; since it is not checked against
+        the hash, it has to be removed when the NLP changes.
+
+        With solver_type="rti", the NLP is not solved to convergence with IPOPT, but only a single (Gauss-Newton)
+        SQP step is taken per call (real-time iteration) with the given QP solver, starting from the shifted
+        solution of the previous call (the first call iterates until convergence instead). The compiled solver is
+        only used with IPOPT.
+
+        The wall time, number of iterations, return status and cost of the last stats_buffer_size solves are kept
+        (see get_solve_stats and summarise_solve_stats).
         """
+        if solver_type not in ["ipopt", "rti"]:
+            raise ValueError("Unknown solver type '{}'.".format(solver_type))
         self.so_path = so_path
+        self.solver_type = solver_type
+        self._qp_solver = qp_solver
+        self._solve_stats = deque(maxlen=stats_buffer_size)
 
         # Time constant
         self._pred_time_horizon = pred_time_horizon
@@ -97,7 +130,121 @@ class MPCSolver(object):
         self._quad_state_0 = [1.0, 0.0, 0.0, 1.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0]
         self._quad_action_0 = [9.81, 0.0, 0.0, 0.0]
 
+        self._ipopt_options = {
+            "verbose": False,
+            "ipopt.tol": 1e-4,
+            "ipopt.acceptable_tol": 1e-4,
+            "ipopt.max_iter": 100,
+            "ipopt.warm_start_init_point": "yes",
+            # the shifted solution is already close to the optimum, so keep it (and its multipliers) close to the
+            # bounds and start with a small barrier parameter instead of the default 0.1
+            "ipopt.warm_start_bound_push": 1e-6,
+            "ipopt.warm_start_mult_bound_push": 1e-6,
+            "ipopt.mu_init": 1e-3,
+            "ipopt.print_level": 0,
+            "print_time": False
+        }
+
+        self._init_bounds()
         self._init_dynamics()
+        if self.solver_type == "rti":
+            self._init_nlp()
+            self._init_rti()
+        elif compile_solver:
+            self._init_compiled_solver(cache_dir)
+        else:
+            self._init_nlp()
+            self.solver = ca.nlpsol("solver", "ipopt", self.nlp_dict, self._ipopt_options)
+
+    def _init_bounds(self):
+        # concrete bounds
+        action_min = [self._thrust_min, -self._w_max_xy, -self._w_max_xy, -self._w_max_yaw]
+        action_max = [self._thrust_max, self._w_max_xy, self._w_max_xy, self._w_max_yaw]
+
+        state_bound = ca.inf
+        state_min = [-state_bound for _ in range(self._state_dim)]
+        state_max = [+state_bound for _ in range(self._state_dim)]
+        # state_min = ([-state_bound] * 3) + ([-1.1] * 4) + ([-state_bound] * 3)
+        # state_max = ([state_bound] * 3) + ([1.1] * 4) + ([state_bound] * 3)
+
+        constraint_min = [0 for _ in range(self._state_dim)]
+        constraint_max = [0 for _ in range(self._state_dim)]
+
+        # the NLP variables are the initial state followed by (action, next state) for each time step, with the
+        # initial guess being hovering, the constraints are the initial state and the dynamics for each time step
+        self._variables_hover_guess = np.array(
+            self._quad_state_0 + (self._quad_action_0 + self._quad_state_0) * self._num_pred_steps)
+        self.variables_lower_bound = np.array(state_min + (action_min + state_min) * self._num_pred_steps)
+        self.variables_upper_bound = np.array(state_max + (action_max + state_max) * self._num_pred_steps)
+        self.constraints_lower_bound = np.array(constraint_min * (self._num_pred_steps + 1))
+        self.constraints_upper_bound = np.array(constraint_max * (self._num_pred_steps + 1))
+
+        self.reset_warm_start()
+
+    def reset_warm_start(self):
+        self.variables_init_guess = self._variables_hover_guess.copy()
+        # multipliers of the variable bounds and constraints, shifted along with the variables for warm starting
+        self.variables_init_multipliers = np.zeros_like(self.variables_init_guess)
+        self.constraints_init_multipliers = np.zeros_like(self.constraints_lower_bound)
+        self._rti_initialised = False
+
+    def get_warm_start(self):
+        return self.variables_init_guess, self.variables_init_multipliers, self.constraints_init_multipliers, \
+               self._rti_initialised
+
+    def set_warm_start(self, warm_start):
+        self.variables_init_guess, self.variables_init_multipliers, self.constraints_init_multipliers, \
+            self._rti_initialised = warm_start
+
+    def _solver_hash(self):
+        key = repr((
+            _NLP_VERSION, ca.__version__,
+            float(self._pred_time_horizon), float(self._pred_time_step), self._num_pred_steps,
+            self._gravity, self._mass,
+            self._w_max_yaw, self._w_max_xy, self._thrust_min, self._thrust_max,
+            self._cost_matrix_goal.tolist(), self._cost_matrix_traj.tolist(),
+            self._cost_quaternion_norm, self._cost_matrix_action.tolist(),
+        ))
+        return hashlib.sha1(key.encode()).hexdigest()[:20]
+
+    def _init_compiled_solver(self, cache_dir=None):
+        if self.so_path is None:
+            if cache_dir is None:
+                cache_dir = os.path.join(os.getenv("HOME", "/tmp"), ".cache", "flightil", "mpc")
+            self.so_path = os.path.join(cache_dir, "nmpc_{}.so".format(self._solver_hash()))
+
+        if not os.path.exists(self.so_path):
+            self._init_nlp()
+            solver = ca.nlpsol("solver", "ipopt", self.nlp_dict, self._ipopt_options)
+            try:
+                self._compile_solver(solver)
+            except (OSError, subprocess.CalledProcessError) as e:
+                print("[MPCSolver] WARNING: Could not compile the solver ({}), "
+                      "using the interpreted solver instead.".format(e))
+                self.solver = solver
+                return
+
+        # reload compiled mpc
+        self.solver = ca.nlpsol("solver", "ipopt", self.so_path, self._ipopt_options)
+
+    def _compile_solver(self, solver):
+        cache_dir = os.path.dirname(os.path.abspath(self.so_path))
+        os.makedirs(cache_dir, exist_ok=True)
+        build_dir = tempfile.mkdtemp(dir=cache_dir)
+        try:
+            # CasADi can only generate the code in the current directory (the name has to be a valid identifier)
+            c_name = "nmpc_{}_{}.c".format(self._solver_hash(), os.getpid())
+            c_path = os.path.join(build_dir, c_name)
+            shutil.move(solver.generate_dependencies(c_name), c_path)
+
+            # compile to a temporary file first so that other processes never load a partially written library
+            so_path = os.path.join(build_dir, "nmpc.so")
+            print("[MPCSolver] Compiling solver to '{}' (this can take several minutes)...".format(self.so_path))
+            subprocess.run(["gcc"] + _COMPILER_FLAGS + [c_path, "-o", so_path],
+                           check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            os.replace(so_path, self.so_path)
+        finally:
+            shutil.rmtree(build_dir, ignore_errors=True)
 
     def _init_dynamics(self):
         # # # # # # # # # # # # # # # # # # #
@@ -146,6 +293,7 @@ class MPCSolver(object):
             ["x", "u"], ["ode"]
         )
 
+    def _init_nlp(self):
         # # Fold
         # basically self.f defines the system dynamics (going from input state and command to the derivative of the
         # state variables) and quad_dyn_int defines a function "rolling" this forward for the time step self._dt
@@ -183,28 +331,10 @@ class MPCSolver(object):
         # # ---- Non-linear Optimization -----
         # # # # # # # # # # # # # # # # # # # #
 
+        # (the initial guess and the bounds for the variables and constraints below are set in _init_bounds)
         self.variables = []  # nlp variables nlp_x
-        self.variables_init_guess = []  # initial guess of nlp variables
-        self.variables_lower_bound = []  # lower bound of the variables, lbw <= nlp_x
-        self.variables_upper_bound = []  # upper bound of the variables, nlp_x <= ubw
-
         self.objective = 0  # objective
         self.constraints = []  # constraint functions g
-        self.constraints_lower_bound = []  # lower bound of constraint functions, lbg < g
-        self.constraints_upper_bound = []  # upper bound of constraint functions, g < ubg
-
-        # concrete bounds
-        action_min = [self._thrust_min, -self._w_max_xy, -self._w_max_xy, -self._w_max_yaw]
-        action_max = [self._thrust_max, self._w_max_xy, self._w_max_xy, self._w_max_yaw]
-
-        state_bound = ca.inf
-        state_min = [-state_bound for _ in range(self._state_dim)]
-        state_max = [+state_bound for _ in range(self._state_dim)]
-        # state_min = ([-state_bound] * 3) + ([-1.1] * 4) + ([-state_bound] * 3)
-        # state_max = ([state_bound] * 3) + ([1.1] * 4) + ([state_bound] * 3)
-
-        constraint_min = [0 for _ in range(self._state_dim)]
-        constraint_max = [0 for _ in range(self._state_dim)]
 
         # I guess this traj_input is just for the pendulum positions? but what is the solver actually doing with them then?
         # is the point that at a certain time, the quadrotor should be at the same position as the pendulum?
@@ -222,23 +352,15 @@ class MPCSolver(object):
 
         # "Lift" initial conditions
         self.variables += [traj_states[:, 0]]  # add the initial state to the NLP variables
-        self.variables_init_guess += self._quad_state_0  # add the values for the initial state to the guess for the above
-        self.variables_lower_bound += state_min
-        self.variables_upper_bound += state_max
 
         # # starting point.
         self.constraints += [traj_states[:, 0] - traj_input[:self._state_dim]]  # value of the constraint function (state
-        self.constraints_lower_bound += constraint_min  # the difference above should be 0 at the start
-        self.constraints_upper_bound += constraint_max
 
         # by the way self._N is defined, this means we optimise over the entire trajectory we want to fly
         # => this is not really something we can afford to do for a longer trajectory, so one would have to
         #    define some sort of time horizon and e.g. update the "goal position(s)" along the trajectory...
         for k in range(self._num_pred_steps):
             self.variables += [traj_actions[:, k]]  # add the commands to the variables
-            self.variables_init_guess += self._quad_action_0  # for every time step the initial guess for the commands is hovering
-            self.variables_lower_bound += action_min  # constrain the commands
-            self.variables_upper_bound += action_max  # constrain the commands
 
             # retrieve time constant
             # idx_k = self._s_dim+self._s_dim+(self._s_dim+3)*(k)
@@ -263,92 +385,152 @@ class MPCSolver(object):
 
             # New NLP variable for state at end of interval <= after applying the control command I guess
             self.variables += [traj_states[:, k + 1]]
-            self.variables_init_guess += self._quad_state_0
-            self.variables_lower_bound += state_min
-            self.variables_upper_bound += state_max
 
             # Add equality constraint
             # I guess this basically just means that when the program optimises over the state and control variables,
             # it needs to ensure that the state (traj_states) is consistent with the dynamics of the system (which are defined
             # by traj_states_next, the output of quad_dyn_int/quad_dyn_int_parallel)
             self.constraints += [traj_states_next[:, k] - traj_states[:, k + 1]]
-            self.constraints_lower_bound += constraint_min
-            self.constraints_upper_bound += constraint_max
 
             # self.constraints += [ca.norm_2(traj_states[:, k + 1]) - 1]
             # self.constraints_lower_bound += [0]
             # self.constraints_upper_bound += [0]
 
-        # # # # # # # # # # # # # # # # # # #
-        # -- ipopt
-        # # # # # # # # # # # # # # # # # # #
-        ipopt_options = {
-            "verbose": False,
-            "ipopt.tol": 1e-4,
-            "ipopt.acceptable_tol": 1e-4,
-            "ipopt.max_iter": 100,
-            "ipopt.warm_start_init_point": "yes",
-            "ipopt.print_level": 0,
-            "print_time": False
-        }
-
-        nlp_dict = {
+        self.nlp_dict = {
             "f": self.objective,
             "x": ca.vertcat(*self.variables),
             "p": traj_input,
             "g": ca.vertcat(*self.constraints)
         }
 
-        self.solver = ca.nlpsol("solver", "ipopt", nlp_dict, ipopt_options)
-
-        """
-        # jit (just-in-time compilation)
-        print("Generating shared library........")
-        cname = self.solver.generate_dependencies("mpc_v2.c")
-        print(cname)
-        import os
-        os.system("gcc -fPIC -shared -O3 " + cname + " -o " + self.so_path)  # -O3
-        """
-
-        # # reload compiled mpc
-        # print(self.so_path)
-        # self.solver = ca.nlpsol("solver", "ipopt", self.so_path, ipopt_options)
+    def _init_rti(self):
+        variables = self.nlp_dict["x"]
+        parameters = self.nlp_dict["p"]
+
+        # the objective is quadratic, so the Gauss-Newton Hessian (ignoring the curvature of the dynamics) is constant
+        hessian, gradient = ca.hessian(self.nlp_dict["f"], variables)
+        self._rti_hessian = ca.Function("rti_hessian", [variables, parameters], [hessian])(0, 0)
+        self._rti_objective = ca.Function("rti_objective", [variables, parameters], [self.nlp_dict["f"]])
+        self._rti_gradient = ca.Function("rti_gradient", [variables, parameters], [gradient])
+        self._rti_constraints = ca.Function("rti_constraints", [variables, parameters], [
+            self.nlp_dict["g"], ca.jacobian(self.nlp_dict["g"], variables)])
+
+        qp_options = {
+            "qpoases": {"printLevel": "none"},
+            "osqp": {"osqp": {"verbose": False}},
+        }.get(self._qp_solver, {})
+        # (conic is the low-level interface of qpsol, which takes the sparsity patterns instead of expressions)
+        self._rti_qp = ca.conic("rti_qp", self._qp_solver, {
+            "h": self._rti_hessian.sparsity(),
+            "a": self._rti_constraints.sparsity_out(1),
+        }, qp_options)
+
+        self.rti_max_initial_iterations = 20
+        self.rti_initial_tol = 1e-4
+
+    def _sqp_step(self, variables, reference_trajectory):
+        constraints, jacobian = self._rti_constraints(variables, reference_trajectory)
+        constraints = constraints.full().squeeze(1)
+        step = self._rti_qp(
+            h=self._rti_hessian,
+            g=self._rti_gradient(variables, reference_trajectory),
+            a=jacobian,
+            lba=self.constraints_lower_bound - constraints,
+            uba=self.constraints_upper_bound - constraints,
+            lbx=self.variables_lower_bound - variables,
+            ubx=self.variables_upper_bound - variables,
+        )["x"].full().squeeze(1)
+        return variables + step, step
+
+    @staticmethod
+    def _shift(values, stage_dim):
+        # drop the first stage and repeat the last one at the end (as the guess for the new terminal stage)
+        return np.concatenate((values[stage_dim:], values[-stage_dim:]))
+
+    def _shift_variables(self, solution):
+        # the variables (and their multipliers) are the initial state followed by (action, next state) pairs
+        return self._shift(solution, self._state_dim + self._action_dim)
+
+    def _shift_constraints(self, multipliers):
+        # the constraints are the initial state followed by the dynamics of each time step
+        return self._shift(multipliers, self._state_dim)
+
+    def _solve_rti(self, reference_trajectory):
+        variables = self.variables_init_guess
+        reference_trajectory = np.asarray(reference_trajectory, dtype=np.float64).reshape(-1)
+
+        variables, step = self._sqp_step(variables, reference_trajectory)
+        iterations = 1
+        if not self._rti_initialised:
+            # no previous solution to start from yet, so iterate until convergence once
+            while iterations < self.rti_max_initial_iterations and np.max(np.abs(step)) >= self.rti_initial_tol:
+                variables, step = self._sqp_step(variables, reference_trajectory)
+                iterations += 1
+            self._rti_initialised = True
+
+        return variables, self._rti_objective(variables, reference_trajectory), iterations, self._rti_qp.stats()
 
     def solve(self, reference_trajectory):
-        # # # # # # # # # # # # # # # #
-        # -------- solve NLP ---------
-        # # # # # # # # # # # # # # # #
-
-        solution = self.solver(
-            x0=self.variables_init_guess,
-            lbx=self.variables_lower_bound,
-            ubx=self.variables_upper_bound,
-            p=reference_trajectory,  # => I guess this is the mysterious P from _initDynamics?
-            lbg=self.constraints_lower_bound,
-            ubg=self.constraints_upper_bound
-        )
+        solve_start = time.time()
+        if self.solver_type == "rti":
+            # (the status is that of the QP of the last SQP step)
+            solution, cost, iterations, stats = self._solve_rti(reference_trajectory)
+        else:
+            # # # # # # # # # # # # # # # #
+            # -------- solve NLP ---------
+            # # # # # # # # # # # # # # # #
+
+            # the multipliers are only used by IPOPT because of warm_start_init_point
+            result = self.solver(
+                x0=self.variables_init_guess,
+                lam_x0=self.variables_init_multipliers,
+                lam_g0=self.constraints_init_multipliers,
+                lbx=self.variables_lower_bound,
+                ubx=self.variables_upper_bound,
+                p=reference_trajectory,  # => I guess this is the mysterious P from _initDynamics?
+                lbg=self.constraints_lower_bound,
+                ubg=self.constraints_upper_bound
+            )
+
+            cost = result["f"]
+            solution = result["x"].full().squeeze(1)
+            stats = self.solver.stats()
+            iterations = stats["iter_count"]
+
+            self.variables_init_multipliers = self._shift_variables(result["lam_x"].full().squeeze(1))
+            self.constraints_init_multipliers = self._shift_constraints(result["lam_g"].full().squeeze(1))
 
-        cost = solution["f"]
-        # exit()
-
-        solution = solution["x"].full()
         optimal_action = solution[self._state_dim:(self._state_dim + self._action_dim)]
-        # optimal_action = solution[:self._action_dim]
 
-        # Warm initialization
-        self.variables_init_guess = list(solution[(self._state_dim + self._action_dim)
-                                                  :(2 * (self._state_dim + self._action_dim))])
-        self.variables_init_guess += list(solution[self._state_dim + self._action_dim:])
-        # self.variables_init_guess = list(solution[self._action_dim:(2 * self._action_dim)])
-        # self.variables_init_guess += list(solution[self._action_dim:])
-        # => improves the initial guess with the already computed commands I guess?
-        # => I think this just repeats the "second" state/action combination because it skips the first one?
+        # Warm initialization, with the solution shifted by one time step
+        self.variables_init_guess = self._shift_variables(solution)
 
         predicted_traj = np.reshape(solution[:-self._state_dim], newshape=(-1, self._state_dim + self._action_dim))
-        # predicted_traj = None
 
-        # return optimal action, and a sequence of predicted optimal trajectory.
-        return optimal_action.squeeze(), predicted_traj, cost
+        self._solve_stats.append((time.time() - solve_start, iterations, stats.get("return_status", ""),
+                                  stats.get("success", False), float(cost)))
+
+        # return optimal action, a sequence of predicted optimal trajectory, and the number of solver iterations
+        return optimal_action, predicted_traj, cost, iterations
+
+    def get_solve_stats(self):
+        return pd.DataFrame(list(self._solve_stats), columns=["wall_time", "iterations", "status", "success", "cost"])
+
+    def clear_solve_stats(self):
+        self._solve_stats.clear()
+
+    def summarise_solve_stats(self):
+        if len(self._solve_stats) == 0:
+            return {"num_solves": 0}
+        wall_time, iterations, _, success, _ = (np.array(values) for values in zip(*self._solve_stats))
+        return {
+            "num_solves": len(wall_time),
+            "latency_p50": np.percentile(wall_time, 50),
+            "latency_p95": np.percentile(wall_time, 95),
+            "latency_max": np.max(wall_time),
+            "iterations_mean": np.mean(iterations),
+            "failure_rate": 1.0 - np.mean(success),
+        }
 
     def quad_dynamics_integration(self, pred_time_step):
         refine_steps = 4
@@ -369,3 +551,214 @@ class MPCSolver(object):
 
         quad_dyn_int = ca.Function("quad_dyn_int", [state_init, action], [state])
         return quad_dyn_int
+
+
+class _ProblemGroup(object):
+    # one solver for multiple independent problems, each of which keeps its own warm start
+
+    def __init__(self, problem_indices, solver_args, solver_kwargs):
+        self.problem_indices = problem_indices
+        self.solver = MPCSolver(*solver_args, **solver_kwargs)
+        self.warm_starts = {}
+        self.reset()
+
+    def reset(self):
+        self.solver.reset_warm_start()
+        for index in self.problem_indices:
+            self.warm_starts[index] = self.solver.get_warm_start()
+
+    def solve(self, reference_trajectories):
+        results = []
+        for index, reference_trajectory in zip(self.problem_indices, reference_trajectories):
+            self.solver.set_warm_start(self.warm_starts[index])
+            action, predicted_traj, cost, iterations = self.solver.solve(reference_trajectory)
+            self.warm_starts[index] = self.solver.get_warm_start()
+            results.append((action, predicted_traj, float(cost), iterations))
+        return results
+
+
+def _problem_group_worker(connection, problem_indices, solver_args, solver_kwargs):
+    try:
+        group = _ProblemGroup(problem_indices, solver_args, solver_kwargs)
+    except Exception as e:
+        # e.g. invalid solver arguments, raised in the parent (like the errors when solving)
+        connection.send(e)
+        connection.close()
+        return
+    connection.send(None)
+    while True:
+        message = connection.recv()
+        if message is None:
+            break
+        command, reference_trajectories = message
+        try:
+            if command == "solve":
+                connection.send(group.solve(reference_trajectories))
+            else:
+                group.reset()
+                connection.send(None)
+        except Exception as e:
+            connection.send(e)
+    connection.close()
+
+
+class BatchMPCSolver(object):
+    """
+    Solves the MPC for multiple independent reference trajectories (e.g. for multiple drones) per call.
+
+    The problems are assigned to num_workers processes round-robin (problem k is always solved by worker
+    k % num_workers), each of which builds one MPCSolver (with the given keyword arguments) and keeps a separate
+    warm start for each of its problems. With num_workers=0, the problems are solved one after the other in this
+    process instead. By default, there is one worker per problem (up to the number of CPUs).
+    """
+
+    def __init__(self, num_problems, pred_time_horizon, pred_time_step, num_workers=None, **solver_kwargs):
+        if num_workers is None:
+            num_workers = min(num_problems, os.cpu_count() or 1)
+        self.num_problems = num_problems
+        self.num_workers = min(num_workers, num_problems)
+
+        solver_args = (pred_time_horizon, pred_time_step)
+        self.groups = []
+        self.connections = []
+        self.processes = []
+        if self.num_workers == 0:
+            self.groups.append(_ProblemGroup(list(range(num_problems)), solver_args, solver_kwargs))
+        else:
+            # spawn instead of fork, since the parent might already be running other threads (e.g. PyTorch)
+            context = multiprocessing.get_context("spawn")
+            for w_idx in range(self.num_workers):
+                connection, worker_connection = context.Pipe()
+                process = context.Process(target=_problem_group_worker, daemon=True, args=(
+                    worker_connection, list(range(w_idx, num_problems, self.num_workers)), solver_args, solver_kwargs))
+                process.start()
+                # only the worker uses its end, so that recv raises an EOFError if the worker dies
+                worker_connection.close()
+                self.connections.append(connection)
+                self.processes.append(process)
+            # wait until all solvers are built
+            errors = [connection.recv() for connection in self.connections]
+            errors = [e for e in errors if isinstance(e, Exception)]
+            if len(errors) > 0:
+                self.close()
+                raise errors[0]
+
+    def _problem_indices(self, w_idx):
+        return range(w_idx, self.num_problems, max(self.num_workers, 1))
+
+    def _request(self, command, reference_trajectories=None):
+        for w_idx, connection in enumerate(self.connections):
+            worker_references = None
+            if reference_trajectories is not None:
+                worker_references = [reference_trajectories[p_idx] for p_idx in self._problem_indices(w_idx)]
+            connection.send((command, worker_references))
+        results = []
+        for connection in self.connections:
+            result = connection.recv()
+            if isinstance(result, Exception):
+                raise result
+            results.append(result)
+        return results
+
+    def reset(self):
+        # start all problems from hovering again (e.g. at the start of new rollouts)
+        if self.num_workers == 0:
+            self.groups[0].reset()
+        else:
+            self._request("reset")
+
+    def solve(self, reference_trajectories):
+        """
+        Returns the optimal actions (num_problems x action_dim), the predicted trajectories, the costs and the
+        number of solver iterations for the given reference trajectories (one for each problem, in order).
+        """
+        if len(reference_trajectories) != self.num_problems:
+            raise ValueError("Expected {} reference trajectories, got {}.".format(
+                self.num_problems, len(reference_trajectories)))
+
+        if self.num_workers == 0:
+            results = self.groups[0].solve(reference_trajectories)
+        else:
+            worker_results = self._request("solve", reference_trajectories)
+            results = [None] * self.num_problems
+            for w_idx, group_results in enumerate(worker_results):
+                for p_idx, result in zip(self._problem_indices(w_idx), group_results):
+                    results[p_idx] = result
+
+        actions, predicted_trajs, costs, iterations = zip(*results)
+        return np.stack(actions), np.stack(predicted_trajs), np.array(costs), np.array(iterations)
+
+    def close(self):
+        for connection in self.connections:
+            try:
+                connection.send(None)
+            except (BrokenPipeError, EOFError):
+                # the worker has already exited (e.g. because its solver could not be built)
+                pass
+            connection.close()
+        for process in self.processes:
+            process.join()
+        self.connections = []
+        self.processes = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def compare_solvers(num_steps=100, command_frequency=20.0, qp_solver="osqp", pred_time_horizon=4.0,
+                    pred_time_step=0.2):
+    # closed-loop comparison of the RTI and IPOPT solvers on a helix, with the IPOPT actions applied
+    ipopt_solver = MPCSolver(pred_time_horizon, pred_time_step)
+    rti_solver = MPCSolver(pred_time_horizon, pred_time_step, solver_type="rti", qp_solver=qp_solver)
+    dynamics = ipopt_solver.quad_dynamics_integration(1.0 / command_frequency)
+
+    def reference(t, state=None):
+        time_stamps = t + np.arange(ipopt_solver._num_pred_steps + 1) * pred_time_step
+        position = np.stack([3.0 * np.cos(0.5 * time_stamps), 3.0 * np.sin(0.5 * time_stamps),
+                             2.0 + 0.2 * time_stamps], axis=1)
+        velocity = np.stack([-1.5 * np.sin(0.5 * time_stamps), 1.5 * np.cos(0.5 * time_stamps),
+                             np.full_like(time_stamps, 0.2)], axis=1)
+        rotation = np.tile([1.0, 0.0, 0.0, 0.0], (len(time_stamps), 1))
+        trajectory = np.hstack([position, rotation, velocity])
+        return np.concatenate([trajectory[0] if state is None else state, trajectory.reshape(-1)])
+
+    state = reference(0.0)[:ipopt_solver._state_dim]
+    ipopt_times, rti_times, ipopt_iterations, action_errors = [], [], [], []
+    for step in range(num_steps):
+        reference_trajectory = reference(step / command_frequency, state)
+
+        start = time.time()
+        ipopt_action, _, _, iterations = ipopt_solver.solve(reference_trajectory)
+        ipopt_times.append(time.time() - start)
+        ipopt_iterations.append(iterations)
+
+        start = time.time()
+        rti_action = rti_solver.solve(reference_trajectory)[0]
+        rti_times.append(time.time() - start)
+
+        action_errors.append(np.abs(ipopt_action - rti_action))
+        state = dynamics(state, ipopt_action).full().squeeze(1)
+
+    action_errors = np.array(action_errors)
+    print("[MPCSolver] IPOPT: {:.2f} ms per solve ({:.2f} iterations on average)".format(
+        np.mean(ipopt_times) * 1000, np.mean(ipopt_iterations)))
+    print("[MPCSolver] RTI ({}): {:.2f} ms per solve ({:.2f} ms for the first solve)".format(
+        qp_solver, np.mean(rti_times[1:]) * 1000, rti_times[0] * 1000))
+    print("[MPCSolver] Action error (thrust, roll/pitch/yaw rate): mean {}, max {}".format(
+        np.round(action_errors.mean(axis=0), 5), np.round(action_errors.max(axis=0), 5)))
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--num_steps", type=int, default=100)
+    parser.add_argument("-f", "--command_frequency", type=float, default=20.0)
+    parser.add_argument("-qp", "--qp_solver", type=str, default="osqp")
+
+    args = parser.parse_args()
+
+    compare_solvers(args.num_steps, args.command_frequency, args.qp_solver)
@@ -12,24 +12,35 @@
 import numpy as np
 import pandas as pd
 
+from functools import lru_cache
+
 from gazesim.data.constants import STATE_VARS_SHORTHAND_DICT as SVSD
 from gazesim.data.constants import STATE_VARS_UNIT_SHORTHAND_DICT as SVUSD
 
 STATE_VARS_DICT = {sh: [f"{sv} [{SVUSD[sh]}]" for sv in svl] for sh, svl in SVSD.items()}
 
 
-def row_to_state(row, columns=None, correct_height_flightmare=False):
+@lru_cache(maxsize=None)
+def _resolve_columns(columns=None):
+    # maps shorthands (e.g. "pos") and full column names to a tuple of full column names
     if columns is None:
-        columns = STATE_VARS_DICT["pos"] + STATE_VARS_DICT["rot"] + STATE_VARS_DICT["vel"]
-    else:
-        columns_all = [ds for sh, dsl in STATE_VARS_DICT.items() for ds in dsl]
-        new_columns = []
-        for ds in columns:
-            if ds in STATE_VARS_DICT:
-                new_columns.extend(STATE_VARS_DICT[ds])
-            elif ds in columns_all:
-                new_columns.append(ds)
-        columns = new_columns
+        return tuple(STATE_VARS_DICT["pos"] + STATE_VARS_DICT["rot"] + STATE_VARS_DICT["vel"])
+    columns_all = [ds for sh, dsl in STATE_VARS_DICT.items() for ds in dsl]
+    new_columns = []
+    for ds in columns:
+        if ds in STATE_VARS_DICT:
+            new_columns.extend(STATE_VARS_DICT[ds])
+        elif ds in columns_all:
+            new_columns.append(ds)
+    return tuple(new_columns)
+
+
+def resolve_columns(columns=None):
+    return list(_resolve_columns(None if columns is None else tuple(columns)))
+
+
+def row_to_state(row, columns=None, correct_height_flightmare=False):
+    columns = resolve_columns(columns)
 
     state = row[columns].values.astype(np.float32)
     if correct_height_flightmare and "position_z [m]" in columns:
@@ -59,6 +70,69 @@ def row_to_state(row, columns=None, correct_height_flightmare=False):
     return state
 
 
+QUATERNION_COLUMNS = ["rotation_{} [quaternion]".format(c) for c in ["w", "x", "y", "z"]]
+
+
+def quaternion_sign_flips(quaternions, use_norm=True):
+    """
+    Return which of the (consecutive) quaternions (n, 4) need to have their sign flipped to get rid of jumps
+    between q and -q, and the norms of the differences between consecutive (original) quaternions.
+
+    A jump is detected if the norm of the difference is at least 0.5 (use_norm=True) or if at least
+    three of the components change their sign, every jump toggles whether the following quaternions
+    are flipped.
+    """
+    quaternions = np.asarray(quaternions, dtype=np.float64)
+    norm_diffs = np.linalg.norm(quaternions[1:] - quaternions[:-1], axis=1)
+    if use_norm:
+        jumps = norm_diffs >= 0.5
+    else:
+        signs_positive = quaternions >= 0
+        jumps = np.sum(signs_positive[1:] != signs_positive[:-1], axis=1) >= 3
+    flipped = np.concatenate((np.zeros(min(len(quaternions), 1), dtype=bool), np.logical_xor.accumulate(jumps)))
+    return flipped, norm_diffs
+
+
+def ensure_quaternion_consistency(trajectory, use_norm=True, return_norm_diffs=False):
+    """
+    Return a copy of the trajectory (with a reset index) in which the sign of the quaternions is consistent
+    over time, see quaternion_sign_flips, and a "flipped" column marks the quaternions that were flipped.
+    """
+    trajectory = trajectory.reset_index(drop=True)
+    quaternions = trajectory[QUATERNION_COLUMNS].values
+    flipped, norm_diffs = quaternion_sign_flips(quaternions, use_norm)
+    trajectory["flipped"] = flipped.astype(int)
+    trajectory[QUATERNION_COLUMNS] = np.where(flipped[:, np.newaxis], -quaternions, quaternions)
+    if return_norm_diffs:
+        return trajectory, norm_diffs
+    return trajectory
+
+
+def nlerp(q0, q1, alpha):
+    """Normalized linear interpolation between quaternions q0 and q1 (..., 4) with weights alpha (...)."""
+    alpha = np.asarray(alpha)[..., np.newaxis]
+    # interpolate along the shorter arc
+    q1 = np.where(np.sum(q0 * q1, axis=-1, keepdims=True) < 0, -q1, q1)
+    q = (1.0 - alpha) * q0 + alpha * q1
+    return q / np.linalg.norm(q, axis=-1, keepdims=True)
+
+
+def slerp(q0, q1, alpha):
+    """Spherical linear interpolation between quaternions q0 and q1 (..., 4) with weights alpha (...)."""
+    alpha = np.asarray(alpha)[..., np.newaxis]
+    dot = np.sum(q0 * q1, axis=-1, keepdims=True)
+    q1 = np.where(dot < 0, -q1, q1)
+    theta = np.arccos(np.clip(np.abs(dot), 0.0, 1.0))
+    sin_theta = np.sin(theta)
+    # fall back to linear interpolation for (almost) identical quaternions
+    small = sin_theta < 1e-6
+    sin_theta = np.where(small, 1.0, sin_theta)
+    w0 = np.where(small, 1.0 - alpha, np.sin((1.0 - alpha) * theta) / sin_theta)
+    w1 = np.where(small, alpha, np.sin(alpha * theta) / sin_theta)
+    q = w0 * q0 + w1 * q1
+    return q / np.linalg.norm(q, axis=-1, keepdims=True)
+
+
 class TrajectorySampler:
 
     # TODO: try something like "proximity trajectory planner"
@@ -73,67 +147,112 @@ class TrajectorySampler:
         self._final_time_stamp = self._trajectory["time-since-start [s]"].max()
         # TODO: maybe implement other ways of sampling from the trajectory, e.g. using the position as well
 
+        # the trajectory is converted once, so that sampling is only a binary search and an array lookup
+        self._time_stamps = self._trajectory["time-since-start [s]"].values.astype(np.float64)
+        self._state_columns = [ds for sh, dsl in STATE_VARS_DICT.items() for ds in dsl
+                               if ds in self._trajectory.columns]
+        self._states = np.ascontiguousarray(self._trajectory[self._state_columns].values, dtype=np.float32)
+        if self._correct_height_flightmare and "position_z [m]" in self._state_columns:
+            z_index = self._state_columns.index("position_z [m]")
+            self._states[:, z_index] = self._states[:, z_index].astype(np.float64) + 0.35
+        self._column_index_map = {c: i for i, c in enumerate(self._state_columns)}
+        self._column_indices = {}
+        self._quaternion_positions = {}
+
+    def _get_column_indices(self, columns=None):
+        key = None if columns is None else tuple(columns)
+        indices = self._column_indices.get(key)
+        if indices is None:
+            indices = np.array([self._column_index_map[c] for c in _resolve_columns(key)], dtype=np.int64)
+            self._column_indices[key] = indices
+        return indices
+
+    def _sample_index(self, index, columns=None):
+        return self._states[index, self._get_column_indices(columns)]
+
     def get_final_time_stamp(self):
         return self._final_time_stamp
 
     def get_initial_state(self, columns=None):
-        return row_to_state(self._trajectory.iloc[0], columns, self._correct_height_flightmare)
+        return self._sample_index(0, columns)
 
     def get_final_state(self, columns=None):
-        return row_to_state(self._trajectory.iloc[-1], columns, self._correct_height_flightmare)
+        return self._sample_index(-1, columns)
+
+    def _get_quaternion_positions(self, columns=None):
+        # positions of the (complete) quaternion block within the requested columns, if there is one
+        key = None if columns is None else tuple(columns)
+        if key not in self._quaternion_positions:
+            resolved = _resolve_columns(key)
+            positions = None
+            if all(c in resolved for c in STATE_VARS_DICT["rot"]):
+                positions = np.array([resolved.index(c) for c in STATE_VARS_DICT["rot"]], dtype=np.int64)
+            self._quaternion_positions[key] = positions
+        return self._quaternion_positions[key]
+
+    def _interpolate(self, time_stamps, interpolation, columns=None):
+        # neighbouring samples and interpolation weights, constant before the start and after the end
+        last_index = len(self._time_stamps) - 1
+        indices = np.searchsorted(self._time_stamps, time_stamps, side="right") - 1
+        indices_0 = np.clip(indices, 0, last_index)
+        indices_1 = np.minimum(indices_0 + 1, last_index)
+        time_stamps_0 = self._time_stamps[indices_0]
+        time_diff = self._time_stamps[indices_1] - time_stamps_0
+        alpha = np.clip((time_stamps - time_stamps_0) / np.where(time_diff > 0, time_diff, 1.0), 0.0, 1.0)
+
+        column_indices = self._get_column_indices(columns)
+        states_0 = self._states[indices_0[:, np.newaxis], column_indices].astype(np.float64)
+        states_1 = self._states[indices_1[:, np.newaxis], column_indices].astype(np.float64)
+        states = states_0 + alpha[:, np.newaxis] * (states_1 - states_0)
+
+        quaternion_positions = self._get_quaternion_positions(columns)
+        if quaternion_positions is not None:
+            interpolate_quaternions = slerp if interpolation == "slerp" else nlerp
+            states[:, quaternion_positions] = interpolate_quaternions(
+                states_0[:, quaternion_positions], states_1[:, quaternion_positions], alpha)
+        return states.astype(np.float32)
 
     def sample_from_trajectory(self, time_stamp, interpolation="nearest_below", columns=None):
-        # TODO: implement some sort of interpolation
-        row_idx = self._trajectory["time-since-start [s]"] <= time_stamp
-        if all(~row_idx):
-            index = 0
-        else:
-            index = self._trajectory.loc[row_idx, "time-since-start [s]"].idxmax()
-        return row_to_state(self._trajectory.iloc[index], columns, self._correct_height_flightmare)
+        """
+        Return the state at the given time stamp, either the last sample at or before it ("nearest_below"),
+        or interpolated between the neighbouring samples, linearly with the quaternions interpolated by
+        nlerp ("linear") or by slerp ("slerp").
+        """
+        if interpolation == "nearest_below":
+            # last time stamp <= time_stamp (or the first one if there is none)
+            index = max(int(np.searchsorted(self._time_stamps, time_stamp, side="right")) - 1, 0)
+            return self._sample_index(index, columns)
+        return self.sample_from_trajectory_batch(np.array([time_stamp]), interpolation, columns)[0]
+
+    def sample_from_trajectory_batch(self, time_stamps, interpolation="nearest_below", columns=None):
+        # same as sample_from_trajectory for an array of time stamps, returns one state (row) per time stamp
+        if interpolation not in ["nearest_below", "linear", "slerp"]:
+            raise ValueError("Unknown interpolation '{}'.".format(interpolation))
+        time_stamps = np.asarray(time_stamps, dtype=np.float64)
+        if interpolation != "nearest_below":
+            return self._interpolate(time_stamps, interpolation, columns)
+        indices = np.searchsorted(self._time_stamps, time_stamps, side="right") - 1
+        np.maximum(indices, 0, out=indices)
+        return self._states[indices[:, np.newaxis], self._get_column_indices(columns)]
 
     def _ensure_quaternion_consistency(self, use_norm=True):
-        flipped = 0
-        self._trajectory["flipped"] = 0
-        self._trajectory.loc[0, "flipped"] = flipped
-
-        quat_columns = ["rotation_{} [quaternion]".format(c) for c in ["w", "x", "y", "z"]]
-        prev_quaternion = self._trajectory.loc[0, quat_columns]
-        prev_signs_positive = prev_quaternion >= 0
-
-        for i in range(1, len(self._trajectory.index)):
-            current_quaternion = self._trajectory.loc[i, quat_columns]
-            current_signs_positive = current_quaternion >= 0
-            condition_sign = prev_signs_positive == ~current_signs_positive
-
-            norm_diff = np.linalg.norm(prev_quaternion.values - current_quaternion.values)
-
-            if use_norm:
-                if norm_diff >= 0.5:
-                    flipped = 1 - flipped
-            else:
-                if np.sum(condition_sign) >= 3:
-                    flipped = 1 - flipped
-            self._trajectory.loc[i, "flipped"] = flipped
-
-            prev_signs_positive = current_signs_positive
-            prev_quaternion = current_quaternion
-
-        self._trajectory.loc[self._trajectory["flipped"] == 1, quat_columns] *= -1.0
+        self._trajectory = ensure_quaternion_consistency(self._trajectory, use_norm)
 
 
 class TrajectoryPlanner:
 
     def __init__(self, trajectory_path, plan_time_horizon=2.0, plan_time_step=0.1, max_time=None,
-                 correct_height_flightmare=False, fix_quaternions=True):
+                 correct_height_flightmare=False, fix_quaternions=True, interpolation="nearest_below"):
         self._trajectory_sampler = TrajectorySampler(trajectory_path, max_time,
                                                      correct_height_flightmare, fix_quaternions)
+        self._interpolation = interpolation
 
         self._plan_time_horizon = plan_time_horizon
         self._plan_time_step = plan_time_step
         self._num_plan_steps = int(self._plan_time_horizon / self._plan_time_step)
 
     def sample_from_trajectory(self, current_time, columns=None):
-        return self._trajectory_sampler.sample_from_trajectory(current_time, columns=columns)
+        return self._trajectory_sampler.sample_from_trajectory(current_time, self._interpolation, columns)
 
     def plan(self, current_state, current_time):
         # TODO: if enabled, for the first X seconds, fly "buffer start"
@@ -143,20 +262,21 @@ class TrajectoryPlanner:
         # => to that end, might want to load entire trajectories, specify the lap (?), select based
         #    on the frame_index and then do the above
 
-        latest_non_hover_state = current_state.tolist()
-        planned_trajectory = list(current_state)
-        for step in range(self._num_plan_steps + 1):
-            time = current_time + step * self._plan_time_step
-
-            if time <= self.get_final_time_stamp():
-                state = self._trajectory_sampler.sample_from_trajectory(current_time + step * self._plan_time_step).tolist()
-                planned_trajectory += state
-                latest_non_hover_state = state
-            else:
-                # hover
-                # TODO: probably some kind of interpolation between the last "proper" state and a hover state
-                planned_trajectory += latest_non_hover_state[:2] + [3.0, 1.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0]
-        planned_trajectory = np.array(planned_trajectory)
+        time_stamps = current_time + np.arange(self._num_plan_steps + 1) * self._plan_time_step
+        on_trajectory = time_stamps <= self.get_final_time_stamp()
+        states = self._trajectory_sampler.sample_from_trajectory_batch(
+            time_stamps[on_trajectory], self._interpolation)
+
+        planned_trajectory = np.empty((len(time_stamps), states.shape[1]), dtype=np.float64)
+        planned_trajectory[on_trajectory] = states
+        if not np.all(on_trajectory):
+            # hover (only at the end, since the time stamps are increasing)
+            # TODO: probably some kind of interpolation between the last "proper" state and a hover state
+            latest_non_hover_state = states[-1] if len(states) > 0 else current_state
+            planned_trajectory[~on_trajectory] = [latest_non_hover_state[0], latest_non_hover_state[1],
+                                                  3.0, 1.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0]
+        planned_trajectory = np.concatenate((np.asarray(current_state, dtype=np.float64),
+                                             planned_trajectory.reshape(-1)))
 
         return planned_trajectory
 
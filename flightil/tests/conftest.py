@@ -0,0 +1,6 @@
+import os
+import sys
+
+# the flightil modules import each other as top-level packages (e.g. "from planning.planner import ..."),
+# so the tests are run with the flightil directory on the path, like the scripts in it
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+
+from dda.collisions import CollisionMap, check_collision, grid_shape, p2vox
+
+RESO = 0.1
+XL, YL, ZL = (-3, 3), (-2, 2), (-1, 5)
+
+
+def baseline_check_collision(p, colliders, reso, xl, yl, zl):
+    # check_collision before the CollisionMap (only for positions inside of the grid)
+    coords = p2vox(p.reshape((-1, 3)), reso, xl, yl, zl)
+    return np.array([colliders[coords[i, 0], coords[i, 1], coords[i, 2]] for i in
+                     range(p.shape[0])]).astype(bool)
+
+
+@pytest.fixture
+def grid():
+    # the number of voxels along z (60) is not a multiple of 8, so the last packed byte is only partially used
+    rng = np.random.default_rng(0)
+    return (rng.random(grid_shape(RESO, XL, YL, ZL)) < 0.3).astype(np.uint8)
+
+
+@pytest.fixture
+def positions():
+    rng = np.random.default_rng(1)
+    lower, upper = np.array([XL[0], YL[0], ZL[0]]), np.array([XL[1], YL[1], ZL[1]])
+    return lower + (upper - lower - 1e-6) * rng.random((1000, 3))
+
+
+@pytest.mark.parametrize("packed", [False, True])
+def test_collision_map_matches_baseline(grid, positions, packed):
+    collision_map = CollisionMap(grid, RESO, XL, YL, ZL, packed=packed)
+    expected = baseline_check_collision(positions, grid, RESO, XL, YL, ZL)
+    np.testing.assert_array_equal(collision_map.check(positions), expected)
+    np.testing.assert_array_equal(check_collision(positions, collision_map), expected)
+    np.testing.assert_array_equal(collision_map.to_grid(), grid)
+
+
+def test_collision_map_packed_size(grid):
+    packed = CollisionMap(grid, RESO, XL, YL, ZL, packed=True)
+    unpacked = CollisionMap(grid, RESO, XL, YL, ZL, packed=False)
+    assert packed.shape == unpacked.shape == grid.shape
+    assert packed.nbytes == grid.shape[0] * grid.shape[1] * int(np.ceil(grid.shape[2] / 8))
+    assert unpacked.nbytes == grid.size
+
+    # already packed data (e.g. loaded from the cache) is used as it is
+    reloaded = CollisionMap(packed.data, RESO, XL, YL, ZL, packed=True)
+    np.testing.assert_array_equal(reloaded.to_grid(), grid)
+
+
+@pytest.mark.parametrize("packed", [None, False, True])
+def test_check_collision_out_of_bounds(grid, packed):
+    colliders = grid if packed is None else CollisionMap(grid, RESO, XL, YL, ZL, packed=packed)
+    # inside, beyond the upper x limit, below the lower z limit
+    p = np.array([[0.0, 0.0, 2.0], [3.5, 0.0, 2.0], [0.0, 0.0, -1.5]])
+    inside = grid[tuple(p2vox(p[:1], RESO, XL, YL, ZL)[0])]
+    closest = [grid[-1, 20, 30], grid[30, 20, 0]]
+
+    def check(out_of_bounds):
+        if packed is None:
+            return check_collision(p, colliders, RESO, XL, YL, ZL, out_of_bounds=out_of_bounds)
+        return check_collision(p, colliders, out_of_bounds=out_of_bounds)
+
+    np.testing.assert_array_equal(check("flag"), [inside, True, True])
+    np.testing.assert_array_equal(check("free"), [inside, False, False])
+    np.testing.assert_array_equal(check("clip"), [inside] + closest)
+    with pytest.raises(ValueError):
+        check("ignore")
+
+
+def test_check_collision_batched(grid, positions):
+    collision_map = CollisionMap(grid, RESO, XL, YL, ZL, packed=True)
+    expected = baseline_check_collision(positions, grid, RESO, XL, YL, ZL)
+    batched = positions.reshape((10, 20, 5, 3))
+    result = check_collision(batched, collision_map)
+    assert result.shape == (10, 20, 5)
+    np.testing.assert_array_equal(result.reshape(-1), expected)
+    np.testing.assert_array_equal(check_collision(batched, grid, RESO, XL, YL, ZL), result)
@@ -0,0 +1,205 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from scipy.spatial.transform import Rotation, Slerp
+
+# the planner gets the state column names from gazesim
+pytest.importorskip("gazesim")
+
+from planning.planner import STATE_VARS_DICT, TrajectorySampler, ensure_quaternion_consistency, quaternion_sign_flips
+
+TIME = "time-since-start [s]"
+ROT = STATE_VARS_DICT["rot"]
+
+
+def baseline_row_to_state(row, columns=None, correct_height_flightmare=False):
+    if columns is None:
+        columns = STATE_VARS_DICT["pos"] + STATE_VARS_DICT["rot"] + STATE_VARS_DICT["vel"]
+    else:
+        columns_all = [ds for sh, dsl in STATE_VARS_DICT.items() for ds in dsl]
+        new_columns = []
+        for ds in columns:
+            if ds in STATE_VARS_DICT:
+                new_columns.extend(STATE_VARS_DICT[ds])
+            elif ds in columns_all:
+                new_columns.append(ds)
+        columns = new_columns
+
+    state = row[columns].values.astype(np.float32)
+    if correct_height_flightmare and "position_z [m]" in columns:
+        index = columns.index("position_z [m]")
+        state[index] += 0.35
+    return state
+
+
+def baseline_sample(trajectory, time_stamp, columns=None, correct_height_flightmare=False):
+    # TrajectorySampler.sample_from_trajectory before the binary search
+    row_idx = trajectory[TIME] <= time_stamp
+    if all(~row_idx):
+        index = 0
+    else:
+        index = trajectory.loc[row_idx, TIME].idxmax()
+    return baseline_row_to_state(trajectory.iloc[index], columns, correct_height_flightmare)
+
+
+def baseline_quaternion_consistency(trajectory, use_norm=True):
+    # TrajectorySampler._ensure_quaternion_consistency before quaternion_sign_flips
+    trajectory = trajectory.copy()
+    flipped = 0
+    trajectory["flipped"] = 0
+    trajectory.loc[0, "flipped"] = flipped
+
+    prev_quaternion = trajectory.loc[0, ROT]
+    prev_signs_positive = prev_quaternion >= 0
+
+    for i in range(1, len(trajectory.index)):
+        current_quaternion = trajectory.loc[i, ROT]
+        current_signs_positive = current_quaternion >= 0
+        condition_sign = prev_signs_positive == ~current_signs_positive
+
+        norm_diff = np.linalg.norm(prev_quaternion.values - current_quaternion.values)
+
+        if use_norm:
+            if norm_diff >= 0.5:
+                flipped = 1 - flipped
+        else:
+            if np.sum(condition_sign) >= 3:
+                flipped = 1 - flipped
+        trajectory.loc[i, "flipped"] = flipped
+
+        prev_signs_positive = current_signs_positive
+        prev_quaternion = current_quaternion
+
+    trajectory.loc[trajectory["flipped"] == 1, ROT] *= -1.0
+    return trajectory
+
+
+@pytest.fixture
+def trajectory():
+    rng = np.random.default_rng(0)
+    num_samples = 50
+    data = {TIME: np.cumsum(rng.uniform(0.01, 0.05, num_samples)) - 0.01}
+    for name in ["pos", "vel", "acc", "omega"]:
+        for column, values in zip(STATE_VARS_DICT[name], rng.normal(size=(len(STATE_VARS_DICT[name]), num_samples))):
+            data[column] = values
+
+    # slow rotation about a tilted axis, with the sign of some of the quaternions flipped
+    angles = np.linspace(0.0, 2.0, num_samples)
+    axis = np.array([0.3, -0.2, 0.9]) / np.linalg.norm([0.3, -0.2, 0.9])
+    quaternions = np.hstack((np.cos(0.5 * angles)[:, np.newaxis], np.sin(0.5 * angles)[:, np.newaxis] * axis))
+    quaternions[10:20] *= -1.0
+    quaternions[35:] *= -1.0
+    for column, values in zip(ROT, quaternions.T):
+        data[column] = values
+    return pd.DataFrame(data)
+
+
+@pytest.fixture
+def trajectory_path(trajectory, tmp_path):
+    path = tmp_path / "trajectory.csv"
+    trajectory.to_csv(path, index=False)
+    return str(path)
+
+
+def sample_times(trajectory):
+    # before the start, at and between the samples and after the end
+    time_stamps = trajectory[TIME].values
+    return np.concatenate(([-1.0, time_stamps[0] - 1e-9], time_stamps, 0.5 * (time_stamps[1:] + time_stamps[:-1]),
+                           [time_stamps[-1] + 1.0]))
+
+
+@pytest.mark.parametrize("columns", [None, ["pos", "rot", "vel", "omega"], ["rot", "position_x [m]"]])
+def test_nearest_below_matches_baseline(trajectory_path, columns):
+    sampler = TrajectorySampler(trajectory_path, fix_quaternions=False)
+    trajectory = pd.read_csv(trajectory_path)
+    times = sample_times(trajectory)
+    expected = np.stack([baseline_sample(trajectory, t, columns) for t in times])
+
+    for t, state in zip(times, expected):
+        np.testing.assert_array_equal(sampler.sample_from_trajectory(t, columns=columns), state)
+    np.testing.assert_array_equal(sampler.sample_from_trajectory_batch(times, columns=columns), expected)
+
+    np.testing.assert_array_equal(sampler.get_initial_state(columns),
+                                  baseline_row_to_state(trajectory.iloc[0], columns))
+    np.testing.assert_array_equal(sampler.get_final_state(columns),
+                                  baseline_row_to_state(trajectory.iloc[-1], columns))
+
+
+def test_nearest_below_max_time_and_height(trajectory_path):
+    trajectory = pd.read_csv(trajectory_path)
+    max_time = trajectory[TIME].iloc[30]
+    sampler = TrajectorySampler(trajectory_path, max_time=max_time, correct_height_flightmare=True,
+                                fix_quaternions=False)
+    trajectory = trajectory.loc[trajectory[TIME] <= max_time]
+    assert sampler.get_final_time_stamp() == max_time
+
+    for t in sample_times(trajectory):
+        np.testing.assert_array_equal(sampler.sample_from_trajectory(t), baseline_sample(trajectory, t, None, True))
+
+
+@pytest.mark.parametrize("interpolation", ["linear", "slerp"])
+def test_interpolation(trajectory_path, interpolation):
+    sampler = TrajectorySampler(trajectory_path)
+    trajectory = pd.read_csv(trajectory_path)
+    columns = STATE_VARS_DICT["pos"] + ROT + STATE_VARS_DICT["vel"] + STATE_VARS_DICT["omega"]
+    time_stamps = trajectory[TIME].values
+    times = sample_times(trajectory)
+    states = sampler.sample_from_trajectory_batch(times, interpolation, columns)
+    assert states.shape == (len(times), len(columns)) and states.dtype == np.float32
+
+    # everything but the quaternions is interpolated linearly, and constant outside of the trajectory
+    for i, column in enumerate(columns):
+        if column not in ROT:
+            np.testing.assert_allclose(states[:, i], np.interp(times, time_stamps, trajectory[column].values),
+                                       rtol=1e-5, atol=1e-6)
+
+    # the quaternions (made consistent by the sampler) along the shorter arc, i.e. the same rotations
+    # as scipy's slerp (up to their sign), exactly for slerp and approximately for the normalized lerp
+    quaternions = states[:, [columns.index(c) for c in ROT]].astype(np.float64)
+    np.testing.assert_allclose(np.linalg.norm(quaternions, axis=1), 1.0, rtol=1e-6)
+    rotations = Rotation.from_quat(trajectory[ROT[1:] + ROT[:1]].values)
+    expected = Slerp(time_stamps, rotations)(np.clip(times, time_stamps[0], time_stamps[-1])).as_quat()
+    dots = np.abs(np.sum(quaternions[:, [1, 2, 3, 0]] * expected, axis=1))
+    np.testing.assert_allclose(dots, 1.0, atol=1e-6 if interpolation == "slerp" else 1e-4)
+
+    # at the samples, the interpolation is the same as the nearest sample
+    np.testing.assert_allclose(sampler.sample_from_trajectory_batch(time_stamps, interpolation, columns),
+                               sampler.sample_from_trajectory_batch(time_stamps, "nearest_below", columns), atol=1e-6)
+    np.testing.assert_array_equal(sampler.sample_from_trajectory(times[5], interpolation, columns), states[5])
+
+
+def test_unknown_interpolation(trajectory_path):
+    sampler = TrajectorySampler(trajectory_path)
+    with pytest.raises(ValueError):
+        sampler.sample_from_trajectory(0.1, "cubic")
+
+
+@pytest.mark.parametrize("use_norm", [True, False])
+def test_quaternion_consistency_matches_baseline(trajectory, use_norm):
+    expected = baseline_quaternion_consistency(trajectory, use_norm)
+    assert expected["flipped"].sum() > 0
+
+    flipped, norm_diffs = quaternion_sign_flips(trajectory[ROT].values, use_norm)
+    np.testing.assert_array_equal(flipped, expected["flipped"].values == 1)
+    np.testing.assert_allclose(norm_diffs, np.linalg.norm(np.diff(trajectory[ROT].values, axis=0), axis=1))
+
+    fixed = ensure_quaternion_consistency(trajectory, use_norm)
+    pd.testing.assert_frame_equal(fixed, expected, check_dtype=False)
+    # the original trajectory is not changed
+    assert not trajectory.equals(fixed[trajectory.columns])
+
+
+def test_quaternion_consistency_sampler(trajectory, trajectory_path):
+    sampler = TrajectorySampler(trajectory_path)
+    expected = baseline_quaternion_consistency(pd.read_csv(trajectory_path))
+    np.testing.assert_array_equal(sampler.sample_from_trajectory_batch(expected[TIME].values, columns=["rot"]),
+                                  expected[ROT].values.astype(np.float32))
+
+
+def test_quaternion_sign_flips_short():
+    flipped, norm_diffs = quaternion_sign_flips(np.zeros((0, 4)))
+    assert flipped.shape == (0,) and norm_diffs.shape == (0,)
+    flipped, norm_diffs = quaternion_sign_flips(np.array([[1.0, 0.0, 0.0, 0.0]]))
+    np.testing.assert_array_equal(flipped, [False])
+    assert norm_diffs.shape == (0,)
@@ -0,0 +1,113 @@
+import numpy as np
+import pytest
+
+from dda.scheduler import MultiRateScheduler
+
+NAMES = ("image", "reference", "command", "expert")
+
+
+def baseline_updates(base_frequency, frequencies, total_time):
+    # the float timers that Simulation.reset/step used before the scheduler: on reset, everything
+    # but the command is updated at t = 0, on each step the base time is advanced first and then
+    # every timer that is due (timer <= base time) is advanced by one period
+    periods = {n: 1.0 / f for n, f in frequencies.items()}
+    timers = {n: 0.0 for n in NAMES}
+    base_time = 0.0
+
+    rows, done = [], []
+    row = {n: False for n in NAMES}
+    for n in ("image", "reference", "expert"):
+        if timers[n] <= base_time:
+            timers[n] += periods[n]
+            row[n] = True
+    rows.append(tuple(row[n] for n in NAMES))
+    done.append(False)
+
+    while not done[-1]:
+        base_time += 1.0 / base_frequency
+        row = {n: False for n in NAMES}
+        for n in ("command", "image", "reference", "expert"):
+            if timers[n] <= base_time:
+                timers[n] += periods[n]
+                row[n] = True
+        rows.append(tuple(row[n] for n in NAMES))
+        done.append(base_time > total_time)
+    return rows, done
+
+
+def build_scheduler(base_frequency, frequencies, total_time):
+    scheduler = MultiRateScheduler(base_frequency, {n: frequencies[n] for n in NAMES},
+                                   defer_initial=("command",))
+    scheduler.build(total_time)
+    return scheduler
+
+
+@pytest.mark.parametrize("base_frequency, frequencies", [
+    # powers of two, for which the float timers are exact
+    (64, {"image": 16, "reference": 32, "command": 64, "expert": 8}),
+    (128, {"image": 32, "reference": 64, "command": 16, "expert": 4}),
+    (32, {"image": 8, "reference": 8, "command": 32, "expert": 2}),
+])
+def test_matches_baseline_timers(base_frequency, frequencies):
+    rows, done = baseline_updates(base_frequency, frequencies, total_time=4.0)
+    scheduler = build_scheduler(base_frequency, frequencies, total_time=4.0)
+
+    assert scheduler.num_steps == len(rows)
+    for step, (row, step_done) in enumerate(zip(rows, done)):
+        assert scheduler.updates(step) == row, step
+        assert scheduler.done(step) == step_done, step
+
+
+def test_defer_initial():
+    scheduler = build_scheduler(100, {"image": 30, "reference": 50, "command": 100, "expert": 20}, total_time=1.0)
+    assert scheduler.updates(0) == (True, True, False, True)
+    # the deferred command is updated on the first step instead of on reset
+    assert scheduler.updates(1)[NAMES.index("command")]
+
+    scheduler = build_scheduler(100, {"image": 30, "reference": 50, "command": 20, "expert": 20}, total_time=1.0)
+    assert scheduler.updates(1) == (False, False, True, False)
+    assert not scheduler.updates(2)[NAMES.index("command")]
+
+
+def test_no_drift():
+    # 30 Hz images at 100 Hz: exactly 30 updates per second, one for each event in (t_{n-1}, t_n]
+    scheduler = build_scheduler(100, {"image": 30, "reference": 50, "command": 100, "expert": 20}, total_time=60.0)
+    image = scheduler.mask("image")
+    steps = np.flatnonzero(image[1:]) + 1
+    expected = np.ceil(np.arange(1, 60 * 30 + 1) * 100 / 30).astype(int)
+    np.testing.assert_array_equal(steps[:len(expected)], expected)
+    for second in range(60):
+        assert np.sum(image[second * 100 + 1:(second + 1) * 100 + 1]) == 30
+
+    reference = scheduler.mask("reference")
+    np.testing.assert_array_equal(np.flatnonzero(reference), np.arange(0, scheduler.num_steps, 2))
+
+
+def test_tick_frequency():
+    scheduler = MultiRateScheduler(100, {"image": 30, "reference": 50, "command": 100, "expert": 20})
+    assert scheduler.tick_frequency == 300
+    assert scheduler.base_ticks == 3
+    np.testing.assert_array_equal(scheduler.period_ticks, [10, 6, 3, 15])
+
+    # float frequencies from the configs are treated as the fractions they represent
+    scheduler = MultiRateScheduler(100.0, {"image": 30.000000001})
+    assert scheduler.tick_frequency == 300
+
+
+def test_done_and_extension():
+    scheduler = build_scheduler(100, {"image": 25, "reference": 50, "command": 100, "expert": 20}, total_time=1.0)
+    # the first step with time > total time is the last one
+    assert scheduler.num_steps == 102
+    assert not scheduler.done(100)
+    assert scheduler.done(101)
+
+    # stepping past the end extends the masks with the same pattern
+    assert scheduler.updates(250) == (False, True, True, True)
+    assert scheduler.updates(251) == (False, False, True, False)
+    assert scheduler.updates(252) == (True, True, True, False)
+    assert scheduler.done(250)
+
+
+def test_invalid_frequency():
+    with pytest.raises(ValueError):
+        MultiRateScheduler(100, {"image": 0})
@@ -0,0 +1,131 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+# the simulation module imports the Flightmare bindings and the planner (which depends on gazesim)
+pytest.importorskip("flightgym")
+pytest.importorskip("gazesim")
+
+from dda.simulation import Simulation, StepResult
+
+KEYS = ["done", "time", "collision", "state", "state_estimate", "image", "reference", "update"]
+UPDATE_KEYS = ["image", "reference", "command", "expert"]
+
+
+class DummySimulation(Simulation):
+
+    def __init__(self, deferred_images=False):
+        super().__init__(SimpleNamespace(base_frequency=100.0, image_frequency=25.0, ref_frequency=50.0,
+                                         command_frequency=100.0, expert_command_frequency=20.0))
+        self.deferred_images = deferred_images
+        self.num_images = 0
+
+    def _reset(self):
+        self.total_time = 1.0
+
+    def _get_state(self, action=None):
+        return np.full(10, self.step_index, dtype=np.float32), True
+
+    def _get_state_estimate(self):
+        return self.current_state
+
+    def _defer_image(self):
+        return self.deferred_images and self.image_updated
+
+    def _get_image(self):
+        if self.image_updated:
+            self.num_images += 1
+            self.current_image = np.full((2, 2, 3), self.step_index, dtype=np.uint8)
+        return self.current_image
+
+    def _get_reference(self):
+        return np.zeros(13, dtype=np.float32)
+
+    def _determine_collision(self):
+        return False
+
+
+def baseline_result(simulation):
+    # the nested dict that reset/step returned before StepResult
+    return {
+        "done": simulation.trajectory_done,
+        "time": simulation.base_time,
+        "collision": simulation.collision,
+        "state": simulation.current_state,
+        "state_estimate": simulation.current_state_estimate,
+        "image": simulation.current_image,
+        "reference": simulation.current_reference,
+        "update": {
+            "image": simulation.image_updated,
+            "reference": simulation.reference_updated,
+            "command": simulation.command_to_be_updated,
+            "expert": simulation.expert_to_be_updated,
+        },
+    }
+
+
+def assert_result_equal(result, expected):
+    assert list(result.keys()) == KEYS
+    for key in KEYS:
+        assert key in result
+        if key == "update":
+            assert list(result[key].keys()) == UPDATE_KEYS
+            assert result[key].to_dict() == expected[key]
+        else:
+            np.testing.assert_equal(result[key], expected[key])
+    np.testing.assert_equal(result.to_dict(), expected)
+
+
+def test_step_result_reused():
+    simulation = DummySimulation()
+    result = simulation.reset()
+    assert isinstance(result, StepResult)
+    assert_result_equal(result, baseline_result(simulation))
+
+    action = np.zeros(4)
+    while not result["done"]:
+        assert simulation.step(action) is result
+        assert_result_equal(result, baseline_result(simulation))
+    assert simulation.step_index == 101
+
+
+def test_step_result_snapshot():
+    simulation = DummySimulation()
+    snapshot = simulation.reset().to_dict()
+    simulation.step(np.zeros(4))
+    assert snapshot["time"] == 0.0
+    assert snapshot["update"] == {"image": True, "reference": True, "command": False, "expert": True}
+    assert simulation.result.time == pytest.approx(0.01)
+
+
+def test_item_assignment():
+    result = StepResult()
+    result["done"] = True
+    result["update"]["expert"] = True
+    assert result.done and result.update.expert
+    assert "image" in result and "foo" not in result
+
+
+def test_deferred_image():
+    simulation = DummySimulation(deferred_images=True)
+    result = simulation.reset()
+    assert simulation.num_images == 0
+    # only rendered once, when it is first read
+    assert result.image[0, 0, 0] == 0
+    assert result["image"][0, 0, 0] == 0
+    assert simulation.num_images == 1
+
+    # steps 1 to 3 have no new image, step 4 does (25 Hz at 100 Hz), which is collected by the next step
+    # even though it was never read
+    for _ in range(4):
+        simulation.step(np.zeros(4))
+    assert simulation.num_images == 1 and simulation.image_pending
+    simulation.step(np.zeros(4))
+    assert simulation.num_images == 2 and not simulation.image_pending
+    assert result.image[0, 0, 0] == 4
+
+    # setting the image replaces a pending one
+    result.defer_image(lambda: pytest.fail("should not be called"))
+    result.image = None
+    assert result.image is None
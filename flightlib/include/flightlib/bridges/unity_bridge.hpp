@@ -6,6 +6,8 @@
 
 // std libs
 #include <unistd.h>
+#include <algorithm>
+#include <deque>
 #include <experimental/filesystem>
 #include <fstream>
 #include <map>
@@ -46,6 +48,10 @@ class UnityBridge {
   // public get functions
   bool getRender(const FrameID frame_id);
   bool handleOutput();
+  // asynchronous rendering: requests are sent without waiting for the reply (up to a bounded number of frames
+  // in flight), replies have to be polled in the order they were requested, older frames are dropped
+  bool requestRender(const FrameID frame_id);
+  bool pollOutput(const FrameID frame_id, const bool blocking = false);
   bool getPointCloud(PointCloudMessage_t &pointcloud_msg,
                      Scalar time_out = 600.0);
 
@@ -60,7 +66,16 @@ class UnityBridge {
   // public auxiliary functions
   inline void setPubPort(const std::string &pub_port) { pub_port_ = pub_port; };
   inline void setSubPort(const std::string &sub_port) { sub_port_ = sub_port; };
-  // create unity bridge
+  // request the binary pose protocol (only used if Unity acknowledges it when connecting)
+  inline void setPoseFormat(const bool binary_pose, const bool dynamic_objects_only = false) {
+    settings_.binary_pose = binary_pose;
+    settings_.dynamic_objects_only = binary_pose && dynamic_objects_only;
+  };
+  inline bool usesBinaryPose() const { return binary_pose_; };
+  inline void setMaxFramesInFlight(const int max_frames) { max_frames_in_flight_ = std::max(1, max_frames); };
+  inline int getNumFramesInFlight() const { return frames_in_flight_.size(); };
+  // create unity bridge (shared by everything that uses this instead of creating its own bridge, every bridge
+  // has its own ZMQ context and ports, so multiple bridges can be used to drive multiple renderers)
   static std::shared_ptr<UnityBridge> getInstance(void) {
     static std::shared_ptr<UnityBridge> bridge_ptr =
       std::make_shared<UnityBridge>();
@@ -89,6 +104,19 @@ class UnityBridge {
   bool sendInitialSettings(void);
   bool handleSettings(void);
 
+  // binary pose protocol
+  bool sendBinaryPose(void);
+  bool unpackBinaryMetadata(zmqpp::message &msg, SubMessage_t &sub_msg);
+  std::vector<uint8_t> binary_pose_buffer_;
+
+  // reply handling shared between the blocking and the asynchronous render path
+  bool unpackMetadata(zmqpp::message &msg, SubMessage_t &sub_msg);
+  void feedImages(zmqpp::message &msg, const SubMessage_t &sub_msg);
+
+  // frames requested asynchronously, but not yet polled (oldest first), should stay below the ZMQ high water mark
+  std::deque<FrameID> frames_in_flight_;
+  int max_frames_in_flight_{2};
+
   // timing variables
   int64_t num_frames_;
   int64_t last_downloaded_utime_;
@@ -99,5 +127,7 @@ class UnityBridge {
   const Scalar unity_connection_time_out_{60.0};
   bool unity_ready_{false};
   bool connections_initialized_{false};
+  bool binary_pose_{false};
+  bool objects_sent_{false};
 };
 }  // namespace flightlib
\ No newline at end of file
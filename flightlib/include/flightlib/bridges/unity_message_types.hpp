@@ -5,7 +5,9 @@
 #pragma once
 
 // std
+#include <cstring>
 #include <string>
+#include <vector>
 
 // opencv
 #include <opencv2/core/core.hpp>
@@ -110,6 +112,10 @@ struct SettingsMessage_t {
   // scene/render settings
   size_t scene_id = UnityScene::WAREHOUSE;
 
+  // requested pose message format (has to be acknowledged by Unity, otherwise JSON is used)
+  bool binary_pose{false};
+  bool dynamic_objects_only{false};
+
   //
   std::vector<Vehicle_t> vehicles;
   std::vector<Object_t> objects;
@@ -134,6 +140,76 @@ struct SubMessage_t {
   std::vector<Sub_Vehicle_t> sub_vehicles;
 };
 
+/*******************************
+ * Binary pose message layout *
+ *******************************/
+// Compact alternative to the JSON pose message, sent with the topic "PoseBinary" as a single frame:
+//   BinaryPoseHeader_t
+//   num_vehicles x [position (3), rotation (4)] as Scalar (float)
+//   num_objects x [position (3), rotation (4)] as Scalar (float)
+// Vehicles/objects are in the same order as in the settings message. In "dynamic objects only" mode,
+// the (static) objects are only sent with the first frame after connecting, after which num_objects is 0.
+// The reply uses the same scheme for its metadata (the image frames follow as before):
+//   BinarySubHeader_t
+//   num_vehicles x collision (uint8_t)
+constexpr uint32_t kBinaryPoseVersion = 1;
+constexpr int kBinaryPoseSize = 7;
+
+#pragma pack(push, 1)
+struct BinaryPoseHeader_t {
+  uint32_t version{kBinaryPoseVersion};
+  uint32_t num_vehicles{0};
+  uint32_t num_objects{0};
+  FrameID frame_id{0};
+};
+
+struct BinarySubHeader_t {
+  FrameID frame_id{0};
+  uint32_t num_vehicles{0};
+};
+#pragma pack(pop)
+
+// packs the header and the poses of the vehicles and of the first num_objects objects (already in Unity
+// coordinates) into buffer
+inline void packBinaryPose(const PubMessage_t &pub_msg, const uint32_t num_objects, std::vector<uint8_t> &buffer) {
+  BinaryPoseHeader_t header;
+  header.frame_id = pub_msg.frame_id;
+  header.num_vehicles = pub_msg.vehicles.size();
+  header.num_objects = num_objects;
+
+  const size_t pose_bytes = kBinaryPoseSize * sizeof(Scalar);
+  buffer.resize(sizeof(header) + (header.num_vehicles + header.num_objects) * pose_bytes);
+  uint8_t *data = buffer.data();
+  memcpy(data, &header, sizeof(header));
+  data += sizeof(header);
+
+  auto packPose = [&data](const std::vector<Scalar> &position, const std::vector<Scalar> &rotation) {
+    memcpy(data, position.data(), 3 * sizeof(Scalar));
+    memcpy(data + 3 * sizeof(Scalar), rotation.data(), 4 * sizeof(Scalar));
+    data += kBinaryPoseSize * sizeof(Scalar);
+  };
+  for (const auto &vehicle : pub_msg.vehicles) packPose(vehicle.position, vehicle.rotation);
+  for (size_t idx = 0; idx < num_objects; idx++) {
+    packPose(pub_msg.objects[idx].position, pub_msg.objects[idx].rotation);
+  }
+}
+
+// unpacks the binary metadata of a reply, returns false if the message is too short
+inline bool unpackBinarySubMessage(const uint8_t *data, const size_t size, SubMessage_t &sub_msg) {
+  if (size < sizeof(BinarySubHeader_t)) return false;
+
+  BinarySubHeader_t header;
+  memcpy(&header, data, sizeof(header));
+  if (size < sizeof(header) + header.num_vehicles) return false;
+
+  sub_msg.frame_id = header.frame_id;
+  sub_msg.sub_vehicles.resize(header.num_vehicles);
+  for (size_t idx = 0; idx < header.num_vehicles; idx++) {
+    sub_msg.sub_vehicles[idx].collision = data[sizeof(header) + idx] != 0;
+  }
+  return true;
+}
+
 struct PointCloudMessage_t {
   // define point cloud box range [x, y, z] / meter
   std::vector<Scalar> range{20.0, 20.0, 20.0};
@@ -193,8 +269,11 @@ inline void to_json(json &j, const Object_t &o) {
 
 // Setting messages, pub to unity
 inline void to_json(json &j, const SettingsMessage_t &o) {
-  j = json{
-    {"scene_id", o.scene_id}, {"vehicles", o.vehicles}, {"objects", o.objects}};
+  j = json{{"scene_id", o.scene_id},
+           {"vehicles", o.vehicles},
+           {"objects", o.objects},
+           {"binaryPose", o.binary_pose},
+           {"dynamicObjectsOnly", o.dynamic_objects_only}};
 }
 
 // Publish messages to unity
@@ -3,6 +3,7 @@
 // std lib
 #include <stdlib.h>
 #include <cmath>
+#include <cstring>
 #include <iostream>
 #include <string>
 
@@ -56,17 +57,23 @@ namespace racingenv {
 class RacingEnv final : public EnvBaseCamera {
  public:
   RacingEnv();
-  RacingEnv(const std::string &cfg_path, const bool rendering_only = false);
+  RacingEnv(const std::string &cfg_path, const bool rendering_only = false, const bool headless = false);
   ~RacingEnv();
 
   // method to set the quadrotor state and get a rendered image
   bool step(const Ref<Vector<>> action) override;
   bool getImage(Ref<ImageFlat<>> image) override;
+  // same as getImage, but keeps the (interleaved) HWC layout of the image, i.e. it is a single memcpy
+  bool getImageHWC(Ref<ImageFlat<>> image);
   bool getOpticalFlow(Ref<ImageFlat<float_t>> optical_flow) override;
   void getState(Ref<Vector<>> state) override;
 
   // Unity methods
   bool render() override;
+  // asynchronous rendering, the image for a requested frame can be polled once it has arrived
+  bool requestRender(const FrameID frame_id);
+  bool pollImage(const FrameID frame_id, Ref<ImageFlat<>> image, const bool blocking = false);
+  void setMaxFramesInFlight(const int max_frames);
   void addObjectsToUnity(std::shared_ptr<UnityBridge> bridge) override;
   bool setUnity(bool render) override;
   bool connectUnity(const int pub_port = 10253, const int sub_port = 10254) override;
@@ -86,6 +93,10 @@ class RacingEnv final : public EnvBaseCamera {
   // whether to bother with quadrotor dynamics etc.
   bool rendering_only_{false};
 
+  // pose message format requested from Unity
+  bool binary_pose_{false};
+  bool dynamic_objects_only_{false};
+
   // gates
   // std::shared_ptr<StaticGate> gates_[racingenv::num_gates];
   std::vector<std::shared_ptr<StaticGate>> gates_;
@@ -0,0 +1,58 @@
+#pragma once
+
+// std
+#include <memory>
+#include <string>
+#include <vector>
+
+// openmp
+#include <omp.h>
+
+// flightlib
+#include "flightlib/common/logger.hpp"
+#include "flightlib/common/quad_state.hpp"
+#include "flightlib/common/types.hpp"
+#include "flightlib/envs/racing_env/racing_env.hpp"
+
+namespace flightlib {
+
+// Batch of independent (headless) racing environments that are stepped in lockstep,
+// i.e. only the quadrotor dynamics are simulated, there is no rendering.
+class VecRacingEnv {
+ public:
+  VecRacingEnv(const std::string &cfg_path, const int num_envs, const int num_threads = 1);
+  ~VecRacingEnv();
+
+  // step all environments with one action (row) per environment
+  bool step(Ref<MatrixRowMajor<>> act);
+  // same as above, but also writes the resulting states into the (caller-provided) state matrix
+  bool step(Ref<MatrixRowMajor<>> act, Ref<MatrixRowMajor<>> state_out);
+  void getStates(Ref<MatrixRowMajor<>> states);
+  void getSimTimeSteps(Ref<Vector<>> time_steps);
+
+  // setter methods
+  bool setReducedState(const int env_id, const Ref<Vector<>> new_state, const int num_vars);
+  bool setReducedStates(Ref<MatrixRowMajor<>> new_states);
+  void setSimTimeStep(const Scalar time_step);
+  bool setSimTimeSteps(const Ref<Vector<>> time_steps);
+
+  // auxiliary functions
+  inline int getNumOfEnvs() { return num_envs_; };
+  inline int getStateDim() { return QuadState::IDX::SIZE; };
+  inline int getActDim() { return racingenv::kNAct; };
+  inline Scalar getSimTimeStep() { return envs_.empty() ? 0.0 : envs_[0]->getSimTimeStep(); };
+
+ private:
+  Logger logger_{"VecRacingEnv"};
+  std::vector<std::unique_ptr<RacingEnv>> envs_;
+
+  int num_envs_;
+  int num_threads_;
+
+  bool checkDims(const Ref<MatrixRowMajor<>> mat, const int cols);
+
+  // per-environment success of the last step (not a std::vector<bool> so that it can be written in parallel)
+  std::vector<char> step_success_;
+};
+
+}  // namespace flightlib
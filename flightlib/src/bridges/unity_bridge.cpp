@@ -71,12 +71,18 @@ bool UnityBridge::connectUnity(const SceneID scene_id, const int pub_port, const
     std::cout << ".";
     std::cout.flush();
   }
+  if (settings_.binary_pose && !binary_pose_) {
+    logger_.warn("Binary pose messages are not supported by Unity, using JSON instead.");
+  }
+  objects_sent_ = false;
   logger_.info("Flightmare Unity is connected.");
   return unity_ready_;
 }
 
 bool UnityBridge::disconnectUnity() {
   unity_ready_ = false;
+  binary_pose_ = false;
+  frames_in_flight_.clear();
   // create new message object
   pub_.close();
   sub_.close();
@@ -110,10 +116,14 @@ bool UnityBridge::handleSettings(void) {
   if (sub_.receive(msg, true)) {
     std::string metadata_string = msg.get(0);
     // Parse metadata
-    if (json::parse(metadata_string).size() > 1) {
+    json metadata = json::parse(metadata_string);
+    if (metadata.find("ready") == metadata.end()) {
       return false;  // hack
     }
-    done = json::parse(metadata_string).at("ready").get<bool>();
+    done = metadata.at("ready").get<bool>();
+    // the binary pose protocol is only used if Unity explicitly acknowledges it
+    binary_pose_ = done && settings_.binary_pose && metadata.find("binaryPose") != metadata.end() &&
+                   metadata.at("binaryPose").get<bool>();
   }
   return done;
 };
@@ -137,10 +147,18 @@ bool UnityBridge::getRender(const FrameID frame_id) {
     */
   }
 
-  for (size_t idx = 0; idx < pub_msg_.objects.size(); idx++) {
-    std::shared_ptr<StaticObject> gate = static_objects_[idx];
-    pub_msg_.objects[idx].position = positionRos2Unity(gate->getPosition());
-    pub_msg_.objects[idx].rotation = quaternionRos2Unity(gate->getQuaternion());
+  // in "dynamic objects only" mode the static objects are only sent once after connecting
+  const bool send_objects = !(binary_pose_ && settings_.dynamic_objects_only && objects_sent_);
+  if (send_objects) {
+    for (size_t idx = 0; idx < pub_msg_.objects.size(); idx++) {
+      std::shared_ptr<StaticObject> gate = static_objects_[idx];
+      pub_msg_.objects[idx].position = positionRos2Unity(gate->getPosition());
+      pub_msg_.objects[idx].rotation = quaternionRos2Unity(gate->getQuaternion());
+    }
+  }
+
+  if (binary_pose_) {
+    return sendBinaryPose();
   }
 
   // create new message object
@@ -155,6 +173,30 @@ bool UnityBridge::getRender(const FrameID frame_id) {
   return true;
 }
 
+bool UnityBridge::sendBinaryPose(void) {
+  // positions and rotations are already converted to Unity coordinates in getRender
+  const uint32_t num_objects = (settings_.dynamic_objects_only && objects_sent_) ? 0 : pub_msg_.objects.size();
+  packBinaryPose(pub_msg_, num_objects, binary_pose_buffer_);
+  objects_sent_ = true;
+
+  // create new message object
+  zmqpp::message msg;
+  // add topic header
+  msg << "PoseBinary";
+  msg.add_raw(binary_pose_buffer_.data(), binary_pose_buffer_.size());
+  // send message without blocking
+  pub_.send(msg, true);
+  return true;
+}
+
+bool UnityBridge::unpackBinaryMetadata(zmqpp::message& msg, SubMessage_t& sub_msg) {
+  if (!unpackBinarySubMessage(static_cast<const uint8_t*>(msg.raw_data(0)), msg.size(0), sub_msg)) {
+    logger_.error("Binary metadata received from Unity is too short.");
+    return false;
+  }
+  return true;
+}
+
 bool UnityBridge::setScene(const SceneID& scene_id) {
   if (scene_id >= UnityScene::SceneNum) {
     logger_.warn("Scene ID is not defined, cannot set scene.");
@@ -231,17 +273,83 @@ bool UnityBridge::handleOutput() {
 
   while (received_frame_id != pub_msg_.frame_id) {
       sub_.receive(msg);
-      // unpack message metadata
-      std::string json_sub_msg = msg.get(0);
-      // parse metadata
-      sub_msg = json::parse(json_sub_msg);
+      if (!unpackMetadata(msg, sub_msg)) continue;
       received_frame_id = sub_msg.frame_id;
   }
 
   // std::cout << "Current sent frame ID: " << pub_msg_.frame_id << std::endl;
   // std::cout << "Current received frame ID: " << sub_msg.frame_id << std::endl;
 
+  // frames are rendered in order, so the replies to any earlier asynchronous requests have been skipped
+  frames_in_flight_.clear();
+
+  feedImages(msg, sub_msg);
+  return true;
+}
+
+bool UnityBridge::requestRender(const FrameID frame_id) {
+  if ((int) frames_in_flight_.size() >= max_frames_in_flight_) {
+    return false;
+  }
+  getRender(frame_id);
+  frames_in_flight_.push_back(frame_id);
+  return true;
+}
+
+bool UnityBridge::pollOutput(const FrameID frame_id, const bool blocking) {
+  if (std::find(frames_in_flight_.begin(), frames_in_flight_.end(), frame_id) == frames_in_flight_.end()) {
+    logger_.warn("Frame %lu was not requested or has already been received.", frame_id);
+    return false;
+  }
 
+  zmqpp::message msg;
+  SubMessage_t sub_msg;
+  while (true) {
+    // without blocking, only the messages that have already arrived are processed
+    if (!sub_.receive(msg, !blocking)) return false;
+    if (!unpackMetadata(msg, sub_msg)) continue;
+
+    auto it = std::find(frames_in_flight_.begin(), frames_in_flight_.end(), sub_msg.frame_id);
+    if (it == frames_in_flight_.end()) continue;  // reply to a blocking request or a stale frame
+
+    // frames are rendered in order, so any older frames that are still in flight are not coming anymore
+    frames_in_flight_.erase(frames_in_flight_.begin(), it + 1);
+    if (sub_msg.frame_id == frame_id) {
+      feedImages(msg, sub_msg);
+      return true;
+    }
+    if (sub_msg.frame_id > frame_id) {
+      logger_.warn("Frame %lu was dropped.", frame_id);
+      return false;
+    }
+    // an earlier frame that was not polled, its images are dropped
+  }
+}
+
+bool UnityBridge::unpackMetadata(zmqpp::message& msg, SubMessage_t& sub_msg) {
+  if (binary_pose_) {
+    // unpack binary metadata
+    return unpackBinaryMetadata(msg, sub_msg);
+  }
+  // unpack message metadata
+  std::string json_sub_msg = msg.get(0);
+  // parse metadata
+  json metadata;
+  try {
+    metadata = json::parse(json_sub_msg);
+  } catch (const std::exception& e) {
+    logger_.warn("Could not parse metadata received from Unity.");
+    return false;
+  }
+  // skip anything that is not frame metadata, e.g. a repeated reply to the initial settings that is still queued
+  if (!metadata.is_object() || metadata.find("frame_id") == metadata.end()) {
+    return false;
+  }
+  sub_msg = metadata;
+  return true;
+}
+
+void UnityBridge::feedImages(zmqpp::message& msg, const SubMessage_t& sub_msg) {
   size_t image_i = 1;
   // ensureBufferIsAllocated(sub_msg);
   for (size_t idx = 0; idx < settings_.vehicles.size(); idx++) {
@@ -333,7 +441,6 @@ bool UnityBridge::handleOutput() {
       }
     }
   }
-  return true;
 }
 
 bool UnityBridge::getPointCloud(PointCloudMessage_t& pointcloud_msg,
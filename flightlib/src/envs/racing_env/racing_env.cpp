@@ -4,7 +4,7 @@ namespace flightlib {
 
 RacingEnv::RacingEnv() : RacingEnv(getenv("FLIGHTMARE_PATH") + std::string("/flightlib/configs/racing_env.yaml")) {}
 
-RacingEnv::RacingEnv(const std::string &cfg_path, const bool rendering_only) {
+RacingEnv::RacingEnv(const std::string &cfg_path, const bool rendering_only, const bool headless) {
   // load configuration file
   YAML::Node cfg_ = YAML::LoadFile(cfg_path);
   loadParam(cfg_);
@@ -92,8 +92,10 @@ RacingEnv::RacingEnv(const std::string &cfg_path, const bool rendering_only) {
     // gates_[i]->setSize(Eigen::Vector3f(1.05, 1.05, 1.05));
   }
 
-  // add unity
-  setUnity(true);
+  // add unity (in headless mode only the quadrotor dynamics are used and no bridge is created)
+  if (!headless) {
+    setUnity(true);
+  }
 }
 
 RacingEnv::~RacingEnv() {}
@@ -141,6 +143,27 @@ bool RacingEnv::getImage(Ref<ImageFlat<>> image) {
   return true;
 }
 
+bool RacingEnv::getImageHWC(Ref<ImageFlat<>> image) {
+  if (unity_render_ && unity_ready_) {
+    bool rgb_success = rgb_camera_->getRGBImage(cv_image_);
+    if (rgb_success) {
+      const size_t num_bytes = cv_image_.total() * cv_image_.elemSize();
+      if (cv_image_.type() != CV_8UC3 || num_bytes != (size_t) image.size()) {
+        std::cout << "WARNING: Image returned from Unity does not match the provided buffer." << std::endl;
+        return false;
+      }
+      if (!cv_image_.isContinuous()) {
+        cv_image_ = cv_image_.clone();
+      }
+      std::memcpy(image.data(), cv_image_.data, num_bytes);
+    }
+    return rgb_success;
+  } else {
+    std::cout << "WARNING: Unity rendering not available; cannot get any images." << std::endl;
+    return false;
+  }
+}
+
 bool RacingEnv::getOpticalFlow(Ref<ImageFlat<float_t>> optical_flow) {
   if (unity_render_ && unity_ready_) {
     ImageChannel<float_t> optical_flow_channels_[2];
@@ -188,6 +211,8 @@ void RacingEnv::getState(Ref<Vector<>> state) {
 bool RacingEnv::render() {
   // std::cout << "Quad state on render:" << std::endl << quad_state_.x.segment(0, 7) << std::endl;
   if (unity_render_ && unity_ready_) {
+    // render_counter_ is always past the asynchronous requests (see requestRender), so that a late reply
+    // to one of them cannot be taken for the reply to this request
     unity_bridge_ptr_->getRender(render_counter_);
     unity_bridge_ptr_->handleOutput();
     render_counter_++;
@@ -198,6 +223,32 @@ bool RacingEnv::render() {
   return true;
 }
 
+bool RacingEnv::requestRender(const FrameID frame_id) {
+  if (unity_render_ && unity_ready_) {
+    if (!unity_bridge_ptr_->requestRender(frame_id)) return false;
+    // the synchronous and asynchronous requests share the frame IDs
+    render_counter_ = std::max<unsigned long>(render_counter_, frame_id + 1);
+    return true;
+  } else {
+    std::cout << "WARNING: Unity rendering not available; cannot get images." << std::endl;
+    return false;
+  }
+}
+
+bool RacingEnv::pollImage(const FrameID frame_id, Ref<ImageFlat<>> image, const bool blocking) {
+  if (unity_render_ && unity_ready_) {
+    if (!unity_bridge_ptr_->pollOutput(frame_id, blocking)) return false;
+    return getImageHWC(image);
+  } else {
+    std::cout << "WARNING: Unity rendering not available; cannot get images." << std::endl;
+    return false;
+  }
+}
+
+void RacingEnv::setMaxFramesInFlight(const int max_frames) {
+  if (unity_bridge_ptr_ != nullptr) unity_bridge_ptr_->setMaxFramesInFlight(max_frames);
+}
+
 void RacingEnv::addObjectsToUnity(std::shared_ptr<UnityBridge> bridge) {
   bridge->addQuadrotor(quadrotor_ptr_);
   for (int i = 0; i < num_gates_; i++) {
@@ -208,8 +259,10 @@ void RacingEnv::addObjectsToUnity(std::shared_ptr<UnityBridge> bridge) {
 bool RacingEnv::setUnity(bool render) {
   unity_render_ = render;
   if (unity_render_ && unity_bridge_ptr_ == nullptr) {
-    // create unity bridge
-    unity_bridge_ptr_ = UnityBridge::getInstance();
+    // create unity bridge (not the shared instance, so that multiple environments in the same process
+    // can be connected to different renderers on different ports)
+    unity_bridge_ptr_ = std::make_shared<UnityBridge>();
+    unity_bridge_ptr_->setPoseFormat(binary_pose_, dynamic_objects_only_);
     // add this environment to Unity
     this->addObjectsToUnity(unity_bridge_ptr_);
   }
@@ -262,6 +315,11 @@ bool RacingEnv::loadParam(const YAML::Node &cfg) {
     image_fov_ = cfg["camera"]["fov"].as<Scalar>();
   }
 
+  if (cfg["unity"]) {
+    if (cfg["unity"]["binary_pose"]) binary_pose_ = cfg["unity"]["binary_pose"].as<bool>();
+    if (cfg["unity"]["dynamic_objects_only"]) dynamic_objects_only_ = cfg["unity"]["dynamic_objects_only"].as<bool>();
+  }
+
   if (cfg["track"]) {
     if (!(cfg["track"]["positions"] && cfg["track"]["orientations"])) {
       std::cout << "WARNING: Both positions and orientations have to be provided for building a track." << std::endl;
@@ -0,0 +1,109 @@
+#include "flightlib/envs/racing_env/vec_racing_env.hpp"
+
+namespace flightlib {
+
+VecRacingEnv::VecRacingEnv(const std::string &cfg_path, const int num_envs, const int num_threads)
+  : num_envs_(num_envs), num_threads_(num_threads) {
+  // set threads
+  omp_set_num_threads(num_threads_);
+
+  // create headless environments, rendering is not supported for the batched environment
+  for (int i = 0; i < num_envs_; i++) {
+    envs_.push_back(std::make_unique<RacingEnv>(cfg_path, false, true));
+  }
+  step_success_.resize(num_envs_, 1);
+}
+
+VecRacingEnv::~VecRacingEnv() {}
+
+bool VecRacingEnv::step(Ref<MatrixRowMajor<>> act) {
+  if (!checkDims(act, getActDim())) return false;
+
+#pragma omp parallel for schedule(static)
+  for (int i = 0; i < num_envs_; i++) {
+    step_success_[i] = envs_[i]->step(act.row(i));
+  }
+
+  bool success = true;
+  for (int i = 0; i < num_envs_; i++) {
+    success = success && step_success_[i];
+  }
+  return success;
+}
+
+bool VecRacingEnv::step(Ref<MatrixRowMajor<>> act, Ref<MatrixRowMajor<>> state_out) {
+  if (!checkDims(act, getActDim()) || !checkDims(state_out, getStateDim())) return false;
+
+  // each environment only writes its own row, so the states can be written in the same parallel loop
+#pragma omp parallel for schedule(static)
+  for (int i = 0; i < num_envs_; i++) {
+    step_success_[i] = envs_[i]->step(act.row(i));
+    envs_[i]->getState(state_out.row(i));
+  }
+
+  bool success = true;
+  for (int i = 0; i < num_envs_; i++) {
+    success = success && step_success_[i];
+  }
+  return success;
+}
+
+void VecRacingEnv::getStates(Ref<MatrixRowMajor<>> states) {
+  if (!checkDims(states, getStateDim())) return;
+
+  for (int i = 0; i < num_envs_; i++) envs_[i]->getState(states.row(i));
+}
+
+void VecRacingEnv::getSimTimeSteps(Ref<Vector<>> time_steps) {
+  if (time_steps.rows() != num_envs_) {
+    logger_.error("Input vector dimensions do not match with that of the environment.");
+    return;
+  }
+
+  for (int i = 0; i < num_envs_; i++) time_steps(i) = envs_[i]->getSimTimeStep();
+}
+
+bool VecRacingEnv::setReducedState(const int env_id, const Ref<Vector<>> new_state, const int num_vars) {
+  if (env_id < 0 || env_id >= num_envs_) {
+    logger_.error("Environment ID %d is out of range.", env_id);
+    return false;
+  }
+  envs_[env_id]->setReducedState(new_state, num_vars);
+  return true;
+}
+
+bool VecRacingEnv::setReducedStates(Ref<MatrixRowMajor<>> new_states) {
+  if (new_states.rows() != num_envs_ || new_states.cols() > getStateDim()) {
+    logger_.error("Input matrix dimensions do not match with that of the environment.");
+    return false;
+  }
+
+  for (int i = 0; i < num_envs_; i++) envs_[i]->setReducedState(new_states.row(i), new_states.cols());
+  return true;
+}
+
+void VecRacingEnv::setSimTimeStep(const Scalar time_step) {
+  for (int i = 0; i < num_envs_; i++) {
+    envs_[i]->setSimTimeStep(time_step);
+  }
+}
+
+bool VecRacingEnv::setSimTimeSteps(const Ref<Vector<>> time_steps) {
+  if (time_steps.rows() != num_envs_) {
+    logger_.error("Input vector dimensions do not match with that of the environment.");
+    return false;
+  }
+
+  for (int i = 0; i < num_envs_; i++) envs_[i]->setSimTimeStep(time_steps(i));
+  return true;
+}
+
+bool VecRacingEnv::checkDims(const Ref<MatrixRowMajor<>> mat, const int cols) {
+  if (mat.rows() != num_envs_ || mat.cols() != cols) {
+    logger_.error("Input matrix dimensions do not match with that of the environment.");
+    return false;
+  }
+  return true;
+}
+
+}  // namespace flightlib
@@ -12,6 +12,7 @@
 #include "flightlib/envs/vec_env.hpp"
 #include "flightlib/envs/racing_env/racing_test_env.hpp"
 #include "flightlib/envs/racing_env/racing_env.hpp"
+#include "flightlib/envs/racing_env/vec_racing_env.hpp"
 // #include "flightlib/envs/rendering_env.hpp"
 
 namespace py = pybind11;
@@ -63,8 +64,10 @@ PYBIND11_MODULE(flightgym, m) {
   py::class_<RacingEnv>(m, "RacingEnv")
   .def(py::init<>())
   .def(py::init<const std::string&, const bool>())
+  .def(py::init<const std::string&, const bool, const bool>())
   .def("step", &RacingEnv::step)
   .def("getImage", &RacingEnv::getImage)
+  .def("getImageHWC", &RacingEnv::getImageHWC)
   .def("getOpticalFlow", &RacingEnv::getOpticalFlow)
   .def("getState", &RacingEnv::getState)
   .def("getImageHeight", &RacingEnv::getImageHeight)
@@ -75,9 +78,31 @@ PYBIND11_MODULE(flightgym, m) {
   .def("setSimTimeStep", &RacingEnv::setSimTimeStep)
   .def("setSceneID", &RacingEnv::setSceneID)
   .def("render", &RacingEnv::render)
+  .def("requestRender", &RacingEnv::requestRender)
+  .def("pollImage", &RacingEnv::pollImage, py::arg("frame_id"), py::arg("image"), py::arg("blocking") = false)
+  .def("setMaxFramesInFlight", &RacingEnv::setMaxFramesInFlight)
   .def("connectUnity", &RacingEnv::connectUnity)
   .def("disconnectUnity", &RacingEnv::disconnectUnity)
   .def("__repr__", [](const RacingEnv& a) {
     return "Drone Racing Environment";
   });
-}
\ No newline at end of file
+
+  py::class_<VecRacingEnv>(m, "VecRacingEnv")
+  .def(py::init<const std::string&, const int>())
+  .def(py::init<const std::string&, const int, const int>())
+  .def("step", py::overload_cast<Ref<MatrixRowMajor<>>>(&VecRacingEnv::step))
+  .def("step", py::overload_cast<Ref<MatrixRowMajor<>>, Ref<MatrixRowMajor<>>>(&VecRacingEnv::step))
+  .def("getStates", &VecRacingEnv::getStates)
+  .def("getSimTimeSteps", &VecRacingEnv::getSimTimeSteps)
+  .def("getNumOfEnvs", &VecRacingEnv::getNumOfEnvs)
+  .def("getStateDim", &VecRacingEnv::getStateDim)
+  .def("getActDim", &VecRacingEnv::getActDim)
+  .def("getSimTimeStep", &VecRacingEnv::getSimTimeStep)
+  .def("setReducedState", &VecRacingEnv::setReducedState)
+  .def("setReducedStates", &VecRacingEnv::setReducedStates)
+  .def("setSimTimeStep", &VecRacingEnv::setSimTimeStep)
+  .def("setSimTimeSteps", &VecRacingEnv::setSimTimeSteps)
+  .def("__repr__", [](const VecRacingEnv& a) {
+    return "Vectorized Drone Racing Environment";
+  });
+}
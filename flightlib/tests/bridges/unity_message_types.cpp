@@ -0,0 +1,75 @@
+#include "flightlib/bridges/unity_message_types.hpp"
+
+#include <gtest/gtest.h>
+#include <cstring>
+#include <vector>
+
+using namespace flightlib;
+
+TEST(UnityMessageTypes, BinaryPoseRoundTrip) {
+  // the layout has to match the Python side (struct formats "<IIIQ" and "<QI")
+  EXPECT_EQ(sizeof(BinaryPoseHeader_t), 20u);
+  EXPECT_EQ(sizeof(BinarySubHeader_t), 12u);
+
+  PubMessage_t pub_msg;
+  pub_msg.frame_id = 42;
+  pub_msg.vehicles.resize(2);
+  pub_msg.objects.resize(3);
+  for (size_t i = 0; i < pub_msg.vehicles.size(); i++) {
+    pub_msg.vehicles[i].position = {(Scalar)i, 1.0, 2.0};
+    pub_msg.vehicles[i].rotation = {0.0, 0.0, 0.5, (Scalar)i};
+  }
+  for (size_t i = 0; i < pub_msg.objects.size(); i++) {
+    pub_msg.objects[i].position = {-(Scalar)i, 3.0, 4.0};
+    pub_msg.objects[i].rotation = {0.5, 0.0, 0.0, (Scalar)i};
+  }
+
+  std::vector<uint8_t> buffer;
+  packBinaryPose(pub_msg, pub_msg.objects.size(), buffer);
+  ASSERT_EQ(buffer.size(), sizeof(BinaryPoseHeader_t) + 5 * kBinaryPoseSize * sizeof(Scalar));
+
+  BinaryPoseHeader_t header;
+  memcpy(&header, buffer.data(), sizeof(header));
+  EXPECT_EQ(header.version, kBinaryPoseVersion);
+  EXPECT_EQ(header.num_vehicles, 2u);
+  EXPECT_EQ(header.num_objects, 3u);
+  EXPECT_EQ(header.frame_id, pub_msg.frame_id);
+
+  std::vector<Scalar> poses(5 * kBinaryPoseSize);
+  memcpy(poses.data(), buffer.data() + sizeof(header), poses.size() * sizeof(Scalar));
+  for (size_t i = 0; i < 5; i++) {
+    const bool is_vehicle = i < pub_msg.vehicles.size();
+    const std::vector<Scalar>& position =
+      is_vehicle ? pub_msg.vehicles[i].position : pub_msg.objects[i - 2].position;
+    const std::vector<Scalar>& rotation =
+      is_vehicle ? pub_msg.vehicles[i].rotation : pub_msg.objects[i - 2].rotation;
+    for (int j = 0; j < 3; j++) EXPECT_EQ(poses[i * kBinaryPoseSize + j], position[j]);
+    for (int j = 0; j < 4; j++) EXPECT_EQ(poses[i * kBinaryPoseSize + 3 + j], rotation[j]);
+  }
+
+  // only the vehicles (e.g. after the static objects have been sent once)
+  packBinaryPose(pub_msg, 0, buffer);
+  EXPECT_EQ(buffer.size(), sizeof(BinaryPoseHeader_t) + 2 * kBinaryPoseSize * sizeof(Scalar));
+  memcpy(&header, buffer.data(), sizeof(header));
+  EXPECT_EQ(header.num_objects, 0u);
+
+  // reply metadata, as sent by Unity
+  BinarySubHeader_t sub_header;
+  sub_header.frame_id = 7;
+  sub_header.num_vehicles = 2;
+  std::vector<uint8_t> sub_buffer(sizeof(sub_header) + 2);
+  memcpy(sub_buffer.data(), &sub_header, sizeof(sub_header));
+  sub_buffer[sizeof(sub_header)] = 1;
+  sub_buffer[sizeof(sub_header) + 1] = 0;
+
+  SubMessage_t sub_msg;
+  EXPECT_TRUE(unpackBinarySubMessage(sub_buffer.data(), sub_buffer.size(), sub_msg));
+  EXPECT_EQ(sub_msg.frame_id, 7u);
+  ASSERT_EQ(sub_msg.sub_vehicles.size(), 2u);
+  EXPECT_TRUE(sub_msg.sub_vehicles[0].collision);
+  EXPECT_FALSE(sub_msg.sub_vehicles[1].collision);
+
+  // truncated messages
+  EXPECT_FALSE(unpackBinarySubMessage(sub_buffer.data(), sub_buffer.size() - 1, sub_msg));
+  EXPECT_FALSE(unpackBinarySubMessage(sub_buffer.data(), sizeof(sub_header) - 1, sub_msg));
+}
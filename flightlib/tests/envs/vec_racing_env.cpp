@@ -0,0 +1,107 @@
+#include "flightlib/envs/racing_env/vec_racing_env.hpp"
+
+#include <gtest/gtest.h>
+
+using namespace flightlib;
+
+static constexpr int SIM_STEPS_N = 20;
+
+TEST(VecRacingEnv, Constructor) {
+  const std::string config_path =
+    getenv("FLIGHTMARE_PATH") + std::string("/flightlib/configs/racing_env.yaml");
+  const int num_envs = 4;
+
+  VecRacingEnv vec_env(config_path, num_envs, 2);
+
+  EXPECT_EQ(vec_env.getNumOfEnvs(), num_envs);
+  EXPECT_EQ(vec_env.getStateDim(), QuadState::IDX::SIZE);
+  EXPECT_EQ(vec_env.getActDim(), racingenv::kNAct);
+
+  Vector<> time_steps(num_envs);
+  vec_env.getSimTimeSteps(time_steps);
+  for (int i = 0; i < num_envs; i++) {
+    EXPECT_EQ(time_steps(i), vec_env.getSimTimeStep());
+  }
+}
+
+TEST(VecRacingEnv, ResetEnv) {
+  const std::string config_path =
+    getenv("FLIGHTMARE_PATH") + std::string("/flightlib/configs/racing_env.yaml");
+  const int num_envs = 4;
+  const int reduced_dim = 10;
+
+  VecRacingEnv vec_env(config_path, num_envs, 2);
+
+  // "reset" each environment to hovering at a different position
+  MatrixRowMajor<> reduced_states = MatrixRowMajor<>::Zero(num_envs, reduced_dim);
+  for (int i = 0; i < num_envs; i++) {
+    reduced_states(i, QuadState::IDX::POSX) = i;
+    reduced_states(i, QuadState::IDX::POSZ) = 2.0;
+    reduced_states(i, QuadState::IDX::ATTW) = 1.0;
+  }
+  EXPECT_TRUE(vec_env.setReducedStates(reduced_states));
+
+  MatrixRowMajor<> states(num_envs, vec_env.getStateDim());
+  vec_env.getStates(states);
+  EXPECT_TRUE(states.leftCols(reduced_dim).isApprox(reduced_states));
+
+  // single environment
+  Vector<> reduced_state = reduced_states.row(0).transpose();
+  reduced_state(QuadState::IDX::POSY) = 5.0;
+  EXPECT_TRUE(vec_env.setReducedState(1, reduced_state, reduced_dim));
+  vec_env.getStates(states);
+  EXPECT_EQ(states(1, QuadState::IDX::POSY), 5.0);
+
+  // failure cases
+  EXPECT_FALSE(vec_env.setReducedState(num_envs, reduced_state, reduced_dim));
+  MatrixRowMajor<> wrong_states = MatrixRowMajor<>::Zero(num_envs + 1, reduced_dim);
+  EXPECT_FALSE(vec_env.setReducedStates(wrong_states));
+  wrong_states = MatrixRowMajor<>::Zero(num_envs, vec_env.getStateDim() + 1);
+  EXPECT_FALSE(vec_env.setReducedStates(wrong_states));
+}
+
+TEST(VecRacingEnv, StepEnv) {
+  const std::string config_path =
+    getenv("FLIGHTMARE_PATH") + std::string("/flightlib/configs/racing_env.yaml");
+  const int num_envs = 4;
+
+  VecRacingEnv vec_env(config_path, num_envs, 2);
+  const int state_dim = vec_env.getStateDim();
+  const int act_dim = vec_env.getActDim();
+
+  MatrixRowMajor<> reduced_states = MatrixRowMajor<>::Zero(num_envs, 10);
+  reduced_states.col(QuadState::IDX::POSZ).setConstant(2.0);
+  reduced_states.col(QuadState::IDX::ATTW).setConstant(1.0);
+  EXPECT_TRUE(vec_env.setReducedStates(reduced_states));
+
+  // collective thrust and body rates, the same random action for all environments
+  MatrixRowMajor<> act(num_envs, act_dim), states(num_envs, state_dim), states_out(num_envs, state_dim);
+  act.setRandom();
+  act.col(0).setConstant(9.81);
+  act.rightCols(3) = act.row(0).rightCols(3).replicate(num_envs, 1);
+
+  for (int i = 0; i < SIM_STEPS_N; i++) {
+    EXPECT_TRUE(vec_env.step(act, states_out));
+  }
+  vec_env.getStates(states);
+  EXPECT_TRUE(states.allFinite());
+  EXPECT_TRUE(states.isApprox(states_out));
+
+  // identical inputs for the environments stepped in parallel, so all of them should end up in the same state
+  for (int i = 1; i < num_envs; i++) {
+    EXPECT_TRUE(states.row(i).isApprox(states.row(0)));
+  }
+
+  EXPECT_TRUE(vec_env.step(act));
+
+  // test action dimension failure case
+  act.resize(num_envs, act_dim - 1);
+  EXPECT_FALSE(vec_env.step(act));
+  EXPECT_FALSE(vec_env.step(act, states_out));
+
+  // test state dimension failure case
+  act.resize(num_envs, act_dim);
+  act.setZero();
+  states_out.resize(num_envs + 1, state_dim);
+  EXPECT_FALSE(vec_env.step(act, states_out));
+}